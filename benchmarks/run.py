@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import requests
+
+from synthetic import get_symbols
+
+# End-to-end benchmark of the pipeline on synthetic MSE data, offline: the scrapers are pointed at local stubs
+# of mse.mk and SEI-Net (stubs.py) and every stage is timed separately in its own process (stage.py).
+#   python run.py --symbols 20 --years 10 --output results.json
+#   python run.py --output after.json --baseline results.json
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+STAGE_ORDER = ["scrape", "news", "indicators", "indicator_api", "prepare_models", "prediction_api", "sentiment_api"]
+STUB_STARTUP_TIMEOUT = 30  # Seconds to wait for the stubs to answer
+STAGE_TIMEOUT = 1800  # Seconds before a stage is stopped
+
+
+def get_commit():
+    """
+    Function to get the commit the benchmark runs on
+    :return: short hash, with "-dirty" when there are uncommitted changes, or None outside of git
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_PATH,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARKS_PATH,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + "-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_stubs(port, symbol_count, workspace):
+    """
+    Function to start the mse.mk and SEI-Net stubs and wait until they answer
+    :param port: port of the stubs
+    :param symbol_count: number of symbols in the symbol list
+    :param workspace: folder for the stub log
+    :return: the stub process
+    """
+    env = dict(os.environ, STUB_PORT=str(port), STUB_SYMBOLS=str(symbol_count))
+    with open(os.path.join(workspace, "stubs.log"), "w") as log:
+        process = subprocess.Popen([sys.executable, "stubs.py"], cwd=BENCHMARKS_PATH, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + STUB_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The stubs exited with code {process.returncode}, see {workspace}/stubs.log")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The stubs did not start within {STUB_STARTUP_TIMEOUT} seconds")
+
+
+def run_stage(stage, symbols, years, workspace, env):
+    """
+    Function to run one stage in its own process
+    :return: dict name -> timings, with the status of every reported stage
+    """
+    command = [sys.executable, "stage.py", stage, "--workspace", workspace, "--symbols", ",".join(symbols),
+               "--years", str(years)]
+    start_time = time.perf_counter()
+    try:
+        process = subprocess.run(command, cwd=BENCHMARKS_PATH, env=env, capture_output=True, text=True,
+                                 timeout=STAGE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {stage: {"status": "error", "reason": f"timed out after {STAGE_TIMEOUT} seconds"}}
+    wall_seconds = time.perf_counter() - start_time
+
+    with open(os.path.join(workspace, f"{stage}.log"), "w") as log:
+        log.write(process.stderr)
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return {stage: {"status": "error", "reason": lines[-1] if lines else f"exit code {process.returncode}"}}
+
+    results = json.loads(process.stdout.strip().splitlines()[-1])
+    for entry in results.values():
+        entry.setdefault("status", "ok")
+        if entry["status"] == "ok":
+            entry["per_item_ms"] = entry["seconds"] * 1000 / max(entry["items"], 1)
+            entry["process_seconds"] = wall_seconds  # Includes the imports of the stage's process
+    return results
+
+
+def compare(results, baseline):
+    """
+    Function to compare the stage times with an earlier run
+    :param results: stage results of this run
+    :param baseline: stage results of the earlier run
+    :return: dict name -> ratio of the times (above 1 is slower)
+    """
+    ratios = {}
+    for name, entry in results.items():
+        before = baseline.get(name, {})
+        if entry.get("status") == "ok" and before.get("status") == "ok" and before["per_item_ms"] > 0:
+            ratios[name] = entry["per_item_ms"] / before["per_item_ms"]
+    return ratios
+
+
+def print_summary(results, ratios):
+    print(f"{'stage':<22}{'status':<9}{'items':>8}{'seconds':>10}{'ms/item':>10}{'vs base':>9}")
+    for name, entry in results.items():
+        if entry["status"] != "ok":
+            print(f"{name:<22}{entry['status']:<9}  {entry.get('reason', '')}")
+            continue
+        ratio = f"{ratios[name]:.2f}x" if name in ratios else ""
+        not_modified = f"  304: {entry['not_modified_share']:.0%}" if "not_modified_share" in entry else ""
+        print(f"{name:<22}{'ok':<9}{entry['items']:>8}{entry['seconds']:>10.3f}{entry['per_item_ms']:>10.3f}{ratio:>9}"
+              f"{not_modified}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline end to end on synthetic data")
+    parser.add_argument("--symbols", type=int, default=20, help="number of synthetic symbols")
+    parser.add_argument("--years", type=int, default=10, help="years of history scraped per symbol")
+    parser.add_argument("--stages", default=",".join(STAGE_ORDER), help="comma-separated stages to run, in order")
+    parser.add_argument("--port", type=int, default=5098, help="port of the stubs")
+    parser.add_argument("--workspace", help="folder for the data of the stages (default: a temporary folder)")
+    parser.add_argument("--output", default="results.json", help="JSON file with the results")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGE_ORDER)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)}")
+
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="mse-benchmark-"))
+    os.makedirs(workspace, exist_ok=True)
+    symbols = get_symbols(args.symbols)
+    stub_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ,
+               MSE_HISTORY_URL=f"{stub_url}/en/stats/symbolhistory/",
+               MSE_SYMBOL_URL=f"{stub_url}/en/symbol/{{issuer}}",
+               SEINET_DOCUMENT_URL=f"{stub_url}/public/documents/single/{{news_id}}",
+               BARS_PATH=os.path.join(workspace, "bars"),
+               HF_HUB_OFFLINE="1",  # The sentiment model is only used when it is already downloaded
+               TF_CPP_MIN_LOG_LEVEL="2")
+
+    print(f"Workspace: {workspace}")
+    stubs = start_stubs(args.port, args.symbols, workspace)
+    results = {}
+    try:
+        for stage in stages:
+            print(f"Running {stage}...")
+            results.update(run_stage(stage, symbols, args.years, workspace, env))
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    ratios = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            ratios = compare(results, json.load(f)["stages"])
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "system": platform.system(), "cpus": os.cpu_count()},
+        "config": {"symbols": args.symbols, "years": args.years, "stages": stages},
+        "stages": results,
+    }
+    if args.baseline:
+        report["baseline"] = {"file": args.baseline, "ratios": ratios}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(results, ratios)
+    print(f"Results saved to {args.output}")
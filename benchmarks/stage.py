@@ -0,0 +1,325 @@
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from synthetic import render_document
+
+# Runs one stage of the pipeline benchmark and prints its timings as JSON on the last line of stdout.
+# Every stage runs in its own process (see run.py): the components all have a main.py, and a stage must not
+# profit from the imports or caches of the previous one.
+#   python stage.py indicators --workspace /tmp/bench --symbols AAAA,AAAB
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Component each stage imports its code from
+COMPONENTS = {
+    "scrape": "homework_1",
+    "news": "homework_4/news_scraper",
+    "indicators": "homework_3/rsi",
+    "indicator_api": "homework_4/indicators",
+    "prepare_models": "homework_3/lstm",
+    "prediction_api": "homework_4/prediction",
+    "sentiment_api": "homework_4/nlp",
+}
+TIMEFRAMES = ["1", "7", "30"]  # Timeframes of the indicator files
+API_INDICATORS = ["rsi", "stoch", "williamsr", "cci", "mfi", "ema", "sma", "wma"]
+WARM_REPEAT = 5  # Requests per symbol after the first one for the prediction API
+DASHBOARD_POLLS = 10  # Polls of every dashboard URL while its data does not change
+DB_COLUMNS = ("company_key TEXT, date TEXT, price REAL, max REAL, min REAL, average_price REAL, price_change REAL, "
+              "volume REAL, best_turnover REAL, total_turnover REAL")
+
+
+@contextlib.contextmanager
+def timed(timings, name, items=1):
+    """
+    Function to add the time spent in a block to a stage's timings
+    :param timings: dict name -> {"seconds", "items"}
+    :param name: stage name
+    :param items: number of items processed in the block
+    """
+    entry = timings.setdefault(name, {"seconds": 0.0, "items": 0})
+    start_time = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["seconds"] += time.perf_counter() - start_time
+        entry["items"] += items
+
+
+def add_latencies(entry, latencies):
+    """
+    Function to add request latency percentiles to a stage's timings
+    :param entry: the stage timings
+    :param latencies: list of seconds
+    """
+    entry["p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+    entry["p95_ms"] = float(np.percentile(latencies, 95) * 1000)
+    entry["max_ms"] = float(np.max(latencies) * 1000)
+
+
+def replay_dashboard(client, urls, timings, name, polls=DASHBOARD_POLLS):
+    """
+    Function to poll URLs like the dashboard does, sending back the ETag of the last response like a browser cache
+    :param client: Flask test client
+    :param urls: URLs polled
+    :param timings: the stage timings, the latencies and the share of 304 responses are added under the name
+    :param name: stage name
+    :param polls: polls of every URL
+    """
+    etags = {}
+    latencies = []
+    not_modified = 0
+    for _ in range(polls):
+        for url in urls:
+            headers = {"If-None-Match": etags[url]} if url in etags else {}
+            with timed(timings, name):
+                start_time = time.perf_counter()
+                response = client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - start_time)
+            if response.status_code == 304:
+                not_modified += 1
+            elif response.status_code == 200:
+                etags[url] = response.headers.get("ETag")
+            else:
+                raise ValueError(f"{url}: {response.status_code} {response.get_data(as_text=True)}")
+    add_latencies(timings[name], latencies)
+    timings[name]["not_modified_share"] = not_modified / len(latencies)
+
+
+def skipped(name, reason):
+    return {name: {"status": "skipped", "reason": reason}}
+
+
+def scrape(symbols, workspace, years):
+    """
+    Stage: download and parse the history pages (scrape_parse), convert them (normalize), write the CSV files
+    homework_3 reads (store) and insert the rows into SQLite with main_db.py (store_db)
+    """
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workspace, "mse.db")
+    import main as scraper
+    import main_db
+    import pandas as pd
+    from sqlalchemy import create_engine, text
+
+    storage = os.path.join(workspace, "storage")
+    os.makedirs(storage, exist_ok=True)
+    with create_engine(main_db.DATABASE_URL).connect() as connection:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS stock_data ({DB_COLUMNS})"))
+        connection.commit()
+
+    timings = {}
+    with timed(timings, "scrape_parse"):
+        available = scraper.get_symbols()
+    missing = set(symbols) - set(available)
+    if missing:
+        raise ValueError(f"Symbols missing from the symbol list: {sorted(missing)}")
+
+    for symbol in symbols:
+        rows = []
+        end_date = datetime.now()
+        for _ in range(years):
+            start_date = end_date - timedelta(days=365)
+            with timed(timings, "scrape_parse"):
+                rows.extend(scraper.retrieve_data_for_period(symbol, start_date, end_date))
+            end_date = start_date
+
+        with timed(timings, "normalize", len(rows)):
+            df = scraper.process_data_frame(pd.DataFrame(rows, columns=scraper.columns))
+        with timed(timings, "store", len(df)):
+            df.to_csv(os.path.join(storage, f"{symbol}.csv"), index=False)
+
+        with timed(timings, "store_db", len(rows)), contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_df = main_db.process_data_frame(pd.DataFrame([[symbol] + row for row in rows], columns=main_db.columns))
+            main_db.insert_data_to_db(db_df)
+
+    with open(os.path.join(storage, "codes.txt"), "w") as f:
+        f.write("\n".join(symbols))
+    return timings
+
+
+def news(symbols, workspace, years):
+    """
+    Stage: download and parse the issuer pages and the documents of their latest news,
+    then poll the sentiment endpoint with sentiments stored for them
+    """
+    os.environ["NEWS_DB_PATH"] = os.path.join(workspace, "news.db")
+    import main as news_scraper
+    import news_store
+
+    timings = {}
+    for symbol in symbols:
+        with timed(timings, "news_scrape_parse"):
+            links = news_scraper.fetch_news_links(symbol)
+        if isinstance(links, dict):
+            raise ValueError(f"Could not fetch the news of {symbol}: {links['error']}")
+        for link in links:
+            with timed(timings, "news_scrape_parse"):
+                content = news_scraper.fetch_news_content(link["news_id"])
+            if not isinstance(content, str):
+                raise ValueError(f"Could not fetch document {link['news_id']}: {content}")
+
+        # Sentiments are stored as the ingestion worker would, the NLP service is not part of this stage
+        connection = news_store.connect()
+        try:
+            news_store.save_news(connection, symbol, [
+                {"news_id": link["news_id"], "date": datetime.now().strftime("%Y-%m-%d"), "content": None,
+                 "sentiment": "positive", "score": 0.9} for link in links])
+            news_store.refresh_issuer_sentiment(connection, symbol, [link["news_id"] for link in links])
+        finally:
+            connection.close()
+
+    replay_dashboard(news_scraper.app.test_client(), [f"/news/{symbol}/sentiment" for symbol in symbols],
+                     timings, "sentiment_polling")
+    return timings
+
+
+def indicators(symbols, workspace, years):
+    """
+    Stage: resample the stored data and compute every indicator and signal (indicator_compute),
+    reading and writing the CSV files is reported as indicator_io
+    """
+    from indicators import all_indicators, infer_close_price, read_csv, save
+    from resampling import get_bars
+
+    output = os.path.join(workspace, "indicators")
+    os.makedirs(output, exist_ok=True)
+    timings = {}
+    for symbol in symbols:
+        with timed(timings, "indicator_io", 0):
+            daily = infer_close_price(read_csv(os.path.join(workspace, "storage", f"{symbol}.csv")))
+        for timeframe in TIMEFRAMES:
+            with timed(timings, "indicator_compute") as entry:
+                df = all_indicators(get_bars(symbol, daily, timeframe, os.path.join(workspace, "bars")))
+                entry["rows"] = entry.get("rows", 0) + len(df)
+            with timed(timings, "indicator_io"):
+                save(df, os.path.join(output, f"{symbol}_oscillators_ma_{timeframe}.csv"))
+    return timings
+
+
+def indicator_api(symbols, workspace, years):
+    """
+    Stage: request every indicator of every symbol from the indicators service
+    """
+    from main import app
+
+    client = app.test_client()
+    timings = {}
+    latencies = []
+    for symbol in symbols:
+        for indicator in API_INDICATORS:
+            for timeframe in TIMEFRAMES:
+                with timed(timings, "indicator_api"):
+                    start_time = time.perf_counter()
+                    response = client.get(f"/{symbol}/indicators/{indicator}?frequency={timeframe}&limit=100")
+                    latencies.append(time.perf_counter() - start_time)
+                if response.status_code != 200:
+                    raise ValueError(f"{response.request.path}: {response.status_code} {response.get_data(as_text=True)}")
+    add_latencies(timings["indicator_api"], latencies)
+    replay_dashboard(client, [f"/{symbol}/indicators/{indicator}" for symbol in symbols for indicator in API_INDICATORS],
+                     timings, "indicator_polling")
+    return timings
+
+
+def prepare_models(symbols, workspace, years):
+    """
+    Setup for the prediction stage: save an untrained model per symbol, training is not part of the benchmark
+    """
+    if importlib.util.find_spec("tensorflow") is None:
+        return skipped("prepare_models", "tensorflow is not installed")
+    from main import build_model
+
+    os.makedirs(os.path.join(workspace, "models"), exist_ok=True)
+    timings = {}
+    for symbol in symbols:
+        with timed(timings, "prepare_models"):
+            build_model().save(os.path.join(workspace, "models", f"{symbol}.h5"))
+    return timings
+
+
+def prediction_api(symbols, workspace, years):
+    """
+    Stage: first request per symbol (loads the model and the features) and the requests after it
+    """
+    if importlib.util.find_spec("tensorflow") is None:
+        return skipped("prediction_api", "tensorflow is not installed")
+    missing = [symbol for symbol in symbols if not os.path.exists(os.path.join("models", f"{symbol}.h5"))]
+    if missing:
+        return skipped("prediction_api", f"no models for {missing}")
+    from main import app
+
+    client = app.test_client()
+    timings = {}
+    latencies = {"prediction_api_cold": [], "prediction_api": []}
+    for symbol in symbols:
+        for name in ["prediction_api_cold"] + ["prediction_api"] * WARM_REPEAT:
+            with timed(timings, name):
+                start_time = time.perf_counter()
+                response = client.get(f"/predict?symbol={symbol}")
+                latencies[name].append(time.perf_counter() - start_time)
+            if response.status_code != 200:
+                raise ValueError(f"{symbol}: {response.status_code} {response.get_data(as_text=True)}")
+    for name, values in latencies.items():
+        add_latencies(timings[name], values)
+    replay_dashboard(client, [f"/predict?symbol={symbol}" for symbol in symbols], timings, "prediction_polling")
+    return timings
+
+
+def sentiment_api(symbols, workspace, years):
+    """
+    Stage: score the synthetic news documents with the NLP service, when its model can be loaded
+    """
+    for module in ["torch", "transformers"]:
+        if importlib.util.find_spec(module) is None:
+            return skipped("sentiment_api", f"{module} is not installed")
+    os.environ["NLP_MODEL_LOADING"] = "preload"
+    import main as nlp
+
+    if nlp.pipe is None:
+        return skipped("sentiment_api", f"the model could not be loaded: {nlp.model_error}")
+    client = nlp.app.test_client()
+    timings = {}
+    latencies = []
+    for index, symbol in enumerate(symbols):
+        with timed(timings, "sentiment_api"):
+            start_time = time.perf_counter()
+            response = client.post("/sentiment", json={"text": [render_document(f"{symbol}{index}")]})
+            latencies.append(time.perf_counter() - start_time)
+        if response.status_code != 200:
+            raise ValueError(f"{response.status_code} {response.get_data(as_text=True)}")
+    add_latencies(timings["sentiment_api"], latencies)
+    return timings
+
+
+STAGES = {
+    "scrape": scrape,
+    "news": news,
+    "indicators": indicators,
+    "indicator_api": indicator_api,
+    "prepare_models": prepare_models,
+    "prediction_api": prediction_api,
+    "sentiment_api": sentiment_api,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one stage of the pipeline benchmark")
+    parser.add_argument("stage", choices=list(STAGES))
+    parser.add_argument("--workspace", required=True, help="folder with the data of the previous stages")
+    parser.add_argument("--symbols", required=True, help="comma-separated symbols")
+    parser.add_argument("--years", type=int, default=10, help="years of history scraped per symbol")
+    args = parser.parse_args()
+
+    workspace = os.path.abspath(args.workspace)
+    sys.path.insert(0, os.path.join(ROOT, COMPONENTS[args.stage]))
+    os.chdir(workspace)  # The services read indicators/ and models/ from their working directory
+
+    # The components print progress, stdout is kept for the result
+    with contextlib.redirect_stdout(sys.stderr):
+        result = STAGES[args.stage](args.symbols.split(","), workspace, args.years)
+    print(json.dumps(result))
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+
+from flask import Flask, jsonify, request
+
+from synthetic import get_symbols, render_document, render_history_page, render_issuer_page, render_symbol_list
+
+# Local stand-ins for mse.mk and SEI-Net serving the synthetic data, started by run.py:
+#   STUB_PORT=5098 STUB_SYMBOLS=20 python stubs.py
+#   MSE_HISTORY_URL=http://127.0.0.1:5098/en/stats/symbolhistory/ python ../homework_1/main.py
+app = Flask(__name__)
+
+SYMBOL_COUNT = int(os.getenv("STUB_SYMBOLS", 20))
+
+
+@app.route("/en/stats/symbolhistory/REPL", methods=["GET"])
+def symbol_list():
+    return render_symbol_list(get_symbols(SYMBOL_COUNT))
+
+
+@app.route("/en/stats/symbolhistory/<string:code>", methods=["POST"])
+def symbol_history(code):
+    data = request.get_json()
+    try:
+        from_date = datetime.strptime(data["FromDate"], "%m/%d/%Y").date()
+        to_date = datetime.strptime(data["ToDate"], "%m/%d/%Y").date()
+    except (TypeError, KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid period: {e}"}), 400
+    return render_history_page(code, from_date, to_date)
+
+
+@app.route("/en/symbol/<string:issuer>", methods=["GET"])
+def issuer_page(issuer):
+    return render_issuer_page(issuer)
+
+
+@app.route("/public/documents/single/<string:news_id>", methods=["GET"])
+def document(news_id):
+    return jsonify({"data": {"content": render_document(news_id)}})
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "ok"})
+
+
+if __name__ == "__main__":
+    port = os.getenv("STUB_PORT", 5098)
+    app.run(host='127.0.0.1', port=port, threaded=True)
@@ -0,0 +1,146 @@
+import hashlib
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+# ---------------------------
+# Configuration
+# ---------------------------
+HISTORY_DAYS = 11 * 366  # Days of history generated per symbol, more than the 10 years homework_1 asks for
+YOUNG_SHARE = 0.3  # Share of the symbols listed during the generated period, the others trade from its start
+NEWS_PER_ISSUER = 5  # News links on a synthetic issuer page
+DOCUMENT_PARAGRAPHS = 6  # Paragraphs of a synthetic SEI-Net document
+
+
+def get_seed(*values):
+    """
+    Function to get a seed that is the same in every process for the same values
+    :param values: strings or numbers
+    :return: int
+    """
+    return int(hashlib.md5("/".join(map(str, values)).encode("utf-8")).hexdigest(), 16) % 2 ** 32
+
+
+def get_symbols(count):
+    """
+    Function to get synthetic issuer codes shaped like the MSE ones
+    :param count: number of symbols
+    :return: list of 4-letter codes
+    """
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return ["".join(letters[(index // 26 ** power) % 26] for power in (3, 2, 1, 0)) for index in range(count)]
+
+
+def format_number(value, decimals=2):
+    """
+    Function to format a number the way the English mse.mk pages do: 1,234.50
+    :param value: the number
+    :param decimals: digits after the decimal point
+    :return: string
+    """
+    return f"{value:,.{decimals}f}"
+
+
+@lru_cache(maxsize=1024)
+def get_history(symbol, end=None):
+    """
+    Function to generate the trading history of a symbol: business days only, a random walk of prices
+    and about a quarter of the days without trades, as for the thinly traded MSE issuers.
+    Some symbols are only listed during the period (see YOUNG_SHARE).
+    :param symbol: issuer code
+    :param end: last date (defaults to today)
+    :return: list of (date, last, max, min, avg, change, volume, best turnover, total turnover), oldest first
+    """
+    end = end or date.today()
+    rng = np.random.default_rng(get_seed(symbol))
+    days = [end - timedelta(days=offset) for offset in range(HISTORY_DAYS, -1, -1)]
+    days = [day for day in days if day.weekday() < 5]
+    listing = np.random.default_rng(get_seed("listing", symbol))
+    if listing.random() < YOUNG_SHARE:
+        days = days[int(listing.uniform(0.2, 0.95) * len(days)):]
+
+    price = float(rng.uniform(100, 30000))
+    rows = []
+    for day in days:
+        if rng.random() < 0.25:
+            continue  # No trades on this day
+        previous = price
+        price = max(1.0, price * float(np.exp(rng.normal(0, 0.015))))
+        high = price * (1 + abs(float(rng.normal(0, 0.005))))
+        low = price * (1 - abs(float(rng.normal(0, 0.005))))
+        volume = int(rng.integers(1, 3000))
+        turnover = volume * (high + low) / 2
+        rows.append((day, price, high, low, (high + low) / 2, (price / previous - 1) * 100, volume,
+                     turnover, turnover * float(rng.choice([1.0, 1.0, 1.2]))))
+    return rows
+
+
+def render_symbol_list(symbols):
+    """
+    Function to render the symbol history page with the issuer dropdown read by homework_1 get_symbols
+    :param symbols: issuer codes
+    :return: html
+    """
+    options = "".join(f'<option value="{symbol}">{symbol}</option>' for symbol in symbols)
+    return f'<html><body><form><select id="Code" name="Code">{options}</select></form></body></html>'
+
+
+def render_history_page(symbol, from_date, to_date):
+    """
+    Function to render the results table of the symbol history page for a period, newest day first
+    :param symbol: issuer code
+    :param from_date: first date
+    :param to_date: last date
+    :return: html
+    """
+    rows = []
+    for day, last, high, low, average, change, volume, best, total in reversed(get_history(symbol)):
+        if from_date <= day <= to_date:
+            cells = [day.strftime("%-m/%-d/%Y"), format_number(last), format_number(high), format_number(low),
+                     format_number(average), format_number(change), format_number(volume, 0),
+                     format_number(best, 0), format_number(total, 0)]
+            rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+    return (f'<html><head><title>{symbol}</title></head><body><table id="resultsTable"><thead><tr>'
+            f'<th>Date</th><th>Last trade price</th><th>Max</th><th>Min</th><th>Avg. Price</th><th>%chg.</th>'
+            f'<th>Volume</th><th>Turnover in BEST in denars</th><th>Total turnover in denars</th></tr></thead>'
+            f'<tbody>{"".join(rows)}</tbody></table></body></html>')
+
+
+def get_news_ids(issuer):
+    """
+    Function to get the ids of the synthetic news of an issuer
+    :param issuer: issuer code
+    :return: list of ids
+    """
+    return [100000 + get_seed(issuer) % 100000 * 10 + index for index in range(NEWS_PER_ISSUER)]
+
+
+def render_issuer_page(issuer):
+    """
+    Function to render an issuer page of mse.mk with its latest news block, after a long page header
+    :param issuer: issuer code
+    :return: html
+    """
+    header = "".join(f'<div class="menu-item"><a href="/en/page/{index}">Menu {index}</a></div>' for index in range(200))
+    links = "".join(
+        f'<a href="https://seinet.com.mk/document/{news_id}">'
+        f'<ul><li><h4>{issuer} announcement {index}</h4></li><li><h4>{1 + index % 12}/{1 + index}/2025</h4></li></ul></a>'
+        for index, news_id in enumerate(get_news_ids(issuer))
+    )
+    return (f'<html><head><title>{issuer}</title></head><body>{header}<div id="symbol-info"><h1>{issuer}</h1></div>'
+            f'<div id="seiNetIssuerLatestNews">{links}</div><footer>{header}</footer></body></html>')
+
+
+def render_document(news_id):
+    """
+    Function to render the content of a SEI-Net document, with a repeated boilerplate paragraph
+    :param news_id: document id
+    :return: html content
+    """
+    rng = np.random.default_rng(get_seed("document", news_id))
+    words = ["revenue", "profit", "growth", "decline", "dividend", "board", "shares", "quarter", "loss", "market"]
+    paragraphs = [f"<p>Announcement {news_id}: " + " ".join(rng.choice(words, 60)) + ".</p>"
+                  for _ in range(DOCUMENT_PARAGRAPHS)]
+    paragraphs.append("<p>This announcement is published in accordance with the Law on Securities.</p>")
+    return "\n\n".join(paragraphs)
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+# Archive of the raw symbol history responses, so the history can be parsed again without scraping mse.mk:
+#   objects/ab/abcdef....html.gz  every distinct response once, named by the SHA-256 of its content
+#   index.db                      (symbol, from, to) -> hash of the last response fetched for that window
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "../shared/storage/archive")
+COMPRESS_LEVEL = 6  # gzip level, the pages are repetitive html and compress about 20x
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    symbol TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, from_date, to_date)
+);
+"""
+
+
+def connect(path=ARCHIVE_PATH):
+    """
+    Function to open the archive index, creating the archive if needed
+    :param path: archive folder
+    :return: connection
+    """
+    os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(path, "index.db"), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")  # Several scraper processes write to the index at once
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_object_path(sha256, path=ARCHIVE_PATH):
+    return os.path.join(path, "objects", sha256[:2], f"{sha256}.html.gz")
+
+
+def save_response(symbol, start_date, end_date, content, path=ARCHIVE_PATH):
+    """
+    Function to archive a raw response. A response already in the archive is not written again.
+    :param symbol: company key
+    :param start_date: first date of the window
+    :param end_date: last date of the window
+    :param content: response text
+    :param path: archive folder
+    :return: the SHA-256 of the content
+    """
+    data = content.encode("utf-8")
+    sha256 = hashlib.sha256(data).hexdigest()
+    object_path = get_object_path(sha256, path)
+    if not os.path.exists(object_path):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temporary_path = f"{object_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0))
+        os.replace(temporary_path, object_path)  # Readers never see a partial object
+
+    connection = connect(path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (symbol, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), sha256, len(data),
+                 datetime.now().isoformat(timespec="seconds")))
+    finally:
+        connection.close()
+    return sha256
+
+
+def load_response(sha256, path=ARCHIVE_PATH):
+    """
+    Function to read an archived response, checking its content against its hash
+    :param sha256: hash of the response
+    :param path: archive folder
+    :return: response text
+    """
+    with open(get_object_path(sha256, path), "rb") as f:
+        data = gzip.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != sha256:
+        raise ValueError(f"Archived response {sha256} is corrupted")
+    return data.decode("utf-8")
+
+
+def get_windows(symbol=None, path=ARCHIVE_PATH):
+    """
+    Function to list the archived windows, newest first
+    :param symbol: company key, or None for every symbol
+    :param path: archive folder
+    :return: list of {"symbol", "from_date", "to_date", "sha256"}
+    """
+    connection = connect(path)
+    try:
+        query = "SELECT symbol, from_date, to_date, sha256 FROM responses"
+        rows = connection.execute(query + " WHERE symbol = ? ORDER BY to_date DESC", (symbol,)) if symbol \
+            else connection.execute(query + " ORDER BY symbol, to_date DESC")
+        return [dict(row) for row in rows]
+    finally:
+        connection.close()
+
+
+def get_symbols(path=ARCHIVE_PATH):
+    """
+    Function to get the symbols with archived responses
+    :param path: archive folder
+    :return: list of company keys
+    """
+    connection = connect(path)
+    try:
+        return [row["symbol"] for row in connection.execute("SELECT DISTINCT symbol FROM responses ORDER BY symbol")]
+    finally:
+        connection.close()
@@ -0,0 +1,115 @@
+import fcntl
+import json
+import os
+from datetime import datetime, timedelta
+
+# ---------------------------
+# Configuration
+# ---------------------------
+WINDOW_DAYS = 365  # Longest period the symbol history page returns in one request
+LISTINGS_PATH = os.getenv("LISTINGS_PATH", "../shared/storage/listings.json")  # symbol -> first trading date
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def get_earliest_date(end_date, years):
+    """
+    Function to get the oldest date of a cold-start backfill: years windows of 365 days plus one day per leap year
+    :param end_date: last date of the backfill
+    :param years: number of years
+    :return: datetime
+    """
+    leap_years_count = sum(is_leap_year(end_date.year - i) for i in range(years))
+    return end_date - timedelta(days=WINDOW_DAYS * years + leap_years_count)
+
+
+def plan_windows(end_date, earliest_date, first_trading_date=None):
+    """
+    Function to plan the request windows of a backfill, newest first. The windows do not overlap
+    (each one ends the day before the next newer one starts) and none starts before the first trading date.
+    :param end_date: last date to fetch
+    :param earliest_date: oldest date to fetch
+    :param first_trading_date: first trading date of the symbol if known
+    :return: list of (start_date, end_date)
+    """
+    if first_trading_date is not None:
+        earliest_date = max(earliest_date, first_trading_date)
+    windows = []
+    while end_date >= earliest_date:
+        start_date = max(end_date - timedelta(days=WINDOW_DAYS), earliest_date)
+        windows.append((start_date, end_date))
+        end_date = start_date - timedelta(days=1)
+    return windows
+
+
+def backfill(code, fetch, end_date, earliest_date, first_trading_date=None, date_index=0):
+    """
+    Function to fetch the history of a symbol window by window, walking backwards.
+    It stops at the first window without trades once trades were found: the symbol was not listed before,
+    and that first trading date is returned so later runs never ask for older windows.
+    :param code: symbol
+    :param fetch: function (code, start_date, end_date) -> list of rows, e.g. retrieve_data_for_period
+    :param end_date: last date to fetch
+    :param earliest_date: oldest date to fetch
+    :param first_trading_date: first trading date of the symbol if known
+    :param date_index: position of the m/d/yyyy date in a row
+    :return: (rows, first trading date or None if the history may go back further)
+    """
+    rows = []
+    windows = plan_windows(end_date, earliest_date, first_trading_date)
+    for fetched, (start_date, window_end_date) in enumerate(windows, start=1):
+        period_data = fetch(code, start_date, window_end_date)
+        if not period_data and rows:
+            print(f"No trades for {code} before {window_end_date:%d.%m.%Y}, skipping the older windows")
+            break
+        rows.extend(period_data)
+    else:
+        # Every window was fetched: only a known first trading date is certain
+        return rows, first_trading_date
+
+    first_date = min(datetime.strptime(row[date_index], '%m/%d/%Y') for row in rows)
+    print(f"{code}: first trading date {first_date:%d.%m.%Y}, {fetched} of {len(windows)} windows fetched")
+    return rows, first_date
+
+
+def load_listings(path=LISTINGS_PATH):
+    """
+    Function to load the recorded first trading dates
+    :param path: path to the JSON file
+    :return: dict symbol -> datetime
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {code: datetime.strptime(value, DATE_FORMAT) for code, value in json.load(f).items()}
+
+
+def save_listings(listings, path=LISTINGS_PATH):
+    """
+    Function to save the first trading dates, replacing the file at once so a reader never sees half of it
+    :param listings: dict symbol -> datetime
+    :param path: path to the JSON file
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump({code: value.strftime(DATE_FORMAT) for code, value in sorted(listings.items())}, f, indent=2)
+    os.replace(temporary_path, path)
+
+
+def update_listings(first_trading_dates, path=LISTINGS_PATH):
+    """
+    Function to record first trading dates in the saved ones. The file is read, changed and saved under a lock,
+    so processes recording different symbols at the same time (e.g. scrape workers) do not drop each other's dates.
+    :param first_trading_dates: dict symbol -> datetime
+    :param path: path to the JSON file
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+        listings = load_listings(path)
+        listings.update(first_trading_dates)
+        save_listings(listings, path)
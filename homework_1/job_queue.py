@@ -0,0 +1,271 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+
+from sqlalchemy import (Column, Float, Index, Integer, MetaData, String, Table, Text, and_, create_engine, event, func,
+                        insert, select, update)
+
+# Job queue shared by the scrape workers (homework_1/worker.py) and the indicator workers (homework_3/rsi/worker.py),
+# which import this module from here. Any number of workers on any number of hosts pull from the same table:
+# a worker leases a job, extends the lease with heartbeats while it runs, and a job whose lease expires
+# (its worker died) goes back to the queue. A job that failed max_attempts times is dead-lettered.
+
+# ---------------------------
+# Configuration
+# ---------------------------
+# The default SQLite file is found from this file, so every worker uses the same one whatever its working directory
+STORAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared", "storage")
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", f"sqlite:///{os.path.join(STORAGE_PATH, 'jobs.db')}")  # Or a MySQL database
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))  # A job is reclaimed this long after its last heartbeat
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))  # Wait between two claims when the queue is empty
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))  # Attempts before a job is dead-lettered
+BACKOFF_BASE = 5.0  # Seconds before the first retry, doubled on every retry
+
+PENDING, RUNNING, DONE, DEAD = "pending", "running", "done", "dead"
+
+metadata = MetaData()
+jobs = Table(
+    "jobs", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(32), nullable=False),  # e.g. scrape, indicators
+    Column("job_key", String(64), nullable=False),  # e.g. the symbol
+    Column("payload", Text),  # JSON arguments of the job
+    Column("status", String(16), nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False),
+    Column("owner", String(128)),  # Worker holding the lease
+    Column("lease_until", Float),  # Epoch seconds
+    Column("available_at", Float, nullable=False),  # A retried job waits for its backoff
+    Column("last_error", Text),
+    Column("created_at", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+    Index("jobs_claim", "status", "available_at"),
+    Index("jobs_key", "kind", "job_key"),
+)
+
+
+def get_engine(url=JOB_QUEUE_URL):
+    """
+    Function to connect to the queue database, creating the table if needed
+    :param url: SQLAlchemy URL
+    :return: engine
+    """
+    if url.startswith("sqlite:///"):
+        directory = os.path.dirname(url[len("sqlite:///"):])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        engine = create_engine(url, connect_args={"timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None  # Transactions are started below instead of by the driver
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+        @event.listens_for(engine, "begin")
+        def on_begin(connection):
+            # Take the write lock at the start: a transaction that reads and then writes could otherwise
+            # fail at once when another worker wrote in between, instead of waiting for the lock
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        engine = create_engine(url, pool_pre_ping=True)
+    metadata.create_all(engine)
+    return engine
+
+
+def get_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(engine, kind, job_key, payload=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Function to add a job, unless the same job is already waiting or running
+    :param engine: queue engine
+    :param kind: job kind
+    :param job_key: job key, e.g. the symbol
+    :param payload: dict of arguments
+    :param max_attempts: attempts before the job is dead-lettered
+    :return: id of the new job, or None if it was already queued
+    """
+    now = time.time()
+    with engine.begin() as connection:
+        queued = connection.execute(select(jobs.c.id).where(
+            jobs.c.kind == kind, jobs.c.job_key == job_key, jobs.c.status.in_([PENDING, RUNNING]))).first()
+        if queued is not None:
+            return None
+        result = connection.execute(insert(jobs).values(
+            kind=kind, job_key=job_key, payload=json.dumps(payload or {}), status=PENDING, attempts=0,
+            max_attempts=max_attempts, available_at=now, created_at=now, updated_at=now))
+        return result.inserted_primary_key[0]
+
+
+def reclaim_expired(engine):
+    """
+    Function to put back the jobs of workers that stopped sending heartbeats,
+    or dead-letter them when they used their last attempt
+    :param engine: queue engine
+    :return: number of reclaimed jobs
+    """
+    now = time.time()
+    expired = and_(jobs.c.status == RUNNING, jobs.c.lease_until < now)
+    with engine.begin() as connection:
+        connection.execute(update(jobs).where(expired, jobs.c.attempts >= jobs.c.max_attempts).values(
+            status=DEAD, owner=None, last_error="lease expired on the last attempt", updated_at=now))
+        result = connection.execute(update(jobs).where(expired).values(
+            status=PENDING, owner=None, last_error="lease expired", available_at=now, updated_at=now))
+        return result.rowcount
+
+
+def claim(engine, worker_id, kinds, lease_seconds=LEASE_SECONDS):
+    """
+    Function to lease the oldest available job. Workers race for a job with a conditional update,
+    so it works the same on SQLite and MySQL and only one of them gets it.
+    :param engine: queue engine
+    :param worker_id: id of the worker
+    :param kinds: job kinds the worker handles
+    :param lease_seconds: lease length
+    :return: dict with the job columns and the decoded payload, or None if no job is available
+    """
+    reclaim_expired(engine)
+    while True:
+        now = time.time()
+        with engine.begin() as connection:
+            candidates = connection.execute(
+                select(jobs.c.id).where(jobs.c.status == PENDING, jobs.c.available_at <= now, jobs.c.kind.in_(kinds))
+                .order_by(jobs.c.available_at, jobs.c.id).limit(10)).scalars().all()
+            if not candidates:
+                return None
+            for job_id in candidates:
+                result = connection.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == PENDING).values(
+                    status=RUNNING, owner=worker_id, lease_until=now + lease_seconds, attempts=jobs.c.attempts + 1,
+                    updated_at=now))
+                if result.rowcount == 1:
+                    job = dict(connection.execute(select(jobs).where(jobs.c.id == job_id)).mappings().one())
+                    job["payload"] = json.loads(job["payload"] or "{}")
+                    return job
+        # Other workers took every candidate, look again
+
+
+def heartbeat(engine, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+    """
+    Function to extend the lease of a running job
+    :return: False if the worker lost the lease (it expired and the job was reclaimed)
+    """
+    now = time.time()
+    with engine.begin() as connection:
+        result = connection.execute(update(jobs).where(
+            jobs.c.id == job_id, jobs.c.owner == worker_id, jobs.c.status == RUNNING).values(
+            lease_until=now + lease_seconds, updated_at=now))
+        return result.rowcount == 1
+
+
+def complete(engine, job_id, worker_id):
+    """
+    Function to mark a job as done
+    :return: False if the worker no longer held the lease
+    """
+    with engine.begin() as connection:
+        result = connection.execute(update(jobs).where(
+            jobs.c.id == job_id, jobs.c.owner == worker_id, jobs.c.status == RUNNING).values(
+            status=DONE, owner=None, lease_until=None, last_error=None, updated_at=time.time()))
+        return result.rowcount == 1
+
+
+def fail(engine, job_id, worker_id, error):
+    """
+    Function to record a failed attempt: the job is retried after a backoff, or dead-lettered after its last attempt
+    :return: the new status, or None if the worker no longer held the lease
+    """
+    now = time.time()
+    with engine.begin() as connection:
+        job = connection.execute(select(jobs.c.attempts, jobs.c.max_attempts).where(
+            jobs.c.id == job_id, jobs.c.owner == worker_id, jobs.c.status == RUNNING)).first()
+        if job is None:
+            return None
+        status = DEAD if job.attempts >= job.max_attempts else PENDING
+        connection.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.owner == worker_id).values(
+            status=status, owner=None, lease_until=None, last_error=error[-4000:],
+            available_at=now + BACKOFF_BASE * 2 ** (job.attempts - 1), updated_at=now))
+        return status
+
+
+def retry_dead(engine, kind=None):
+    """
+    Function to put the dead-lettered jobs back in the queue with fresh attempts
+    :return: number of jobs put back
+    """
+    now = time.time()
+    condition = jobs.c.status == DEAD if kind is None else and_(jobs.c.status == DEAD, jobs.c.kind == kind)
+    with engine.begin() as connection:
+        return connection.execute(update(jobs).where(condition).values(
+            status=PENDING, attempts=0, available_at=now, updated_at=now)).rowcount
+
+
+def get_counts(engine):
+    """
+    Function to count the jobs of every kind and status
+    :return: dict kind -> dict status -> count
+    """
+    with engine.connect() as connection:
+        rows = connection.execute(select(jobs.c.kind, jobs.c.status, func.count()).group_by(jobs.c.kind, jobs.c.status))
+        counts = {}
+        for kind, status, count in rows:
+            counts.setdefault(kind, {})[status] = count
+        return counts
+
+
+def run_worker(engine, handlers, worker_id=None, lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS,
+               stop_when_empty=False):
+    """
+    Function to run jobs until stopped: claim a job, run its handler while a thread sends heartbeats,
+    then mark it done or failed
+    :param engine: queue engine
+    :param handlers: dict kind -> function(job_key, payload)
+    :param worker_id: id of the worker (default host:pid)
+    :param lease_seconds: lease length, heartbeats are sent every third of it
+    :param poll_seconds: wait when the queue is empty
+    :param stop_when_empty: return once no job is available (e.g. for a batch run)
+    :return: number of jobs run to the end with their lease held, i.e. whose done or failed status was recorded
+    """
+    worker_id = worker_id or get_worker_id()
+    count = 0
+    while True:
+        job = claim(engine, worker_id, list(handlers), lease_seconds)
+        if job is None:
+            if stop_when_empty:
+                return count
+            time.sleep(poll_seconds)
+            continue
+
+        stop = threading.Event()
+        name = f"Job {job['id']} {job['kind']} {job['job_key']}"
+
+        def send_heartbeats():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    if not heartbeat(engine, job["id"], worker_id, lease_seconds):
+                        return  # Reported below, when the outcome cannot be recorded
+                except Exception as e:
+                    print(f"{name}: heartbeat failed, retrying: {e}")  # The lease may still be extended in time
+
+        heartbeats = threading.Thread(target=send_heartbeats, name="heartbeat", daemon=True)
+        heartbeats.start()
+        try:
+            handlers[job["kind"]](job["job_key"], job["payload"])
+            recorded, outcome = complete(engine, job["id"], worker_id), "done"
+        except Exception as e:
+            status = fail(engine, job["id"], worker_id, traceback.format_exc())
+            recorded, outcome = status is not None, f"failed (attempt {job['attempts']}, {status}): {e}"
+        finally:
+            stop.set()
+            heartbeats.join()
+
+        if not recorded:
+            # The lease expired and the job was reclaimed, it may be running elsewhere: this run does not count
+            print(f"{name} lost: worker {worker_id} lost its lease before the job ended, "
+                  f"the run was not recorded ({outcome})")
+            continue
+        print(f"{name} {outcome}")
+        count += 1
@@ -1,24 +1,28 @@
+import argparse
+import functools
 import re
+import sys
 from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 import pandas as pd
 import concurrent.futures
 import os
-import requests
+import archive
+# HTTP client shared with the news scraper (homework_4/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "homework_4", "common"))
+import http_client
+from backfill import backfill, get_earliest_date, load_listings, update_listings
 
 # Define column names
 columns = ['Date', 'Last trade price', 'Max', 'Min', 'Avg.', 'Price %chg.', 'Volume', 'Turnover in BEST in denars',
            'Total turnover in denars']
 
 # Set up the base URL and number of years
-base_url = "https://www.mse.mk/en/stats/symbolhistory/"
+base_url = os.getenv("MSE_HISTORY_URL", "https://www.mse.mk/en/stats/symbolhistory/")
 years = 10
-
-
-# Function to check leap year
-def is_leap_year(year):
-    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+# Keep every raw history response in the archive (see archive.py), so the history can be rebuilt with --replay
+archive_responses = os.getenv("ARCHIVE_RESPONSES", "0") == "1"
 
 
 def has_numbers(inputString):
@@ -26,8 +30,8 @@ def has_numbers(inputString):
 
 
 def get_symbols():
-    url = "https://www.mse.mk/en/stats/symbolhistory/REPL"
-    response = requests.get(url)
+    url = base_url + "REPL"
+    response = http_client.get(url)
 
     soup = BeautifulSoup(response.text, 'html.parser')
     codes = soup.select('#Code > option')
@@ -36,18 +40,26 @@ def get_symbols():
     return code_list
 
 
-def retrieve_data_for_period(code, start_date, end_date): #filter 3
+def retrieve_data_for_period(code, start_date, end_date, archive_response=False): #filter 3
     if start_date > end_date:
         raise ValueError("start_date must be less than end_date")
     if end_date - start_date > timedelta(days=365):
         raise ValueError("end_date must be greater than start date")
     url = base_url + code
 
-    data = requests.post(url,
-                         json={'FromDate': start_date.strftime('%m/%d/%Y'), 'ToDate': end_date.strftime('%m/%d/%Y')})
+    data = http_client.post(url,
+                             json={'FromDate': start_date.strftime('%m/%d/%Y'), 'ToDate': end_date.strftime('%m/%d/%Y')})
+    if archive_response and data.status_code == 200:
+        archive.save_response(code, start_date, end_date, data.text)
 
+    period_data = parse_period(data.text)
+    print(f"Retrieved data for {code} from {start_date} to {end_date}")
+    return period_data
+
+
+def parse_period(page):
     # Parse the HTML and extract the table rows
-    soup = BeautifulSoup(data.text, 'html.parser')
+    soup = BeautifulSoup(page, 'html.parser')
     rows = soup.select("#resultsTable tbody tr")
 
     # Collect the data
@@ -57,7 +69,6 @@ def retrieve_data_for_period(code, start_date, end_date): #filter 3
         data = [cell.get_text(strip=True) for cell in cells]
         period_data.append(data)
 
-    print(f"Retrieved data for {code} from {start_date} to {end_date}")
     return period_data
 
 def process_data_frame(df):
@@ -88,11 +99,15 @@ def read_latest_date_from_csv(code): # filter 2
     return None
 
 
-def retrieve_data_for_code(code):
+def retrieve_data_for_code(code, first_trading_date=None, archive_response=None):
+    # Returns the first trading date found by a cold-start backfill (see backfill.py), or None.
+    # archive_response: keep the raw responses in the archive (default: ARCHIVE_RESPONSES)
+    if archive_response is None:
+        archive_response = archive_responses
+    fetch = functools.partial(retrieve_data_for_period, archive_response=archive_response)
     all_data = []
     exists = False
     start_date = datetime.now()
-    leap_years_count = sum(is_leap_year(start_date.year - i) for i in range(years))
     latest_date = read_latest_date_from_csv(code)
 
     if latest_date is not None:
@@ -101,21 +116,13 @@ def retrieve_data_for_code(code):
         latest_date = datetime.strptime(latest_date, '%d.%m.%Y')
         start_date = latest_date + timedelta(days=1)
         end_date = datetime.now()
-        period_data = retrieve_data_for_period(code, start_date, end_date)
-        all_data.extend(period_data)
-    else:
-        for i in range(years):
-            end_date = start_date
-            start_date = end_date - timedelta(days=365)
-            period_data = retrieve_data_for_period(code, start_date, end_date)
-            all_data.extend(period_data)
-
-        # Handle any remaining leap days in the last interval
-        if leap_years_count > 0:
-            end_date = start_date
-            start_date = end_date - timedelta(days=leap_years_count)
-            period_data = retrieve_data_for_period(code, start_date, end_date)
+        if start_date <= end_date:  # Nothing to fetch when the data is already up to date
+            period_data = fetch(code, start_date, end_date)
             all_data.extend(period_data)
+    else:
+        # Walk back from today in non-overlapping windows, stopping before the symbol was listed
+        all_data, first_trading_date = backfill(code, fetch, start_date,
+                                                get_earliest_date(start_date, years), first_trading_date)
 
     path = os.path.join("../shared/storage", f"{code}.csv")
     new_df = pd.DataFrame(all_data, columns=columns)
@@ -136,24 +143,89 @@ def retrieve_data_for_code(code):
     else:
         new_df.to_csv(path, index=False)
     print(f"Data saved to {path} for {code}")
+    return first_trading_date
 
 
+def replay_code(code):
+    # Rebuild a symbol's CSV from its archived responses, without contacting mse.mk.
+    # Rows of the existing CSV on dates no archived window covers (e.g. scraped before archiving was turned on)
+    # are kept. Returns (rows written, rows kept from the existing CSV).
+    all_data = []
+    windows = archive.get_windows(code)  # Newest window first, as when scraping
+    for window in windows:
+        all_data.extend(parse_period(archive.load_response(window["sha256"])))
+
+    new_df = pd.DataFrame(all_data, columns=columns)
+    new_df = new_df.drop_duplicates(subset='Date', keep='first')  # Older archives have overlapping windows
+    new_df = process_data_frame(new_df)
+    path = os.path.join("../shared/storage", f"{code}.csv")
+
+    kept = 0
+    if os.path.exists(path):
+        existing_df = pd.read_csv(path, dtype=str)
+        dates = pd.to_datetime(existing_df['Date'], format='%d.%m.%Y')
+        covered = pd.Series(False, index=existing_df.index)
+        for window in windows:
+            covered |= (dates >= window["from_date"]) & (dates <= window["to_date"])
+        existing_df = existing_df[~covered]
+        kept = len(existing_df)
+        if kept:
+            new_df = pd.concat([new_df, existing_df], ignore_index=True)
+            order = pd.to_datetime(new_df['Date'], format='%d.%m.%Y').sort_values(ascending=False, kind='stable')
+            new_df = new_df.loc[order.index]  # Newest first, as when scraping
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    new_df.to_csv(temporary_path, index=False)
+    os.replace(temporary_path, path)  # The old CSV stays whole if the rebuild fails
+    return len(new_df), kept
+
+
+def replay():
+    # Re-run parse, normalize and store for every archived symbol, one process per core
+    codes = archive.get_symbols()
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {executor.submit(replay_code, code): code for code in codes}
+        for future in concurrent.futures.as_completed(futures):
+            code = futures[future]
+            try:
+                rows, kept = future.result()
+                print(f"Rebuilt {code} from the archive: {rows} rows, {kept} of them kept from the CSV")
+            except Exception as e:
+                print(f"Error rebuilding {code}: {e}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the history of every symbol from mse.mk")
+    parser.add_argument("--archive", action="store_true", help="keep every raw response in the archive")
+    parser.add_argument("--replay", action="store_true",
+                        help="rebuild the CSV files from the archive instead of scraping (offline)")
+    args = parser.parse_args()
+
     start_time = datetime.now()
     os.makedirs("../shared/storage", exist_ok=True)  # Ensure storage directory exists
+    if args.replay:
+        replay()
+        print(f"Total time taken: {(datetime.now() - start_time).total_seconds()} seconds")
+        raise SystemExit
+
     codes = get_symbols()
+    listings = load_listings()  # First trading dates found by earlier backfills
+    found = {}
 
     # with concurrent.futures.ThreadPoolExecutor() as executor:
     with ProcessPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(retrieve_data_for_code, code): code for code in codes}
+        futures = {executor.submit(retrieve_data_for_code, code, listings.get(code), archive_responses or args.archive):
+                   code for code in codes}
         for future in concurrent.futures.as_completed(futures):
             code = futures[future]
             try:
-                future.result()
+                first_trading_date = future.result()
+                if first_trading_date is not None and first_trading_date != listings.get(code):
+                    found[code] = first_trading_date
                 print(f"Completed retrieval for {code}")
             except Exception as e:
                 print(f"Error retrieving data for {code}: {e}")
+    update_listings(found)  # Merged into the saved dates, workers may have recorded others meanwhile
 
     end_time = datetime.now()
     print(f"Total time taken: {(end_time - start_time).total_seconds()} seconds")
@@ -1,11 +1,18 @@
+import argparse
+import functools
 import re
+import sys
 from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 import pandas as pd
 import concurrent.futures
 import os
-import requests
+import archive
+# HTTP client shared with the news scraper (homework_4/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "homework_4", "common"))
+import http_client
+from backfill import backfill, get_earliest_date, load_listings, update_listings
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 
@@ -22,12 +29,10 @@ columns = ['company_key', 'Date', 'Last trade price', 'Max', 'Min', 'Avg.', 'Pri
 db_cols = ['company_key', 'date', 'price', 'max', 'min', 'average_price', 'price_change', 'volume', 'best_turnover', 'total_turnover']
 
 # Set up the base URL and number of years
-base_url = "https://www.mse.mk/en/stats/symbolhistory/"
+base_url = os.getenv("MSE_HISTORY_URL", "https://www.mse.mk/en/stats/symbolhistory/")
 years = 10
-
-
-def is_leap_year(year):
-    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+# Keep every raw history response in the archive (see archive.py), shared with main.py --replay
+archive_responses = os.getenv("ARCHIVE_RESPONSES", "0") == "1"
 
 
 def has_numbers(inputString):
@@ -35,8 +40,8 @@ def has_numbers(inputString):
 
 
 def get_symbols():
-    url = "https://www.mse.mk/en/stats/symbolhistory/REPL"
-    response = requests.get(url)
+    url = base_url + "REPL"
+    response = http_client.get(url)
 
     soup = BeautifulSoup(response.text, 'html.parser')
     codes = soup.select('#Code > option')
@@ -45,15 +50,17 @@ def get_symbols():
     return code_list
 
 
-def retrieve_data_for_period(code, start_date, end_date):  # Filter 3
+def retrieve_data_for_period(code, start_date, end_date, archive_response=False):  # Filter 3
     if start_date > end_date:
         raise ValueError("start_date must be less than end_date")
     if end_date - start_date > timedelta(days=365):
         raise ValueError("end_date must be greater than start date")
     url = base_url + code
 
-    data = requests.post(url,
-                         json={'FromDate': start_date.strftime('%m/%d/%Y'), 'ToDate': end_date.strftime('%m/%d/%Y')})
+    data = http_client.post(url,
+                             json={'FromDate': start_date.strftime('%m/%d/%Y'), 'ToDate': end_date.strftime('%m/%d/%Y')})
+    if archive_response and data.status_code == 200:
+        archive.save_response(code, start_date, end_date, data.text)
 
     # Parse the HTML and extract the table rows
     soup = BeautifulSoup(data.text, 'html.parser')
@@ -168,14 +175,18 @@ def read_latest_dates_from_db():
 
 
 
-def retrieve_data_for_code(code, latest_dates, years=5):
+def retrieve_data_for_code(code, latest_dates, years=5, first_trading_date=None, archive_response=None):
     """
     Retrieve data for a specific code, considering the latest date available in the database.
+    Returns the first trading date found by a cold-start backfill (see backfill.py), or None.
+    archive_response: keep the raw responses in the archive (default: ARCHIVE_RESPONSES)
     """
+    if archive_response is None:
+        archive_response = archive_responses
+    fetch = functools.partial(retrieve_data_for_period, archive_response=archive_response)
     all_data = []
     exists = False
     start_date = datetime.now()
-    leap_years_count = sum(is_leap_year(start_date.year - i) for i in range(years))
 
     # Check the latest date for the code
     latest_date = latest_dates.get(code) 
@@ -186,42 +197,48 @@ def retrieve_data_for_code(code, latest_dates, years=5):
         latest_date = datetime.strptime(latest_date, '%Y-%m-%d')
         start_date = latest_date + timedelta(days=1)
         end_date = datetime.now()
-        period_data = retrieve_data_for_period(code, start_date, end_date)
-        all_data.extend(period_data)
-    else:
-        for i in range(years):
-            end_date = start_date
-            start_date = end_date - timedelta(days=365)
-            period_data = retrieve_data_for_period(code, start_date, end_date)
-            all_data.extend(period_data)
-
-        if leap_years_count > 0:
-            end_date = start_date
-            start_date = end_date - timedelta(days=leap_years_count)
-            period_data = retrieve_data_for_period(code, start_date, end_date)
+        if start_date <= end_date:  # Nothing to fetch when the data is already up to date
+            period_data = fetch(code, start_date, end_date)
             all_data.extend(period_data)
+    else:
+        # Walk back from today in non-overlapping windows, stopping before the symbol was listed
+        all_data, first_trading_date = backfill(code, fetch, start_date,
+                                                get_earliest_date(start_date, years), first_trading_date,
+                                                date_index=1)
 
     new_df = pd.DataFrame(all_data, columns=columns)  # Add `company_key` to columns
     new_df = process_data_frame(new_df)
     insert_data_to_db(new_df)
     print(f"Data inserted for {code}")
+    return first_trading_date
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the history of every symbol from mse.mk into the database")
+    parser.add_argument("--archive", action="store_true", help="keep every raw response in the archive")
+    args = parser.parse_args()
+
     start_time = datetime.now()
     codes = get_symbols()
 
     # Retrieve the latest dates for each company_key from the database
     latest_dates = read_latest_dates_from_db()
+    listings = load_listings()  # First trading dates found by earlier backfills
+    found = {}
     with ProcessPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(retrieve_data_for_code, code, latest_dates): code for code in codes}
+        futures = {executor.submit(retrieve_data_for_code, code, latest_dates, first_trading_date=listings.get(code),
+                                   archive_response=archive_responses or args.archive): code
+                   for code in codes}
         for future in concurrent.futures.as_completed(futures):
             code = futures[future]
             try:
-                future.result()
+                first_trading_date = future.result()
+                if first_trading_date is not None and first_trading_date != listings.get(code):
+                    found[code] = first_trading_date
                 print(f"Completed retrieval for {code}")
             except Exception as e:
                 print(f"Error retrieving data for {code}: {e}")
+    update_listings(found)  # Merged into the saved dates, workers may have recorded others meanwhile
 
     end_time = datetime.now()
     print(f"Total time taken: {(end_time - start_time).total_seconds()} seconds")
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import signal
+import time
+from datetime import datetime
+
+import job_queue
+from backfill import load_listings, update_listings
+
+# Drains a local queue with several worker processes, kills one of them in the middle of a job
+# and checks that its job is reclaimed once the lease expires and that a failing job is dead-lettered:
+#   python -m pytest test_job_queue.py
+workers = 4
+jobs = 40
+lease_seconds = 2.0
+job_seconds = 0.5
+
+
+def sleep_job(job_key, payload):
+    with open(payload["log"], "a") as f:
+        f.write(f"{job_key} {os.getpid()} start\n")
+    time.sleep(job_seconds)
+
+
+def failing_job(job_key, payload):
+    raise ValueError("this job always fails")
+
+
+def run_worker(url):
+    job_queue.BACKOFF_BASE = 0.1  # Retry at once, the test must not wait for the real backoff
+    job_queue.run_worker(job_queue.get_engine(url), {"sleep": sleep_job, "fail": failing_job},
+                         lease_seconds=lease_seconds, poll_seconds=0.2, stop_when_empty=True)
+
+
+def record_listing(path, code):
+    update_listings({code: datetime(2020, 1, 1 + int(code[1:]) % 28)}, path)
+
+
+def test_killed_job_is_reclaimed_and_failing_job_dead_lettered(tmp_path):
+    url = f"sqlite:///{tmp_path}/jobs.db"
+    log = str(tmp_path / "jobs.log")
+    engine = job_queue.get_engine(url)
+    for i in range(jobs):
+        job_queue.enqueue(engine, "sleep", f"S{i:03d}", {"log": log})
+    job_queue.enqueue(engine, "fail", "F000", max_attempts=2)
+    assert job_queue.enqueue(engine, "sleep", "S000", {"log": log}) is None  # Already queued
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(url,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    # Kill the first worker while it runs a job
+    victim = processes[0]
+    deadline = time.monotonic() + 60
+    while not os.path.exists(log) or f" {victim.pid} start" not in open(log).read():
+        assert time.monotonic() < deadline, "the first worker never started a job"
+        time.sleep(0.05)
+    os.kill(victim.pid, signal.SIGKILL)
+    killed_jobs = [line.split()[0] for line in open(log) if line.split()[1] == str(victim.pid)]
+
+    for process in processes:
+        process.join(timeout=120)
+        assert not process.is_alive()
+
+    with engine.connect() as connection:
+        rows = {row.job_key: row for row in connection.execute(job_queue.select(job_queue.jobs))}
+    counts = job_queue.get_counts(engine)
+    assert counts["sleep"] == {job_queue.DONE: jobs}, counts
+    assert counts["fail"] == {job_queue.DEAD: 1}, counts
+    assert rows["F000"].attempts == 2
+    assert rows["F000"].last_error.splitlines()[-1] == "ValueError: this job always fails"
+    reclaimed = rows[killed_jobs[-1]]
+    assert reclaimed.attempts == 2, reclaimed  # The killed attempt and the one after the lease expired
+
+
+def test_concurrent_listings_are_all_recorded(tmp_path):
+    path = str(tmp_path / "listings.json")
+    codes = [f"L{i:03d}" for i in range(40)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        pool.starmap(record_listing, [(path, code) for code in codes])
+
+    assert sorted(load_listings(path)) == codes
+
+
+def test_lost_lease_is_not_recorded(tmp_path, capsys):
+    engine = job_queue.get_engine(f"sqlite:///{tmp_path}/jobs.db")
+    job_id = job_queue.enqueue(engine, "steal", "S000")
+
+    def stolen_job(job_key, payload):
+        # The lease expired while the job ran and another worker reclaimed it
+        with engine.begin() as connection:
+            connection.execute(job_queue.update(job_queue.jobs).where(job_queue.jobs.c.id == job_id)
+                               .values(owner="other:1"))
+
+    assert job_queue.run_worker(engine, {"steal": stolen_job}, stop_when_empty=True) == 0
+    with engine.connect() as connection:
+        row = connection.execute(job_queue.select(job_queue.jobs)).one()
+    assert (row.status, row.owner) == (job_queue.RUNNING, "other:1")
+    assert "lost its lease" in capsys.readouterr().out
@@ -0,0 +1,43 @@
+import argparse
+import os
+
+import job_queue
+from backfill import load_listings, update_listings
+from main import get_symbols, retrieve_data_for_code
+
+# Scrape worker pulling per-symbol jobs from the shared job queue (see job_queue.py), on as many hosts as needed:
+#   python worker.py enqueue      # One scrape job per symbol listed on mse.mk
+#   python worker.py work         # Run jobs until stopped, start several of these
+# A finished scrape enqueues the indicators job of the symbol, run by homework_3/rsi/worker.py.
+
+
+def scrape(code, payload):
+    """
+    Function to run a scrape job: update the symbol's CSV and record its first trading date
+    :param code: symbol
+    :param payload: job arguments (unused)
+    """
+    first_trading_date = load_listings().get(code)
+    found = retrieve_data_for_code(code, first_trading_date)
+    if found is not None and found != first_trading_date:
+        update_listings({code: found})  # Under a lock, other workers record their symbols at the same time
+    job_queue.enqueue(engine, "indicators", code)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape worker of the job queue")
+    parser.add_argument("command", choices=["enqueue", "work", "status", "retry-dead"])
+    parser.add_argument("--once", action="store_true", help="work: stop when the queue is empty")
+    args = parser.parse_args()
+
+    os.makedirs("../shared/storage", exist_ok=True)
+    engine = job_queue.get_engine()
+    if args.command == "enqueue":
+        added = [code for code in get_symbols() if job_queue.enqueue(engine, "scrape", code) is not None]
+        print(f"Enqueued {len(added)} scrape jobs")
+    elif args.command == "work":
+        count = job_queue.run_worker(engine, {"scrape": scrape}, stop_when_empty=args.once)
+        print(f"Ran {count} jobs")
+    elif args.command == "retry-dead":
+        print(f"Put back {job_queue.retry_dead(engine, 'scrape')} dead scrape jobs")
+    print(job_queue.get_counts(engine))
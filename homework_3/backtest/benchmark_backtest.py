@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+
+from main import SIGNALS, backtest
+
+# Times a full sweep (10 years x 160 symbols x 8 signals) of synthetic data through backtest()
+# and checks its returns against a straightforward day-by-day loop over every signal and symbol
+symbols = 160
+days = 10 * 252
+runs = 5
+
+
+def make_panel(seed=0):
+    """
+    Function to generate random-walk prices with staggered listings and random signals
+    :param seed: random seed
+    :return: (close of shape (symbols, days), signals of shape (signals, symbols, days))
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, days)), axis=1))
+    first_days = rng.integers(0, days // 2, symbols)
+    close[np.arange(days) < first_days[:, None]] = np.nan  # Symbols listed later have no earlier prices
+    signals = rng.choice(np.array([1, -1, 0], dtype=np.int8), (len(SIGNALS), symbols, days), p=[0.05, 0.05, 0.9])
+    return close, signals
+
+
+def backtest_loop(close, signals):
+    """
+    Function to compute each signal's equal-weight portfolio return bar by bar
+    :param close: close prices of shape (symbols, days)
+    :param signals: signals of shape (signals, symbols, days)
+    :return: total return of each signal
+    """
+    total_returns = []
+    for signal_rows in signals:
+        positions = [0.0] * len(close)
+        equity = 1.0
+        for day in range(close.shape[1]):
+            day_return = 0.0
+            listed_count = 0
+            for symbol in range(len(close)):
+                if day > 0 and not np.isnan(close[symbol, day]) and not np.isnan(close[symbol, day - 1]):
+                    day_return += positions[symbol] * (close[symbol, day] / close[symbol, day - 1] - 1)
+                    listed_count += 1
+                if np.isnan(close[symbol, day]):
+                    positions[symbol] = 0.0
+                elif signal_rows[symbol, day] == 1:
+                    positions[symbol] = 1.0
+                elif signal_rows[symbol, day] == -1:
+                    positions[symbol] = 0.0
+            equity *= 1 + day_return / max(listed_count, 1)
+        total_returns.append(equity - 1)
+    return np.array(total_returns)
+
+
+if __name__ == '__main__':
+    close, signals = make_panel()
+    print(f"{symbols} symbols x {days} days x {len(SIGNALS)} signals")
+
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        results = backtest(close, signals, folds=10)
+        timings.append(time.perf_counter() - start_time)
+    print(f"vectorized: {min(timings) * 1000:.0f} ms (best of {runs})")
+
+    start_time = time.perf_counter()
+    expected = backtest_loop(close, signals)
+    print(f"loop:       {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+    assert np.allclose(results["total_return"], expected), (results["total_return"], expected)
+    print("Total returns match")
@@ -0,0 +1,220 @@
+import argparse
+import glob
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Configuration
+# ---------------------------
+INDICATORS_PATH = os.getenv("INDICATORS_PATH", "../indicators")  # Folder with the _oscillators_ma_* files
+SIGNALS = ['RSI_Signal', 'Stoch_Signal', 'WilliamsR_Signal', 'CCI_Signal', 'MFI_Signal',
+           'SMA_Signal', 'EMA_Signal', 'WMA_Signal']  # Signal columns written by rsi/indicators.py
+SIGNAL_VALUES = {"BUY": 1, "SELL": -1, "HOLD": 0}
+PERIODS_PER_YEAR = {1: 252, 7: 52, 30: 12}  # Bars per year of each timeframe
+
+
+# ---------------------------
+# Loading
+# ---------------------------
+
+def load_symbol(file_path, signals=SIGNALS):
+    """
+    Function to load the close prices and signals of a symbol
+    :param file_path: path to a _oscillators_ma_* file
+    :param signals: signal columns to load
+    :return: DataFrame indexed by date or None if the file has no usable rows
+    """
+    df = pd.read_csv(file_path, usecols=lambda column: column in ['Date', 'Close'] + signals)
+    if df.empty or any(column not in df.columns for column in ['Date', 'Close'] + signals):
+        return None
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.drop_duplicates('Date', keep='last').set_index('Date').sort_index()  # Some files repeat the first day
+    return df
+
+
+def load_panel(timeframe=1, symbols=None, signals=SIGNALS, indicators_path=INDICATORS_PATH):
+    """
+    Function to load all symbols into arrays of shape (symbols, days) over the union of their dates.
+    Prices are NaN before a symbol's first and after its last row and forward filled in between,
+    signals are +1 (BUY), -1 (SELL) and 0 (HOLD or no data).
+    :param timeframe: 1, 7 or 30
+    :param symbols: symbols to load (defaults to all files of the timeframe)
+    :param signals: signal columns to load
+    :param indicators_path: folder with the _oscillators_ma_* files
+    :return: (symbols, dates, close of shape (symbols, days), signals of shape (signals, symbols, days))
+    """
+    if symbols is None:
+        suffix = f"_oscillators_ma_{timeframe}.csv"
+        symbols = sorted(os.path.basename(path)[:-len(suffix)]
+                         for path in glob.glob(os.path.join(indicators_path, f"*{suffix}")))
+
+    frames = {}
+    for symbol in symbols:
+        df = load_symbol(os.path.join(indicators_path, f"{symbol}_oscillators_ma_{timeframe}.csv"), signals)
+        if df is not None:
+            frames[symbol] = df
+
+    symbols = list(frames)
+    dates = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+    close = np.full((len(symbols), len(dates)), np.nan)
+    signal_values = np.zeros((len(signals), len(symbols), len(dates)), dtype=np.int8)
+
+    for row, symbol in enumerate(symbols):
+        df = frames[symbol]
+        positions = dates.get_indexer(df.index)
+        first, last = positions[0], positions[-1]
+        close[row, positions] = df['Close'].to_numpy(dtype=float)
+        close[row, first:last + 1] = pd.Series(close[row, first:last + 1]).ffill().to_numpy()
+        for index, signal in enumerate(signals):
+            signal_values[index, row, positions] = df[signal].map(SIGNAL_VALUES).fillna(0).to_numpy(dtype=np.int8)
+
+    return symbols, dates, close, signal_values
+
+
+# ---------------------------
+# Simulation
+# ---------------------------
+
+def get_positions(signals, allow_short=False):
+    """
+    Function to turn signals into positions: a BUY opens a long position, a SELL closes it
+    (or opens a short one) and a HOLD keeps the previous position
+    :param signals: array of shape (..., days) with values +1, -1 and 0
+    :param allow_short: whether a SELL goes short instead of flat
+    :return: float array of the same shape
+    """
+    days = np.arange(signals.shape[-1])
+    last_signal_day = np.maximum.accumulate(np.where(signals != 0, days, 0), axis=-1)
+    state = np.take_along_axis(signals, last_signal_day, axis=-1)  # Last non-HOLD signal up to each day
+    if allow_short:
+        return state.astype(float)
+    return (state > 0).astype(float)
+
+
+def get_drawdown(returns):
+    """
+    Function to get the maximum drawdown of return series
+    :param returns: array of shape (..., days)
+    :return: array of shape (...) with the largest peak-to-trough loss as a negative fraction
+    """
+    equity = np.cumprod(1 + returns, axis=-1)
+    peak = np.maximum.accumulate(np.maximum(equity, 1), axis=-1)
+    return (equity / peak - 1).min(axis=-1)
+
+
+def backtest(close, signals, timeframe=1, allow_short=False, cost_bps=0.0, horizon=1, folds=1):
+    """
+    Function to simulate every signal on every symbol at once. The position decided by a bar's signal
+    is held over the next bar, so a signal never earns the return of the bar that produced it.
+    Each signal trades an equal-weight portfolio of the symbols listed on a day.
+    :param close: close prices of shape (symbols, days)
+    :param signals: signals of shape (signals, symbols, days)
+    :param timeframe: 1, 7 or 30, for annualization
+    :param allow_short: whether a SELL goes short instead of flat
+    :param cost_bps: cost of trading the whole position once, in basis points
+    :param horizon: bars after a BUY/SELL over which its hit is measured
+    :param folds: number of consecutive out-of-sample periods reported separately
+    :return: dict with arrays of shape (signals,) for the whole period and (signals, folds) per fold
+    """
+    listed = ~np.isnan(close)
+    returns = np.zeros_like(close)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+    tradable = listed.copy()
+    tradable[:, 1:] &= listed[:, :-1]  # A return needs the previous close too
+    returns[~tradable] = 0.0
+
+    signals = signals * listed  # Signals without a price are ignored
+    positions = get_positions(signals, allow_short) * listed  # Positions are closed when a symbol stops trading
+    held = np.zeros_like(positions)
+    held[..., 1:] = positions[..., :-1]  # Position carried into each bar
+    trades = np.abs(np.diff(positions, axis=-1, prepend=0))
+    symbol_returns = held * returns - trades * cost_bps / 10000
+
+    # Equal-weight portfolio of the listed symbols
+    listed_count = np.maximum(tradable.sum(axis=0), 1)
+    portfolio_returns = symbol_returns.sum(axis=1) / listed_count
+
+    # Hit rate: share of BUY/SELL signals followed by a move in their direction after horizon bars.
+    # Signals followed by no move at all (common for thinly traded symbols) are left out.
+    forward = np.full_like(close, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        forward[:, :-horizon] = close[:, horizon:] / close[:, :-horizon] - 1
+    events = (signals != 0) & ~np.isnan(forward) & (forward != 0)
+    hits = events & (signals * np.nan_to_num(forward) > 0)
+
+    years = listed.shape[1] / PERIODS_PER_YEAR[timeframe]
+    listed_years = max(listed.sum() / PERIODS_PER_YEAR[timeframe], 1e-9)
+    fold_ids = np.arange(close.shape[1]) * folds // close.shape[1]
+
+    def per_fold(values):
+        # Sums an array of shape (signals, days) over the days of each fold
+        return np.stack([np.bincount(fold_ids, weights=row, minlength=folds) for row in values])
+
+    return {
+        "hit_rate": hits.sum(axis=(1, 2)) / np.maximum(events.sum(axis=(1, 2)), 1),
+        "signals": events.sum(axis=(1, 2)),
+        "total_return": np.prod(1 + portfolio_returns, axis=-1) - 1,
+        "annual_return": np.prod(1 + portfolio_returns, axis=-1) ** (1 / max(years, 1e-9)) - 1,
+        "max_drawdown": get_drawdown(portfolio_returns),
+        "turnover": trades.sum(axis=(1, 2)) / listed_years,  # Times a symbol's position is traded per year
+        "exposure": np.abs(held).sum(axis=(1, 2)) / max(tradable.sum(), 1),  # Share of listed bars spent in a position
+        "fold_return": np.exp(per_fold(np.log1p(portfolio_returns))) - 1,
+        "fold_hit_rate": per_fold(hits.sum(axis=1)) / np.maximum(per_fold(events.sum(axis=1)), 1),
+    }
+
+
+def summarize(results, signals=SIGNALS, dates=None, folds=1):
+    """
+    Function to build the report of a backtest
+    :param results: output of backtest
+    :param signals: names of the signals
+    :param dates: dates of the panel, to label the folds
+    :param folds: number of folds
+    :return: DataFrame with one row per signal
+    """
+    report = pd.DataFrame({key: value for key, value in results.items() if not key.startswith("fold_")},
+                          index=pd.Index(signals, name="signal"))
+    if folds > 1:
+        bounds = np.arange(folds + 1) * len(dates) // folds
+        for fold in range(folds):
+            label = f"{dates[bounds[fold]]:%Y-%m}..{dates[bounds[fold + 1] - 1]:%Y-%m}"
+            report[f"return {label}"] = results["fold_return"][:, fold]
+            report[f"hit_rate {label}"] = results["fold_hit_rate"][:, fold]
+    return report
+
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the indicator signals")
+    parser.add_argument("--timeframe", type=int, default=1, choices=sorted(PERIODS_PER_YEAR))
+    parser.add_argument("--short", action="store_true", help="go short on SELL instead of flat")
+    parser.add_argument("--cost-bps", type=float, default=0.0, help="cost of one trade in basis points")
+    parser.add_argument("--horizon", type=int, default=1, help="bars over which a signal's hit is measured")
+    parser.add_argument("--folds", type=int, default=1, help="consecutive periods reported separately")
+    parser.add_argument("--output", help="CSV file for the report")
+    parser.add_argument("symbols", nargs="*", help="symbols to backtest (defaults to all)")
+    args = parser.parse_args()
+    if args.horizon < 1 or args.folds < 1:
+        parser.error("--horizon and --folds must be at least 1")
+
+    start_time = datetime.now()
+    symbols, dates, close, signals = load_panel(args.timeframe, args.symbols or None)
+    loaded_time = datetime.now()
+    results = backtest(close, signals, args.timeframe, args.short, args.cost_bps, args.horizon, args.folds)
+    report = summarize(results, SIGNALS, dates, args.folds)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format):
+        print(report)
+    if args.output:
+        report.to_csv(args.output)
+
+    print(f"{len(symbols)} symbols x {len(dates)} bars x {len(SIGNALS)} signals: "
+          f"loaded in {(loaded_time - start_time).total_seconds():.2f} s, "
+          f"simulated in {(datetime.now() - loaded_time).total_seconds():.3f} s")
@@ -0,0 +1,78 @@
+import glob
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from windows import make_windows, make_windows_list
+
+# Compares the sequence-building step of main.py before (Python list of float64 copies)
+# and after (float32 strided views, one contiguous batch copied at a time), per symbol
+features = ['Close', 'RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']
+sequence_length = 60
+future_target = 1
+batch_size = 32
+close_index = features.index('Close')
+
+
+def load_scaled(file_path):
+    """
+    Function to load and scale a symbol's features the same way main.py does
+    :param file_path: path to the _oscillators_ma_1.csv file
+    :return: scaled float64 array or None if there is not enough data
+    """
+    df = pd.read_csv(file_path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values('Date').set_index('Date')
+    if any(feat not in df.columns for feat in features):
+        return None
+    df = df.ffill().dropna()
+    if len(df) < sequence_length + future_target:
+        return None
+    return MinMaxScaler(feature_range=(0, 1)).fit_transform(df[features].values)
+
+
+def measure(function):
+    """
+    Function to measure the time and the peak of memory allocated by a function
+    :param function: function without arguments
+    :return: (seconds, peak bytes)
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def build_with_list(scaled_data):
+    X, y = make_windows_list(scaled_data, sequence_length, future_target, close_index)
+    return X, y
+
+
+def build_with_views(scaled_data):
+    X, y = make_windows(scaled_data.astype(np.float32), sequence_length, future_target, close_index)
+    np.ascontiguousarray(X[:batch_size])  # What WindowSequence copies for one batch
+    return X, y
+
+
+if __name__ == "__main__":
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "indicators")
+    print(f"{'symbol':<8}{'rows':>7}{'list ms':>10}{'list MB':>10}{'views ms':>10}{'views MB':>10}")
+    totals = np.zeros(4)
+    for file_path in sorted(glob.glob(os.path.join(folder, "*_oscillators_ma_1.csv"))):
+        scaled_data = load_scaled(file_path)
+        if scaled_data is None:
+            continue
+        list_seconds, list_peak = measure(lambda: build_with_list(scaled_data))
+        views_seconds, views_peak = measure(lambda: build_with_views(scaled_data))
+        row = np.array([list_seconds * 1000, list_peak / 2 ** 20, views_seconds * 1000, views_peak / 2 ** 20])
+        totals += row
+        symbol = os.path.basename(file_path).split("_")[0]
+        print(f"{symbol:<8}{len(scaled_data):>7}" + "".join(f"{value:>10.2f}" for value in row))
+    print(f"{'total':<15}" + "".join(f"{value:>10.2f}" for value in totals))
@@ -1,12 +1,24 @@
+import argparse
+import fcntl
+import json
 import os
+import sys
+import time
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout
+from tensorflow.keras.models import Sequential, Model, load_model
+from tensorflow.keras.layers import LSTM, Dense, Dropout, Input, Embedding, RepeatVector, Concatenate, Flatten
 from sklearn.metrics import mean_squared_error, r2_score
 import math
 from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.utils import Sequence
+
+# Inverse scaling shared with the prediction service (homework_4/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "homework_4", "common"))
+from scaling import inverse_transform_column
+from windows import make_horizon_windows, make_windows
 
 # Function to load the list of symbols from a file
 def get_symbols():
@@ -16,29 +28,100 @@ def get_symbols():
             codes.append(line.strip())  # Remove newline characters
     return codes
 
-# Ensure that a 'models' directory exists to save trained models
-if not os.path.exists('models'):
-    os.makedirs('models')
-
-# List of features to use for model training
-features = ['Close', 'RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']
-
-# Load symbols from the file
-symbols = get_symbols()
-
-# Loop through each symbol and process the corresponding data
-for symbol in symbols:
-    print(f"Processing symbol: {symbol}")
+# Keras input that copies one batch of the window views at a time, instead of materializing all sequences
+class WindowSequence(Sequence):
+    def __init__(self, X, y=None, batch_size=32):
+        super().__init__()
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return math.ceil(len(self.X) / self.batch_size)
+
+    def __getitem__(self, index):
+        batch = slice(index * self.batch_size, (index + 1) * self.batch_size)
+        X_batch = np.ascontiguousarray(self.X[batch])
+        if self.y is None:
+            return X_batch
+        return X_batch, np.ascontiguousarray(self.y[batch])
+
+# Keras input for the global model: batches of (sequence, symbol id) gathered from the window views of all symbols.
+# pairs holds one (symbol id, window index) row per sample.
+class GlobalWindowSequence(Sequence):
+    def __init__(self, X_views, y_views, pairs, batch_size=32, shuffle=False):
+        super().__init__()
+        self.X_views = X_views
+        self.y_views = y_views
+        self.pairs = pairs
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        if shuffle:
+            np.random.shuffle(self.pairs)
+
+    def __len__(self):
+        return math.ceil(len(self.pairs) / self.batch_size)
+
+    def __getitem__(self, index):
+        batch = self.pairs[index * self.batch_size:(index + 1) * self.batch_size]
+        X_batch = np.stack([self.X_views[symbol_id][window] for symbol_id, window in batch])
+        y_batch = np.array([self.y_views[symbol_id][window] for symbol_id, window in batch], dtype=np.float32)
+        return (X_batch, batch[:, :1].copy()), y_batch
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.pairs)
+
+# ---------------------------
+# Configuration
+# ---------------------------
+features = ['Close', 'RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']  # Features used for training
+sequence_length = 60  # Length of the sequence used for input to the LSTM
+future_target = 1  # Predict the close price 1 day ahead
+close_index = features.index('Close')  # Index of the 'Close' feature
+embedding_size = 8  # Size of the learned symbol embedding of the global model
+global_model_path = "models/global.h5"  # The global model and the symbol ids it was trained with
+global_symbols_path = "models/global_symbols.json"
+training_log_path = "models/training_log.csv"  # One row per trained model: mode, time and validation metrics
+
+# Incremental training (--incremental): the saved model is fine-tuned on the recent windows instead of retrained
+fine_tune_epochs = 5
+fine_tune_window = 250  # Most recent windows used for fine-tuning (about a year of trading days)
+fine_tune_holdout = 20  # Newest windows held out to stop the fine-tuning and check it, then trained on as well
+fine_tune_learning_rate = 1e-4  # A tenth of Adam's default, the weights only need to adapt
+max_new_rows = 60  # More new days than this since the weights last changed are retrained from scratch
+degradation_threshold = 0.10  # Fine-tuned relative RMSE above the last full training's by more than this
+                              # forces full retraining (RMSE / mean close, as the periods' price levels differ)
+
+
+def get_model_path(symbol, horizon=1):
+    """
+    Function to get the path of a symbol's model: models/{symbol}.h5 for next-day models,
+    models/{symbol}_horizon_{horizon}.h5 for direct multi-horizon models
+    """
+    return f"models/{symbol}.h5" if horizon == 1 else f"models/{symbol}_horizon_{horizon}.h5"
+
+
+def get_training_path(symbol, horizon=1):
+    """
+    Function to get the path of the training record saved next to a symbol's model
+    (the rows and validation metrics of its last training)
+    """
+    return get_model_path(symbol, horizon)[:-len(".h5")] + "_training.json"
+
+
+def load_symbol_data(symbol):
+    """
+    Function to load, clean and scale the data of a symbol (Step 1)
+    :param symbol: company key
+    :return: (scaler, scaled float32 data) or None if the symbol has to be skipped
+    """
     file_path = f"../indicators/{symbol}_oscillators_ma_1.csv"
-
-    # ---------------------------
-    # Step 1: Load and Prepare Data
-    # ---------------------------
     try:
         df = pd.read_csv(file_path)  # Read the CSV file containing data
     except FileNotFoundError:
         print(f"File for symbol {symbol} not found. Skipping.")
-        continue
+        return None
 
     # Convert the 'Date' column to datetime format and sort the data
     df['Date'] = pd.to_datetime(df['Date'])
@@ -49,113 +132,303 @@ for symbol in symbols:
     df = df.fillna(method='ffill').dropna()
 
     # Ensure that there is enough data (at least 60 rows for sequence and 1 for target)
-    if len(df) < 60 + 1:  # 60 sequence length + 1 future target
+    if len(df) < sequence_length + future_target:
         print(f"Not enough data in {file_path}. Skipping.")
-        continue
+        return None
 
     # Check for missing features
     missing_features = [feat for feat in features if feat not in df.columns]
     if missing_features:
         print(f"Missing features {missing_features} for {file_path}. Skipping.")
-        continue
+        return None
 
     # Prepare data for scaling
     data = df[features].values
     if data.shape[0] == 0:
         print(f"No data available after preprocessing for {file_path}. Skipping.")
-        continue
+        return None
 
     # Scale the data using MinMaxScaler to normalize the values
     scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(data)
+    scaled_data = scaler.fit_transform(data).astype(np.float32)
+    return scaler, scaled_data
+
+
+def prepare_symbol(symbol, horizon=1):
+    """
+    Function to load a symbol and create its sequences and train/validation split (Steps 1-3)
+    :param symbol: company key
+    :param horizon: number of days predicted at once (the targets have shape (samples, horizon) when > 1)
+    :return: dict with scaler, scaled_data, X, y (all windows), X_train, X_val, y_train, y_val
+             or None if the symbol has to be skipped
+    """
+    loaded = load_symbol_data(symbol)
+    if loaded is None:
+        return None
+    scaler, scaled_data = loaded
 
     # ---------------------------
     # Step 2: Create Sequences for LSTM
     # ---------------------------
-    sequence_length = 60  # Length of the sequence used for input to the LSTM
-    future_target = 1  # Predict the close price 1 day ahead
-    close_index = features.index('Close')  # Index of the 'Close' feature
-
-    X = []  # Input sequences for LSTM
-    y = []  # Corresponding target values for prediction
-
-    # Create sequences of length 'sequence_length' and corresponding target values
-    for i in range(sequence_length, len(scaled_data)-future_target+1):
-        X.append(scaled_data[i-sequence_length:i])  # Sequence of data for X
-        y.append(scaled_data[i+future_target-1, close_index])  # Close price for the target
-
-    X, y = np.array(X), np.array(y)
+    # X[i] is a strided view of scaled_data[i:i+sequence_length], y[i] the close price future_target days later
+    # (or the close prices of the next horizon days)
+    if horizon == 1:
+        X, y = make_windows(scaled_data, sequence_length, future_target, close_index)
+    else:
+        X, y = make_horizon_windows(scaled_data, sequence_length, horizon, close_index)
 
     # Ensure there is enough data after processing
     if len(X) == 0:
         print(f"Not enough data for symbol {symbol} after processing. Skipping.")
-        continue
+        return None
 
     # ---------------------------
     # Step 3: Train/Validation Split
     # ---------------------------
     train_size = int(len(X) * 0.8)  # 80% of data for training, 20% for validation
-    X_train, X_val = X[:train_size], X[train_size:]  # Split data
-    y_train, y_val = y[:train_size], y[train_size:]  # Split targets
 
     # Ensure there is validation data
-    if len(X_val) == 0:
+    if len(X) - train_size == 0:
         print(f"No validation data available for symbol {symbol}. Skipping.")
-        continue
-
-    # ---------------------------
-    # Step 4: Build the LSTM Model
-    # ---------------------------
+        return None
+
+    return {
+        "scaler": scaler,
+        "scaled_data": scaled_data,
+        "X": X, "y": y,
+        "X_train": X[:train_size], "X_val": X[train_size:],  # Split data
+        "y_train": y[:train_size], "y_val": y[train_size:],  # Split targets
+    }
+
+
+def build_model(horizon=1):
+    """
+    Function to build the per-symbol LSTM model (Step 4)
+    :param horizon: number of days predicted at once
+    :return: compiled model
+    """
     model = Sequential()
-    model.add(LSTM(64, return_sequences=True, input_shape=(X_train.shape[1], X_train.shape[2])))  # LSTM layer
+    model.add(LSTM(64, return_sequences=True, input_shape=(sequence_length, len(features))))  # LSTM layer
     model.add(Dropout(0.2))  # Dropout layer to prevent overfitting
     model.add(LSTM(64))  # Another LSTM layer
     model.add(Dropout(0.2))  # Dropout layer
-    model.add(Dense(1))  # Dense layer for output (predicting close price)
+    model.add(Dense(horizon))  # Dense layer for output (predicting close price of the next horizon days)
 
     # Compile the model with mean squared error loss and Adam optimizer
     model.compile(loss='mean_squared_error', optimizer='adam')
+    return model
+
+
+def build_global_model(num_symbols):
+    """
+    Function to build the global LSTM model: the same layers, with a learned symbol embedding
+    appended to the features of every day of the sequence
+    :param num_symbols: number of symbols the model serves
+    :return: compiled model with inputs (sequence, symbol id)
+    """
+    sequence_input = Input(shape=(sequence_length, len(features)), name="sequence")
+    symbol_input = Input(shape=(1,), dtype="int32", name="symbol")
+    embedding = Flatten()(Embedding(num_symbols, embedding_size)(symbol_input))
+    x = Concatenate()([sequence_input, RepeatVector(sequence_length)(embedding)])
+    x = LSTM(64, return_sequences=True)(x)
+    x = Dropout(0.2)(x)
+    x = LSTM(64)(x)
+    x = Dropout(0.2)(x)
+    output = Dense(1)(x)
+
+    model = Model(inputs=[sequence_input, symbol_input], outputs=output)
+    model.compile(loss='mean_squared_error', optimizer='adam')
+    return model
+
+
+def evaluate(scaler, y_val, y_pred, relative=False):
+    """
+    Function to compute the validation metrics on the original price scale (Step 6)
+    :param scaler: the symbol's fitted scaler
+    :param y_val: scaled targets
+    :param y_pred: scaled predictions
+    :param relative: also return the RMSE divided by the mean of the targets
+    :return: (rmse, r2), or (rmse, r2, relative rmse)
+    """
+    # Inverse transform the scaled predictions and actual values back to the original scale
+    inv_y_val = inverse_transform_column(scaler, y_val, close_index)
+    inv_y_pred = inverse_transform_column(scaler, np.reshape(y_pred, np.shape(y_val)), close_index)
+
+    # Calculate RMSE (Root Mean Squared Error) and R-squared metrics
+    rmse = math.sqrt(mean_squared_error(inv_y_val, inv_y_pred))
+    r2 = r2_score(inv_y_val, inv_y_pred)
+    if relative:
+        return rmse, r2, rmse / float(np.mean(np.abs(inv_y_val)))
+    return rmse, r2
+
+
+def fit_full(prepared, horizon=1):
+    """
+    Function to build and train a model from random weights (Steps 4-5)
+    :param prepared: prepared symbol data
+    :param horizon: number of days predicted at once
+    :return: (model, number of epochs run)
+    """
+    # ---------------------------
+    # Step 4: Build the LSTM Model
+    # ---------------------------
+    model = build_model(horizon)
 
     # ---------------------------
     # Step 5: Train the Model
     # ---------------------------
     early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)  # Early stopping callback
-    history = model.fit(X_train, y_train,
+    history = model.fit(WindowSequence(prepared["X_train"], prepared["y_train"]),
                         epochs=50,
-                        batch_size=32,
-                        validation_data=(X_val, y_val),
+                        validation_data=WindowSequence(prepared["X_val"], prepared["y_val"]),
                         shuffle=False,
                         callbacks=[early_stopping],  # Apply early stopping
                         verbose=1)
+    return model, len(history.history["loss"])
+
+
+def get_holdout(prepared):
+    """
+    Function to get the newest windows held out by the fine-tuning
+    :param prepared: prepared symbol data
+    :return: (X, y) of the holdout
+    """
+    return prepared["X"][-fine_tune_holdout:], prepared["y"][-fine_tune_holdout:]
+
+
+def fine_tune(prepared, model):
+    """
+    Function to continue the training of a saved model for a few epochs on the most recent windows of the whole
+    series, up to the holdout (the newest windows), which stops it early and is checked by train_symbol.
+    The data is scaled with the range of the whole history as for a full training, a range moved by the new days
+    is learned here, and a model that does not adapt fails the check of train_symbol.
+    :param prepared: prepared symbol data
+    :param model: the loaded model
+    :return: (model, number of epochs run)
+    """
+    X, y = prepared["X"][:-fine_tune_holdout], prepared["y"][:-fine_tune_holdout]
+    model.compile(loss='mean_squared_error', optimizer=Adam(learning_rate=fine_tune_learning_rate))
+    early_stopping = EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)
+    history = model.fit(WindowSequence(X[-fine_tune_window:], y[-fine_tune_window:]),
+                        epochs=fine_tune_epochs,
+                        validation_data=WindowSequence(*get_holdout(prepared)),
+                        shuffle=False,
+                        callbacks=[early_stopping],
+                        verbose=1)
+    return model, len(history.history["loss"])
+
+
+def fine_tune_newest(prepared, model):
+    """
+    Function to train a fine-tuned model that passed the check for one more epoch on the most recent windows
+    with the holdout, so the newest days are learned too
+    :param prepared: prepared symbol data
+    :param model: the fine-tuned model
+    """
+    model.fit(WindowSequence(prepared["X"][-fine_tune_window:], prepared["y"][-fine_tune_window:]),
+              epochs=1, shuffle=False, verbose=1)
+
+
+def get_full_training_reason(symbol, horizon, prepared, record):
+    """
+    Function to check if a symbol's saved model can be fine-tuned
+    :param symbol: company key
+    :param horizon: number of days predicted at once
+    :param prepared: prepared symbol data
+    :param record: training record of the saved model, or None
+    :return: the reason to retrain from scratch, or None if the model can be fine-tuned
+    """
+    if not os.path.exists(get_model_path(symbol, horizon)):
+        return "no saved model"
+    if record is None or "weights_rows" not in record:
+        return "no training record of the saved model"
+    if len(prepared["X"]) < fine_tune_holdout * 2:
+        return "too few windows for a holdout"
+    new_rows = len(prepared["scaled_data"]) - record["weights_rows"]
+    if new_rows < 0:
+        return "the history is shorter than at the last training"
+    if new_rows > max_new_rows:
+        return f"{new_rows} new days"
+    return None
+
+
+def log_training(row):
+    """
+    Function to add a row to the training log (models/training_log.csv). The pipeline trains symbols in parallel
+    processes: the row is appended under a lock, so only the first row of the file writes the header.
+    :param row: dict of the row's values
+    """
+    with open(training_log_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+        pd.DataFrame([row]).to_csv(f, index=False, header=os.fstat(f.fileno()).st_size == 0)
+
+
+def train_symbol(symbol, horizon=1, incremental=False, compare=False):
+    """
+    Function to train, evaluate and save the model of one symbol
+    :param symbol: company key
+    :param horizon: number of days predicted at once
+    :param incremental: fine-tune the saved model when possible, with a full retraining if the fine-tuned model
+                        (or the saved one when fine-tuning made it worse) is worse than the last full training
+                        by more than degradation_threshold
+    :param compare: also train a full model (not saved) and log its time and metrics next to the incremental ones
+    :return: (rmse, r2) or None if the symbol was skipped
+    """
+    print(f"Processing symbol: {symbol}")
+    prepared = prepare_symbol(symbol, horizon)
+    if prepared is None:
+        return None
+    scaler, scaled_data = prepared["scaler"], prepared["scaled_data"]
+
+    record = None
+    if os.path.exists(get_training_path(symbol, horizon)):
+        with open(get_training_path(symbol, horizon)) as f:
+            record = json.load(f)
+    row = {"symbol": symbol, "horizon": horizon, "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "rows": len(scaled_data),
+           "new_rows": len(scaled_data) - record["weights_rows"] if record and "weights_rows" in record else None,
+           "reason": None, "rmse_before": None, "rmse_incremental": None, "r2_incremental": None,
+           "seconds_full": None, "rmse_full": None, "r2_full": None}
+
+    start_time = time.time()
+    mode = "full"
+    if incremental:
+        row["reason"] = get_full_training_reason(symbol, horizon, prepared, record)
+        if row["reason"] is None:
+            # Checked on the holdout (the newest windows), relative to the price level to compare with the
+            # validation split of the last full training
+            X_holdout, y_holdout = get_holdout(prepared)
+            model = load_model(get_model_path(symbol, horizon), compile=False)
+            row["rmse_before"], r2, relative_rmse = evaluate(
+                scaler, y_holdout, model.predict(WindowSequence(X_holdout), verbose=0), relative=True)
+            weights = model.get_weights()
+            model, epochs = fine_tune(prepared, model)
+            rmse, r2_tuned, relative_tuned = evaluate(
+                scaler, y_holdout, model.predict(WindowSequence(X_holdout), verbose=0), relative=True)
+            row["rmse_incremental"], row["r2_incremental"] = rmse, r2_tuned
+            if rmse > row["rmse_before"]:
+                model.set_weights(weights)  # The saved weights do better on the new days than the fine-tuned ones
+                rmse, mode = row["rmse_before"], "kept"
+            else:
+                r2, relative_rmse, mode = r2_tuned, relative_tuned, "incremental"
+            if relative_rmse > record["full_relative_rmse"] * (1 + degradation_threshold):
+                row["reason"] = (f"relative RMSE {relative_rmse:.4f} above the last full training's "
+                                 f"{record['full_relative_rmse']:.4f}")
+                mode = "full"
+            elif mode == "incremental":
+                fine_tune_newest(prepared, model)
+        print(f"{symbol} - {'full training: ' + row['reason'] if mode == 'full' else mode}")
+    if mode == "full":
+        model, epochs = fit_full(prepared, horizon)
+    seconds = time.time() - start_time
 
     # ---------------------------
     # Step 6: Evaluate the Model
     # ---------------------------
-    y_pred = model.predict(X_val)  # Make predictions on the validation data
-
-    # Inverse transform the scaled predictions and actual values back to the original scale
-    inv_y_val = []
-    inv_y_pred = []
-
-    for i in range(len(y_val)):
-        # Inverse transform the actual values
-        dummy_val = np.zeros((1, len(features)))
-        dummy_val[0, close_index] = y_val[i]
-        val_unscaled = scaler.inverse_transform(dummy_val)[0, close_index]
-        inv_y_val.append(val_unscaled)
-
-        # Inverse transform the predicted values
-        dummy_pred = np.zeros((1, len(features)))
-        dummy_pred[0, close_index] = y_pred[i][0]  # Extract the scalar value
-        pred_unscaled = scaler.inverse_transform(dummy_pred)[0, close_index]
-        inv_y_pred.append(pred_unscaled)
-
-    inv_y_val = np.array(inv_y_val)
-    inv_y_pred = np.array(inv_y_pred)
-
-    # Calculate RMSE (Root Mean Squared Error) and R-squared metrics
-    rmse = math.sqrt(mean_squared_error(inv_y_val, inv_y_pred))
-    r2 = r2_score(inv_y_val, inv_y_pred)
+    if mode == "full":
+        y_pred = model.predict(WindowSequence(prepared["X_val"]))  # Make predictions on the validation data
+        rmse, r2, relative_rmse = evaluate(scaler, prepared["y_val"], y_pred, relative=True)
+    # Otherwise the metrics are the holdout's, measured before the model was trained on it
 
     print(f"{symbol} - RMSE on validation: {rmse}")
     print(f"{symbol} - R^2 on validation: {r2}")
@@ -166,16 +439,159 @@ for symbol in symbols:
     last_60_days = scaled_data[-sequence_length:]  # Get the last 60 days of data
     last_60_days = last_60_days.reshape(1, sequence_length, len(features))  # Reshape for LSTM input
 
-    predicted_price_scaled = model.predict(last_60_days)  # Predict the next day's price
-    dummy_future = np.zeros((1, len(features)))
-    dummy_future[0, close_index] = predicted_price_scaled
-    predicted_price = scaler.inverse_transform(dummy_future)[0, close_index]  # Inverse transform to original scale
+    predicted_price_scaled = model.predict(last_60_days)  # Predict the next day's price (or the next horizon days)
+    predicted_price = inverse_transform_column(scaler, predicted_price_scaled[0], close_index)  # Original scale
 
-    print(f"{symbol} - Predicted price for next day: {predicted_price}")
+    if horizon == 1:
+        print(f"{symbol} - Predicted price for next day: {predicted_price[0]}")
+    else:
+        print(f"{symbol} - Predicted prices for next {horizon} days: {predicted_price}")
 
     # ---------------------------
     # Save the trained model
     # ---------------------------
-    model.save(f"models/{symbol}.h5")  # Save the model for the symbol
+    model.save(get_model_path(symbol, horizon))  # Save the model for the symbol
+    with open(get_training_path(symbol, horizon), "w") as f:
+        # weights_rows: rows when the weights last changed, the new days are counted from there
+        json.dump({"mode": mode, "rows": len(scaled_data), "rmse": rmse, "r2": r2,
+                   "weights_rows": record["weights_rows"] if mode == "kept" else len(scaled_data),
+                   "full_rmse": rmse if mode == "full" else record["full_rmse"],
+                   "full_relative_rmse": relative_rmse if mode == "full" else record["full_relative_rmse"]}, f)
+
+    row.update(mode=mode, epochs=epochs, seconds=seconds, rmse=rmse, r2=r2)
+    if compare:
+        # Reference for the incremental mode: the same symbol retrained from scratch
+        start_time = time.time()
+        full_model, _ = fit_full(prepared, horizon)
+        row["seconds_full"] = time.time() - start_time
+        # On the same windows as the metrics of the mode that ran
+        X_check, y_check = (prepared["X_val"], prepared["y_val"]) if mode == "full" else get_holdout(prepared)
+        row["rmse_full"], row["r2_full"] = evaluate(scaler, y_check,
+                                                    full_model.predict(WindowSequence(X_check), verbose=0))
+    log_training(row)
 
     print(f"Model saved for {symbol}\n")
+    return rmse, r2
+
+
+def get_symbol_training_seconds(symbols):
+    """
+    Function to get the time of the last full training of each symbol's next-day model, from the training log
+    :param symbols: list of company keys
+    :return: dict symbol -> seconds, without the symbols that have no logged full training
+    """
+    if not os.path.exists(training_log_path):
+        return {}
+    log = pd.read_csv(training_log_path)
+    log = log[(log["mode"] == "full") & (log["horizon"] == 1) & log["symbol"].isin(symbols)]
+    return log.groupby("symbol")["seconds"].last().to_dict()
+
+
+def train_global(symbols):
+    """
+    Function to train one model on the windows of all symbols, save it, and compare it per symbol
+    with the per-symbol models found in models/ (written to models/global_comparison.csv):
+    validation metrics, and the training time against the last full training of the symbol's model
+    :param symbols: list of company keys
+    """
+    prepared = {}
+    for symbol in symbols:
+        print(f"Processing symbol: {symbol}")
+        symbol_data = prepare_symbol(symbol)
+        if symbol_data is not None:
+            prepared[symbol] = symbol_data
+    trained_symbols = list(prepared)
+    if not trained_symbols:
+        raise SystemExit(f"None of the {len(symbols)} symbols has enough data, the global model was not trained")
+
+    # One (symbol id, window index) row per sample, the windows stay views of every symbol's data
+    X_train_views = [prepared[symbol]["X_train"] for symbol in trained_symbols]
+    y_train_views = [prepared[symbol]["y_train"] for symbol in trained_symbols]
+    X_val_views = [prepared[symbol]["X_val"] for symbol in trained_symbols]
+    y_val_views = [prepared[symbol]["y_val"] for symbol in trained_symbols]
+    train_pairs = np.array([(symbol_id, window) for symbol_id, X in enumerate(X_train_views) for window in range(len(X))])
+    val_pairs = np.array([(symbol_id, window) for symbol_id, X in enumerate(X_val_views) for window in range(len(X))])
+
+    start_time = time.time()  # Training only, as the seconds of the per-symbol models in the training log
+    model = build_global_model(len(trained_symbols))
+    early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+    model.fit(GlobalWindowSequence(X_train_views, y_train_views, train_pairs, shuffle=True),
+              epochs=50,
+              validation_data=GlobalWindowSequence(X_val_views, y_val_views, val_pairs),
+              callbacks=[early_stopping],
+              verbose=1)
+    training_seconds = time.time() - start_time
+    print(f"Global model trained on {len(train_pairs)} sequences of {len(trained_symbols)} symbols "
+          f"in {training_seconds:.1f} seconds")
+
+    model.save(global_model_path)
+    with open(global_symbols_path, 'w') as f:
+        json.dump(trained_symbols, f)
+
+    # Compare the validation metrics and training times with the per-symbol models
+    symbol_seconds = get_symbol_training_seconds(trained_symbols)
+    comparison = []
+    for symbol_id, symbol in enumerate(trained_symbols):
+        symbol_data = prepared[symbol]
+        X_val = np.ascontiguousarray(symbol_data["X_val"])
+        y_pred = model.predict([X_val, np.full((len(X_val), 1), symbol_id, dtype=np.int32)], verbose=0)
+        rmse, r2 = evaluate(symbol_data["scaler"], symbol_data["y_val"], y_pred)
+        row = {"symbol": symbol, "rmse_global": rmse, "r2_global": r2, "rmse_symbol": None, "r2_symbol": None,
+               "seconds_global": training_seconds, "seconds_symbol": symbol_seconds.get(symbol)}
+
+        symbol_model_path = get_model_path(symbol)
+        if os.path.exists(symbol_model_path):
+            symbol_model = load_model(symbol_model_path, compile=False)
+            row["rmse_symbol"], row["r2_symbol"] = evaluate(symbol_data["scaler"], symbol_data["y_val"],
+                                                            symbol_model.predict(X_val, verbose=0))
+        comparison.append(row)
+        print(f"{symbol} - RMSE global: {rmse} per-symbol: {row['rmse_symbol']}")
+
+    pd.DataFrame(comparison).to_csv("models/global_comparison.csv", index=False)
+
+    # Serving footprint: one model for every symbol against one model file per symbol
+    symbol_model_paths = [get_model_path(symbol) for symbol in trained_symbols if os.path.exists(get_model_path(symbol))]
+    print(f"Global model: {model.count_params()} parameters, {os.path.getsize(global_model_path) / 2 ** 20:.2f} MB")
+    print(f"Per-symbol models: {len(symbol_model_paths)} files, "
+          f"{sum(os.path.getsize(path) for path in symbol_model_paths) / 2 ** 20:.2f} MB")
+    if symbol_seconds:
+        print(f"Training time: global model {training_seconds:.1f} seconds for {len(trained_symbols)} symbols, "
+              f"per-symbol models {sum(symbol_seconds.values()):.1f} seconds for the {len(symbol_seconds)} "
+              f"of them with a full training in {training_log_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the LSTM price models")
+    parser.add_argument("--mode", choices=["symbol", "global"], default="symbol",
+                        help="one model per symbol (default) or one global model with symbol embeddings")
+    parser.add_argument("--horizon", type=int, default=1,
+                        help="train direct models that predict the next N closes at once (symbol mode only)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="fine-tune the saved models on the new days, retrain from scratch when they degrade")
+    parser.add_argument("--compare", action="store_true",
+                        help="with --incremental, also retrain every symbol from scratch and log both in "
+                             + training_log_path)
+    parser.add_argument("symbols", nargs="*", help="symbols to train (defaults to codes.txt)")
+    args = parser.parse_args()
+    if args.horizon < 1:
+        parser.error("--horizon must be at least 1")
+    if args.horizon > 1 and args.mode == "global":
+        parser.error("--horizon is only supported with --mode symbol")
+    if args.incremental and args.mode == "global":
+        parser.error("--incremental is only supported with --mode symbol")
+
+    # Ensure that a 'models' directory exists to save trained models
+    if not os.path.exists('models'):
+        os.makedirs('models')
+
+    # Load symbols from the file
+    symbols = args.symbols or get_symbols()
+
+    start_time = time.time()
+    if args.mode == "global":
+        train_global(symbols)
+    else:
+        # Loop through each symbol and process the corresponding data
+        for symbol in symbols:
+            train_symbol(symbol, args.horizon, args.incremental, args.compare)
+    print(f"Training completed in {time.time() - start_time:.1f} seconds")
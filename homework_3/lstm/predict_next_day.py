@@ -1,10 +1,14 @@
 from flask import Flask, request, jsonify
 import os
+import sys
 import pandas as pd
-import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras.models import load_model
 
+# Inverse scaling shared with the prediction service (homework_4/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "homework_4", "common"))
+from scaling import inverse_transform_column
+
 # ---------------------------
 # Configuration
 # ---------------------------
@@ -60,10 +64,8 @@ def predict_next_day(symbol):
     # Predict the scaled price using the trained model
     predicted_price_scaled = model.predict(last_sequence)
 
-    # Reverse the scaling to obtain the actual predicted price
-    dummy_future = np.zeros((1, len(features)))
-    dummy_future[0, close_index] = predicted_price_scaled
-    predicted_price = scaler.inverse_transform(dummy_future)[0, close_index]
+    # Reverse the scaling of the Close column to obtain the actual predicted price
+    predicted_price = float(inverse_transform_column(scaler, predicted_price_scaled[0, 0], close_index))
 
     # Return the predicted price
     return predicted_price
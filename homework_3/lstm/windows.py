@@ -0,0 +1,53 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def make_windows(scaled_data, sequence_length, future_target, target_index):
+    """
+    Function to create the LSTM input sequences and targets without copying the data.
+    X[i] is scaled_data[i:i + sequence_length] and y[i] the target column future_target days after it.
+    :param scaled_data: 2-D array (days, features)
+    :param sequence_length: number of days in a sequence
+    :param future_target: how many days ahead the target is
+    :param target_index: column of the target feature
+    :return: (X view of shape (samples, sequence_length, features), y view of shape (samples,))
+    """
+    samples = len(scaled_data) - sequence_length - future_target + 1
+    if samples <= 0:
+        return (np.empty((0, sequence_length, scaled_data.shape[1]), dtype=scaled_data.dtype),
+                np.empty((0,), dtype=scaled_data.dtype))
+
+    # sliding_window_view puts the window axis last: (windows, features, sequence_length)
+    X = sliding_window_view(scaled_data, sequence_length, axis=0)[:samples].transpose(0, 2, 1)
+    y = scaled_data[sequence_length + future_target - 1:, target_index]
+    return X, y
+
+
+def make_windows_list(scaled_data, sequence_length, future_target, target_index):
+    """
+    The previous implementation, kept for benchmark_windows.py: copies every sequence into a Python list
+    """
+    X = []
+    y = []
+    for i in range(sequence_length, len(scaled_data) - future_target + 1):
+        X.append(scaled_data[i - sequence_length:i])
+        y.append(scaled_data[i + future_target - 1, target_index])
+    return np.array(X), np.array(y)
+
+
+
+def make_horizon_windows(scaled_data, sequence_length, horizon, target_index):
+    """
+    Function to create sequences with multi-horizon targets without copying the data.
+    X[i] is scaled_data[i:i + sequence_length] and y[i] the target column on the horizon days after it.
+    :param scaled_data: 2-D array (days, features)
+    :param sequence_length: number of days in a sequence
+    :param horizon: number of days predicted at once
+    :param target_index: column of the target feature
+    :return: (X view of shape (samples, sequence_length, features), y view of shape (samples, horizon))
+    """
+    X, _ = make_windows(scaled_data, sequence_length, horizon, target_index)
+    if len(X) == 0:
+        return X, np.empty((0, horizon), dtype=scaled_data.dtype)
+    y = sliding_window_view(scaled_data[sequence_length:, target_index], horizon)[:len(X)]
+    return X, y
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from correlations import (MIN_OVERLAP, WINDOW, build_index, build_returns, correlation, load_closes, rolling_sums,
+                          window_sums)
+
+# Times the correlation matrix of the whole universe over a one-year window, computed from scratch and by sliding
+# the window one day at a time, on the stored daily data and on synthetic 10-year data for 400 symbols, and checks
+# both against pandas' pairwise correlation of the same returns
+runs = 3
+
+
+def best_time(function, *args):
+    """
+    Function to measure the best time of a function
+    :return: (seconds, result of the last run)
+    """
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def pandas_correlation(returns, mask, end):
+    """
+    Function to compute the reference matrix with pandas (pairwise complete returns, same minimum overlap)
+    """
+    rows = slice(max(0, end - WINDOW), end)
+    frame = pd.DataFrame(np.where(mask[rows], returns[rows], np.nan))
+    result = frame.corr(min_periods=MIN_OVERLAP).to_numpy()
+    np.fill_diagonal(result, np.nan)
+    return result
+
+
+def slide_daily(returns, mask, days):
+    """
+    Function to slide the window over the last days, one day at a time
+    :return: correlation matrix of the last window
+    """
+    for end, sums in rolling_sums(returns, mask, WINDOW, step=1, start=len(returns) - days):
+        pass
+    return correlation(sums)
+
+
+def synthetic_closes(symbols=400, days=10 * 252, seed=0):
+    """
+    Function to generate random-walk prices driven by 8 sector factors on business days,
+    each symbol missing a random 30% of them
+    :return: dict symbol -> Series of the closing price
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=days, name='Date')
+    factors = rng.normal(0, 0.01, (days, 8))
+    closes = {}
+    for symbol in range(symbols):
+        traded = rng.random(days) < 0.7
+        daily = factors[:, symbol % 8] + rng.normal(0, 0.015, days)
+        closes[f"S{symbol:03d}"] = pd.Series(100 * np.exp(np.cumsum(daily)), index=dates)[traded]
+    return closes
+
+
+def run(name, closes):
+    dates, symbols, returns, mask = build_returns(closes)
+    end = len(returns)
+    full_seconds, full = best_time(lambda: correlation(window_sums(returns[end - WINDOW:end], mask[end - WINDOW:end])))
+    slide_seconds, slid = best_time(slide_daily, returns, mask, 21)
+    pandas_seconds, expected = best_time(pandas_correlation, returns, mask, end)
+    index_seconds, index = best_time(build_index, dates, symbols, returns, mask)
+
+    assert np.allclose(full, expected, atol=1e-9, equal_nan=True)
+    assert np.allclose(slid, expected, atol=1e-9, equal_nan=True)
+    latest = index["Correlation"][-1]
+    assert np.allclose(latest, expected, atol=1e-6, equal_nan=True)
+    assert all(latest[row, index["Neighbors"][-1, row, 0]] == np.nanmax(latest[row])
+               for row in range(len(symbols)) if not np.isnan(latest[row]).all())
+
+    print(f"{name}: {len(symbols)} symbols x {len(dates)} dates, {int(mask.sum())} returns, "
+          f"{int(np.isfinite(full).sum()) // 2} correlated pairs")
+    print(f"  pandas:                {pandas_seconds * 1000:.1f} ms")
+    print(f"  from scratch:          {full_seconds * 1000:.1f} ms")
+    print(f"  sliding 21 x 1 day:    {slide_seconds * 1000:.1f} ms ({slide_seconds / 21 * 1000:.2f} ms per day)")
+    print(f"  index of {len(index['Date'])} windows:   {index_seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    run("stored daily data", load_closes())
+    run("synthetic", synthetic_closes())
+    print("Correlations match pandas")
@@ -0,0 +1,39 @@
+import glob
+import time
+
+from check_kernels import load_prices, ta_indicators
+from indicators import all_indicators
+
+# Compares the time per symbol of the ta-based indicator chain and of the fused kernel
+# on the stored daily data (check_kernels.py checks that both give the same columns)
+runs = 3
+
+
+def measure(function, frames):
+    """
+    Function to measure the best total time of a function over all frames
+    :param function: function taking a price DataFrame
+    :param frames: list of price DataFrames
+    :return: seconds
+    """
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        for prices in frames:
+            function(prices.copy())
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    frames = [load_prices(file_path) for file_path in sorted(glob.glob("../indicators/*_oscillators_1.csv"))]
+    frames = [prices for prices in frames if not prices.empty]
+    rows = sum(len(prices) for prices in frames)
+    all_indicators(frames[0].copy())  # Warm-up run
+
+    ta_seconds = measure(ta_indicators, frames)
+    kernel_seconds = measure(all_indicators, frames)
+    print(f"{len(frames)} symbols, {rows} daily rows, best of {runs}")
+    print(f"ta:     {ta_seconds * 1000 / len(frames):.2f} ms per symbol, {ta_seconds:.2f} s in total")
+    print(f"kernel: {kernel_seconds * 1000 / len(frames):.2f} ms per symbol, {kernel_seconds:.2f} s in total")
+    print(f"speedup: {ta_seconds / kernel_seconds:.1f}x")
@@ -0,0 +1,99 @@
+import glob
+import time
+
+import numpy as np
+import pandas as pd
+
+from check_kernels import count_signal_differences, load_prices
+from kernels import OUTPUT_COLUMNS, compute_indicators, compute_signals
+from panel import build_panel, compute_panel, get_symbol_columns
+
+# Compares computing the indicators symbol by symbol with the panel mode, on the stored daily data
+# and on synthetic 10-year data for 160 symbols, and checks that both give the same values
+# (signals may differ at ties, see check_kernels.py)
+runs = 3
+
+
+def per_symbol(frames):
+    """
+    Function to compute the indicators of each symbol separately
+    :param frames: dict symbol -> price DataFrame
+    :return: dict symbol -> dict column -> array
+    """
+    results = {}
+    for symbol, prices in frames.items():
+        columns = compute_indicators(prices['Close'], prices['Max'], prices['Min'], prices['Volume'])
+        columns.update(compute_signals(prices['Close'], columns))
+        results[symbol] = columns
+    return results
+
+
+def panel(frames):
+    """
+    Function to compute the indicators of all symbols in panel mode
+    :param frames: dict symbol -> price DataFrame
+    :return: (symbols, mask, dict column -> array of shape (dates, symbols))
+    """
+    dates, symbols, arrays, mask = build_panel(frames)
+    return symbols, mask, compute_panel(arrays, mask)
+
+
+def best_time(function, frames):
+    """
+    Function to measure the best time of a function
+    :param function: function taking the frames
+    :param frames: dict symbol -> price DataFrame
+    :return: (seconds, result of the last run)
+    """
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        result = function(frames)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def synthetic_frames(symbols=160, days=10 * 252, seed=0):
+    """
+    Function to generate random-walk prices on business days, each symbol missing a random 30% of them
+    :return: dict symbol -> price DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=days, name='Date')
+    frames = {}
+    for symbol in range(symbols):
+        traded = rng.random(days) < 0.7
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, traded.sum())))
+        spread = np.abs(rng.normal(0, 0.01, len(close))) * close
+        frames[f"S{symbol:03d}"] = pd.DataFrame({'Close': close, 'Max': close + spread, 'Min': close - spread,
+                                                 'Volume': rng.integers(0, 5000, len(close)).astype(float)},
+                                                index=dates[traded])
+    return frames
+
+
+def run(name, frames):
+    frames = {symbol: df[~df.index.duplicated(keep='last')] for symbol, df in frames.items()}  # As build_panel does
+    symbol_seconds, expected = best_time(per_symbol, frames)
+    panel_seconds, (symbols, mask, columns) = best_time(panel, frames)
+
+    for index, symbol in enumerate(symbols):
+        actual = get_symbol_columns(columns, mask, index)
+        for column in OUTPUT_COLUMNS:
+            if column.endswith('_Signal'):
+                assert count_signal_differences(column, expected[symbol][column], actual[column], actual,
+                                                frames[symbol]['Close'].to_numpy()) == 0, (symbol, column)
+            else:
+                assert np.allclose(actual[column], expected[symbol][column], rtol=1e-9, atol=1e-8,
+                                   equal_nan=True), (symbol, column)
+
+    rows = int(mask.sum())
+    print(f"{name}: {len(symbols)} symbols x {len(mask)} dates, {rows} rows")
+    print(f"  per symbol: {symbol_seconds * 1000:.0f} ms")
+    print(f"  panel:      {panel_seconds * 1000:.0f} ms (including alignment), {symbol_seconds / panel_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    stored = {file_path: load_prices(file_path) for file_path in sorted(glob.glob("../indicators/*_oscillators_1.csv"))}
+    run("stored daily data", {key: prices for key, prices in stored.items() if not prices.empty})
+    run("synthetic", synthetic_frames())
+    print("Panel results match the per-symbol results")
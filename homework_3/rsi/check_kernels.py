@@ -0,0 +1,137 @@
+import glob
+import sys
+
+import numpy as np
+import pandas as pd
+
+from indicators import (all_indicators, cci, cci_indicator, ema, ma_indicators, mfi, mfi_indicator, rsi,
+                        rsi_indicator, sma, stochastic, stochastic_indicator, williams_r, williams_r_indicator, wma)
+from kernels import MA_SIGNALS, SIGNAL_THRESHOLDS
+from resampling import resample
+
+# Golden-output check of the fused kernel: every indicator and signal column of all_indicators()
+# must match the ta-based functions on the stored daily data, its 7/30-day and calendar bars, and random data.
+# A signal may only differ where its indicator equals the threshold (or the close) up to rounding.
+INDICATOR_COLUMNS = ['RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']
+SIGNAL_COLUMNS = ['RSI_Signal', 'Stoch_Signal', 'WilliamsR_Signal', 'CCI_Signal', 'MFI_Signal',
+                  'SMA_Signal', 'EMA_Signal', 'WMA_Signal']
+RTOL = 1e-9
+ATOL = 1e-8
+
+
+def ta_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    # The indicator chain of indicators.py before the fused kernel
+    df = rsi(df)
+    df = rsi_indicator(df)
+    df = stochastic(df)
+    df = stochastic_indicator(df)
+    df = williams_r(df)
+    df = williams_r_indicator(df)
+    df = cci(df)
+    df = cci_indicator(df)
+    df = mfi(df)
+    df = mfi_indicator(df)
+    df = sma(df)
+    df = ema(df)
+    df = wma(df)
+    df = ma_indicators(df)
+    return df
+
+
+def load_prices(file_path):
+    """
+    Function to load the price columns of a stored daily indicators file
+    :param file_path: path to an _oscillators_1.csv file
+    :return: DataFrame indexed by date
+    """
+    df = pd.read_csv(file_path, usecols=['Date', 'Close', 'Max', 'Min', 'Volume'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.set_index('Date').sort_index().dropna()
+
+
+def random_prices(size, seed):
+    """
+    Function to generate a random price series with flat stretches, as on thinly traded days
+    :param size: number of days
+    :param seed: random seed
+    :return: DataFrame indexed by date
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size) * (rng.random(size) < 0.6)))
+    spread = np.abs(rng.normal(0, 0.01, size)) * close
+    return pd.DataFrame({'Close': close, 'Max': close + spread, 'Min': close - spread,
+                         'Volume': rng.integers(0, 5000, size).astype(float)},
+                        index=pd.date_range('2014-01-01', periods=size, freq='D', name='Date'))
+
+
+def count_signal_differences(column, expected, actual, columns, close):
+    """
+    Function to count the differences between two signal arrays, ignoring ties: rows where the indicator
+    equals the threshold (or the moving average equals the close) up to rounding
+    :param column: signal column
+    :param expected: expected signals
+    :param actual: actual signals
+    :param columns: indicator values (dict or DataFrame) of the actual signals
+    :param close: close prices
+    :return: number of differences
+    """
+    different = expected != actual
+    if column in MA_SIGNALS:
+        ties = np.isclose(np.asarray(columns[MA_SIGNALS[column]], dtype=float), close, rtol=RTOL, atol=0)
+    else:
+        indicator, buy_below, sell_above = SIGNAL_THRESHOLDS[column]
+        values = np.asarray(columns[indicator], dtype=float)
+        ties = (np.isclose(values, buy_below, rtol=RTOL, atol=ATOL)
+                | np.isclose(values, sell_above, rtol=RTOL, atol=ATOL))
+    return int((different & ~ties).sum())
+
+
+def compare(name, prices):
+    """
+    Function to compare the fused kernel with ta on a price frame
+    :param name: label for the report
+    :param prices: DataFrame with Close, Max, Min and Volume
+    :return: list of mismatch descriptions
+    """
+    expected = ta_indicators(prices.copy())
+    actual = all_indicators(prices.copy())
+    mismatches = []
+    for column in INDICATOR_COLUMNS:
+        expected_values = expected[column].to_numpy(dtype=float)
+        actual_values = actual[column].to_numpy(dtype=float)
+        if not np.allclose(actual_values, expected_values, rtol=RTOL, atol=ATOL, equal_nan=True):
+            with np.errstate(invalid='ignore'):
+                error = np.nanmax(np.abs(actual_values - expected_values))
+            mismatches.append(f"{name} {column}: max abs error {error}")
+    close = prices['Close'].to_numpy(dtype=float)
+    for column in SIGNAL_COLUMNS:
+        differences = count_signal_differences(column, expected[column].to_numpy(), actual[column].to_numpy(),
+                                               actual, close)
+        if differences:
+            mismatches.append(f"{name} {column}: {differences} different signals")
+    return mismatches
+
+
+if __name__ == '__main__':
+    frames = {}
+    for file_path in sorted(glob.glob("../indicators/*_oscillators_1.csv")):
+        daily = load_prices(file_path)
+        if daily.empty:
+            continue
+        frames[file_path] = daily
+        for timeframe in [7, 30, 'W', 'M']:
+            frames[f"{file_path} {timeframe}"] = resample(daily, timeframe)[['Close', 'Max', 'Min', 'Volume']]
+    for seed in range(20):
+        frames[f"random {seed}"] = random_prices(1000, seed)
+    frames["short"] = random_prices(10, 0)  # Shorter than every window
+
+    mismatches = []
+    for name, prices in frames.items():
+        mismatches.extend(compare(name, prices))
+
+    print(f"Compared {len(frames)} series")
+    for mismatch in mismatches:
+        print(mismatch)
+    if mismatches:
+        sys.exit(1)
+    print("All indicators and signals match ta")
@@ -0,0 +1,245 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Rolling correlations of the daily returns of all symbols, and the "similar stocks" index served by the indicators
+# service (GET /<issuer>/similar). The closing prices of shared/storage/{symbol}.csv are aligned on the union of
+# the trading dates, and a return is kept only when the symbol traded on the previous market day too, so every
+# return covers the same one-day interval; a pair is correlated over the days where both symbols have a return.
+# For a window of dates, the pairwise sums (counts, sums, squares, products) are (symbols x symbols) matrix products,
+# and sliding the window adds the products of the new rows and subtracts the ones of the rows that left it.
+#   python correlations.py                          # Index of the 1-year window, written to shared/storage
+#   python correlations.py --window 63 --snapshots 4
+STORAGE_PATH = os.getenv("STORAGE_PATH", "../../shared/storage")
+
+# ---------------------------
+# Configuration
+# ---------------------------
+WINDOW = 252  # Market days of a correlation window (one year)
+MIN_OVERLAP = 60  # Days with a return of both symbols needed for their correlation, otherwise it is NaN
+SNAPSHOTS = 12  # Windows kept in the index, the last one ending on the last date
+STEP = 21  # Market days between two snapshots (one month)
+
+
+def get_index_path(folder, window):
+    return os.path.join(folder, f"similar_{window}.npz")
+
+
+# ---------------------------
+# Return matrix
+# ---------------------------
+
+def load_closes(storage_path=STORAGE_PATH, symbols=None):
+    """
+    Function to read the closing prices of the stored symbols
+    :param storage_path: folder with the {symbol}.csv files
+    :param symbols: list of company keys (default: every stored symbol)
+    :return: dict symbol -> Series of the closing price indexed by date, symbols without prices are left out
+    """
+    if symbols is None:
+        symbols = sorted(name[:-4] for name in os.listdir(storage_path) if name.endswith(".csv") and "_" not in name)
+    closes = {}
+    for symbol in symbols:
+        df = pd.read_csv(os.path.join(storage_path, f"{symbol}.csv"), usecols=['Date', 'Last trade price'], dtype=str)
+        # "28.299,00" -> 28299.0, as price_str_to_float in indicators.py for the whole column at once
+        price = pd.to_numeric(df['Last trade price'].str.replace('"', '').str.replace('.', '', regex=False)
+                              .str.replace(',', '.', regex=False), errors='coerce')
+        close = pd.Series(price.to_numpy(), index=pd.to_datetime(df['Date'], format='%d.%m.%Y'))
+        close = close[close > 0]
+        close = close[~close.index.duplicated(keep='last')].sort_index()
+        if not close.empty:
+            closes[symbol] = close
+    return closes
+
+
+def build_returns(closes):
+    """
+    Function to align the daily log returns of all symbols on the union of their dates.
+    A symbol's return on a date is kept when it traded on that date and on the previous market day,
+    a price after days without trading would put a return of several days next to one-day returns.
+    :param closes: dict symbol -> Series of the closing price indexed by date
+    :return: (dates, symbols, float64 returns of shape (dates, symbols) with 0 where there is no return,
+              bool mask of shape (dates, symbols), True where the symbol has a return)
+    """
+    symbols = list(closes)
+    dates = np.unique(np.concatenate([close.index.values for close in closes.values()]))
+    prices = np.full((len(dates), len(symbols)), np.nan)
+    for index, close in enumerate(closes.values()):
+        prices[np.searchsorted(dates, close.index.values), index] = close.to_numpy()
+
+    mask = np.zeros(prices.shape, dtype=bool)
+    mask[1:] = ~np.isnan(prices[1:]) & ~np.isnan(prices[:-1])
+    returns = np.zeros(prices.shape)
+    returns[1:][mask[1:]] = np.log(prices[1:][mask[1:]] / prices[:-1][mask[1:]])
+    return pd.DatetimeIndex(dates, name='Date'), symbols, returns, mask
+
+
+# ---------------------------
+# Rolling correlations
+# ---------------------------
+
+def window_sums(returns, mask, weights=None):
+    """
+    Function to compute the pairwise sums of a window's rows. Item [i, j] is taken over the days
+    where both symbol i and symbol j have a return.
+    :param returns: returns of the window's rows, 0 where there is no return
+    :param mask: mask of the window's rows
+    :param weights: weight of each row in the sums (default: 1), -1 subtracts a row
+    :return: dict "count", "sum" (of symbol i's returns), "square" (of symbol i's squared returns), "product"
+             -> float64 arrays of shape (symbols, symbols)
+    """
+    present = mask.astype(np.float64)
+    weighted = present if weights is None else present * weights[:, None]
+    # count, sum and square in one product: their left sides side by side, times the same right side
+    stacked = np.hstack([present, returns, returns * returns]).T @ weighted
+    count, total, square = np.split(stacked, 3)
+    product = returns.T @ (returns if weights is None else returns * weights[:, None])
+    return {"count": count, "sum": total, "square": square, "product": product}
+
+
+def slide(sums, returns, mask, added, removed):
+    """
+    Function to move a window: the rows entering it are added to the sums and the rows leaving it
+    subtracted, in place, with one product for both
+    :param sums: output of window_sums
+    :param returns: returns of all dates
+    :param mask: mask of all dates
+    :param added: slice of the rows entering the window
+    :param removed: slice of the rows leaving the window
+    """
+    entering, leaving = np.arange(len(returns))[added], np.arange(len(returns))[removed]
+    rows = np.r_[entering, leaving]
+    weights = np.r_[np.ones(len(entering)), -np.ones(len(leaving))]
+    for key, values in window_sums(returns[rows], mask[rows], weights).items():
+        sums[key] += values
+
+
+def correlation(sums, min_overlap=MIN_OVERLAP):
+    """
+    Function to compute the correlation matrix of a window from its sums
+    :param sums: output of window_sums
+    :param min_overlap: common days needed for a pair
+    :return: float64 array of shape (symbols, symbols), NaN on the diagonal, for pairs with less than
+             min_overlap common days and for symbols with a constant price over them
+    """
+    count, total, square = sums["count"], sums["sum"], sums["square"]
+    covariance = count * sums["product"] - total * total.T
+    variance = count * square - total * total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = covariance / np.sqrt(variance * variance.T)
+    # A variance that is 0 up to rounding (e.g. a price that did not move) gives no correlation
+    tolerance = 1e-9 * count * square
+    result[(count < min_overlap) | (variance <= tolerance) | (variance.T <= tolerance.T)] = np.nan
+    np.fill_diagonal(result, np.nan)
+    return np.clip(result, -1.0, 1.0)
+
+
+def rolling_sums(returns, mask, window=WINDOW, step=STEP, start=None):
+    """
+    Function to compute the sums of a window sliding over the dates.
+    The sums of the first window are computed once, then every step only touches the rows entering and leaving it.
+    :param returns: returns of all dates (see build_returns)
+    :param mask: mask of all dates
+    :param window: rows of a window
+    :param step: rows between two windows
+    :param start: row after the end of the first window (default: the first full window)
+    :return: generator of (row after the end of the window, sums), the sums are updated in place by the next step
+    """
+    end = min(len(returns), window) if start is None else start
+    sums = window_sums(returns[max(0, end - window):end], mask[max(0, end - window):end])
+    while True:
+        yield end, sums
+        if end + step > len(returns):
+            return
+        slide(sums, returns, mask, slice(end, end + step), slice(max(0, end - window), max(0, end + step - window)))
+        end += step
+
+
+# ---------------------------
+# Similar stocks index
+# ---------------------------
+
+def build_index(dates, symbols, returns, mask, window=WINDOW, snapshots=SNAPSHOTS, step=STEP,
+                min_overlap=MIN_OVERLAP):
+    """
+    Function to build the index of the most correlated symbols of every symbol, for the last windows
+    :param dates: dates of the rows (see build_returns)
+    :param symbols: list of symbols
+    :param returns: returns of all dates
+    :param mask: mask of all dates
+    :param window: rows of a window
+    :param snapshots: windows kept, the last one ending on the last date
+    :param step: rows between two windows
+    :param min_overlap: common days needed for a pair
+    :return: dict of arrays: "Date" (last date of each window), "Symbol", "Correlation" and "Overlap" of shape
+             (snapshots, symbols, symbols), "Neighbors" with every row's symbols by decreasing correlation
+             (pairs without a correlation last)
+    """
+    first_end = max(min(len(returns), window), len(returns) - (snapshots - 1) * step)
+    ends, matrices, counts = [], [], []
+    for end, sums in rolling_sums(returns, mask, window, step, start=first_end):
+        ends.append(end)
+        matrices.append(correlation(sums, min_overlap))
+        counts.append(sums["count"].copy())
+    correlations = np.stack(matrices)
+    overlap = np.stack(counts)
+    neighbors = np.argsort(np.where(np.isnan(correlations), np.inf, -correlations), axis=-1)
+    return {"Date": dates.values[np.array(ends) - 1].astype('datetime64[D]'), "Symbol": np.array(symbols),
+            "Window": np.array(window), "Correlation": correlations.astype(np.float32),
+            "Overlap": overlap.astype(np.int16), "Neighbors": neighbors.astype(np.int16)}
+
+
+def save_index(path, index):
+    """
+    Function to save an index, written next to its destination and renamed over it, so the service
+    reads the old or the new index, never a partial one. Load it with np.load(path).
+    :param path: path of the .npz file
+    :param index: output of build_index
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez(f, **index)
+    os.replace(temporary_path, path)
+
+
+def build(storage_path=STORAGE_PATH, output=None, window=WINDOW, snapshots=SNAPSHOTS, step=STEP):
+    """
+    Function to build and save the similar stocks index of the stored symbols
+    :param storage_path: folder with the {symbol}.csv files
+    :param output: folder of the index (default: the storage folder)
+    :param window: rows of a window
+    :param snapshots: windows kept
+    :param step: rows between two windows
+    :return: (path of the index, number of symbols)
+    """
+    dates, symbols, returns, mask = build_returns(load_closes(storage_path))
+    path = get_index_path(output or storage_path, window)
+    save_index(path, build_index(dates, symbols, returns, mask, window, snapshots, step))
+    return path, len(symbols)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the index of the most correlated symbols of every symbol")
+    parser.add_argument("--storage", default=STORAGE_PATH, help="folder with the {symbol}.csv files")
+    parser.add_argument("--output", help="folder of the index (default: the storage folder)")
+    parser.add_argument("--window", type=int, default=WINDOW, help="market days of a window")
+    parser.add_argument("--snapshots", type=int, default=SNAPSHOTS, help="windows kept, one every --step days")
+    parser.add_argument("--step", type=int, default=STEP)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    closes = load_closes(args.storage)
+    load_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    dates, symbols, returns, mask = build_returns(closes)
+    index = build_index(dates, symbols, returns, mask, args.window, args.snapshots, args.step)
+    compute_seconds = time.perf_counter() - start_time
+    path = get_index_path(args.output or args.storage, args.window)
+    save_index(path, index)
+    print(f"Read {len(symbols)} symbols in {load_seconds:.2f} seconds")
+    print(f"Correlated {len(symbols)} symbols x {len(dates)} dates, {len(index['Date'])} windows "
+          f"of {args.window} days, in {compute_seconds * 1000:.0f} ms")
+    print(f"Saved {path}")
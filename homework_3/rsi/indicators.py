@@ -1,9 +1,15 @@
 from datetime import datetime
+import argparse
+import os
 import pandas as pd
 from ta.momentum import RSIIndicator, StochasticOscillator, WilliamsRIndicator
 from ta.trend import CCIIndicator, SMAIndicator, EMAIndicator, WMAIndicator
 from ta.volume import MFIIndicator
 
+from kernels import OUTPUT_COLUMNS, compute_indicators, compute_signals
+from panel import build_panel, compute_panel, get_symbol_columns, save_columnar
+from resampling import get_bars, resample
+
 # Function to read CSV files and format columns appropriately
 def read_csv(filename) -> pd.DataFrame:
     df = pd.read_csv(filename)
@@ -18,7 +24,13 @@ def infer_close_price(df: pd.DataFrame) -> pd.DataFrame:
     df['Close'] = df['Last trade price']
     df['Max'] = df['Max'].apply(price_str_to_float)
     df['Min'] = df['Min'].apply(price_str_to_float)
-    df['Volume'] = df['Volume'].apply(lambda x: float(str(x).replace('.', '').replace(',', '.')))
+    df['Volume'] = df['Volume'].apply(amount_str_to_float)
+    # Extra columns carried over to the resampled bars
+    if 'Avg.' in df.columns:
+        df['Avg.'] = df['Avg.'].apply(price_str_to_float)
+    for column in ['Turnover in BEST in denars', 'Total turnover in denars']:
+        if column in df.columns:
+            df[column] = df[column].apply(amount_str_to_float)
     return df
 
 # Helper function to convert price string to float
@@ -27,6 +39,10 @@ def price_str_to_float(s):
     s = s.replace('.', '').replace(',', '.')  # Replace commas and periods
     return float(s)
 
+# Helper function to convert volume and turnover strings to floats
+def amount_str_to_float(s):
+    return float(str(s).replace('.', '').replace(',', '.'))
+
 # Function to save DataFrame to CSV file
 def save(df: pd.DataFrame, filename: str):
     df_copy = df.reset_index()  # Reset the index before saving
@@ -182,65 +198,80 @@ def ma_indicators(df: pd.DataFrame) -> pd.DataFrame:
     df['WMA_Signal'] = df.apply(lambda row: get_ma_signal(row['Close'], row['WMA']), axis=1)
     return df
 
+# ---------------------------
+# All indicators in one pass
+# ---------------------------
+
+def all_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    # Same columns as the functions above, computed together by the fused kernel (see kernels.py)
+    columns = compute_indicators(df['Close'], df['Max'], df['Min'], df['Volume'])
+    columns.update(compute_signals(df['Close'], columns))
+    return add_indicator_columns(df, columns)
+
+def add_indicator_columns(df: pd.DataFrame, columns) -> pd.DataFrame:
+    # Added in one step rather than column by column, in the same order as the functions above
+    result = pd.DataFrame({column: columns[column] for column in OUTPUT_COLUMNS}, index=df.index)
+    return pd.concat([df.drop(columns=result.columns, errors='ignore'), result], axis=1)
+
 # ---------------------------
 # Resampling DataFrame
 # ---------------------------
 
-def resample_df(df: pd.DataFrame, timeframe: int) -> pd.DataFrame:
-    if not isinstance(df.index, pd.DatetimeIndex):
-        raise ValueError("DataFrame index must be a DatetimeIndex before resampling.")
-
-    if timeframe == 1:
-        return df  # Return the original DataFrame
-    elif timeframe == 7:
-        df_resampled = df.resample('7D').agg({
-            'Close': 'last',
-            'Max': 'max',
-            'Min': 'min',
-            'Volume': 'sum'
-        }).dropna()  # Resample data with a 7-day timeframe
-        return df_resampled
-    elif timeframe == 30:
-        df_resampled = df.resample('30D').agg({
-            'Close': 'last',
-            'Max': 'max',
-            'Min': 'min',
-            'Volume': 'sum'
-        }).dropna()  # Resample data with a 30-day timeframe
-        return df_resampled
-    else:
-        raise ValueError("Invalid timeframe specified.")  # Raise error for invalid timeframe
+def resample_df(df: pd.DataFrame, timeframe) -> pd.DataFrame:
+    # timeframe: N or 'ND' for N-day bars, 'W', 'M' or 'Q' for calendar bars (see resampling.py)
+    return resample(df, timeframe)
+
+# ---------------------------
+# One symbol (job queue worker)
+# ---------------------------
+
+def compute_symbol(symbol, timeframes):
+    # Compute and save the indicators of one symbol for every timeframe, as the main loop does (see worker.py)
+    df = infer_close_price(read_csv(f"../shared/storage/{symbol}.csv"))
+    for timeframe in timeframes:
+        df_resampled = all_indicators(get_bars(symbol, df, timeframe))
+        save(df_resampled, f"../shared/storage/{symbol}_resampled_{timeframe}.csv")
 
 # ---------------------------
 # Main Execution
 # ---------------------------
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute the indicators and signals of every symbol")
+    parser.add_argument("--panel", action="store_true",
+                        help="compute all symbols at once over a (dates x symbols) matrix")
+    parser.add_argument("--output", choices=["csv", "npz"], default="csv",
+                        help="panel mode: one CSV per symbol or one columnar file per timeframe")
+    args = parser.parse_args()
+
     symbols = get_symbols()  # Get list of symbols from file
-    timeframes = [1, 7, 30]  # Define timeframes for resampling
+    timeframes = os.getenv("TIMEFRAMES", "1,7,30").split(",")  # Define timeframes for resampling, e.g. 1,7,30,W,M,Q
     start_time = datetime.now()  # Start execution time
 
+    daily_frames = {}
     for symbol in symbols:
         df = read_csv(f"../shared/storage/{symbol}.csv")  # Read CSV for each symbol
-        df = infer_close_price(df)  # Process price columns
-
-        for timeframe in timeframes:
-            df_resampled = resample_df(df, timeframe)  # Resample data based on timeframe
-            df_resampled = rsi(df_resampled)  # Apply RSI indicator
-            df_resampled = rsi_indicator(df_resampled)  # Apply RSI signal
-            df_resampled = stochastic(df_resampled)  # Apply Stochastic Oscillator
-            df_resampled = stochastic_indicator(df_resampled)  # Apply Stochastic signal
-            df_resampled = williams_r(df_resampled)  # Apply Williams %R
-            df_resampled = williams_r_indicator(df_resampled)  # Apply Williams %R signal
-            df_resampled = cci(df_resampled)  # Apply CCI
-            df_resampled = cci_indicator(df_resampled)  # Apply CCI signal
-            df_resampled = mfi(df_resampled)  # Apply MFI
-            df_resampled = mfi_indicator(df_resampled)  # Apply MFI signal
-            df_resampled = sma(df_resampled)  # Apply SMA
-            df_resampled = ema(df_resampled)  # Apply EMA
-            df_resampled = wma(df_resampled)  # Apply WMA
-            df_resampled = ma_indicators(df_resampled)  # Apply Moving Average signals
-
+        daily_frames[symbol] = infer_close_price(df)  # Process price columns
+
+    for timeframe in timeframes:
+        # Resample data, reusing the cached bars of the last run
+        frames = {symbol: get_bars(symbol, df, timeframe) for symbol, df in daily_frames.items()}
+
+        if not args.panel:
+            for symbol, df_resampled in frames.items():
+                df_resampled = all_indicators(df_resampled)  # Apply all indicators and their signals
+                save(df_resampled, f"../shared/storage/{symbol}_resampled_{timeframe}.csv")  # Save resampled data
+            continue
+
+        dates, panel_symbols, arrays, mask = build_panel(frames)  # Align all symbols on the same dates
+        columns = compute_panel(arrays, mask)  # Apply all indicators and their signals to every symbol at once
+        if args.output == "npz":
+            save_columnar(f"../shared/storage/panel_{timeframe}.npz", dates, panel_symbols, arrays, columns, mask)
+            continue
+        for index, symbol in enumerate(panel_symbols):
+            df_resampled = frames[symbol]
+            df_resampled = df_resampled[~df_resampled.index.duplicated(keep='last')]
+            df_resampled = add_indicator_columns(df_resampled, get_symbol_columns(columns, mask, index))
             save(df_resampled, f"../shared/storage/{symbol}_resampled_{timeframe}.csv")  # Save resampled data
 
     print(f"Execution completed in {datetime.now() - start_time}")  # Print total execution time
@@ -0,0 +1,179 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ---------------------------
+# Configuration
+# ---------------------------
+# Windows used by indicators.py, the same defaults as its ta calls
+RSI_WINDOW = 14
+STOCH_WINDOW = 14
+STOCH_SMOOTH_WINDOW = 3
+WILLIAMS_R_WINDOW = 14
+CCI_WINDOW = 20
+CCI_CONSTANT = 0.015
+MFI_WINDOW = 14
+MA_WINDOW = 14
+EWM_BLOCK = 64  # Rows computed together by one matrix product in _ewm
+
+# Thresholds of the get_*_signal functions in indicators.py: (indicator column, buy below, sell above)
+SIGNAL_THRESHOLDS = {
+    'RSI_Signal': ('RSI', 30, 70),
+    'Stoch_Signal': ('Stoch_K', 20, 80),
+    'WilliamsR_Signal': ('WilliamsR', -80, -20),
+    'CCI_Signal': ('CCI', -100, 100),
+    'MFI_Signal': ('MFI', 20, 80),
+}
+MA_SIGNALS = {'SMA_Signal': 'SMA', 'EMA_Signal': 'EMA', 'WMA_Signal': 'WMA'}
+SIGNAL_LABELS = np.array(["HOLD", "BUY", "SELL"], dtype=object)  # Indexed by the signal code, -1 is the last one
+
+# Output columns in the order of the _oscillators_ma_* files
+OUTPUT_COLUMNS = ['RSI', 'RSI_Signal', 'Stoch_K', 'Stoch_D', 'Stoch_Signal', 'WilliamsR', 'WilliamsR_Signal',
+                  'CCI', 'CCI_Signal', 'MFI', 'MFI_Signal', 'SMA', 'EMA', 'WMA', 'SMA_Signal', 'EMA_Signal', 'WMA_Signal']
+
+
+def _ewm(values, alpha, min_periods):
+    """
+    Function to compute pandas' ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean()
+    of series without missing values, along axis 0.
+    The recursion is unrolled over blocks of EWM_BLOCK rows: inside a block every row is a weighted sum
+    of the block's values and of the last result before it, so each block is one matrix product.
+    :param values: float64 array of shape (days,) or (days, symbols)
+    :param alpha: smoothing factor
+    :param min_periods: number of values before the first result
+    :return: float64 array
+    """
+    result = np.empty_like(values)
+    if len(values) == 0:
+        return result
+
+    steps = np.arange(EWM_BLOCK)
+    lags = np.subtract.outer(steps, steps)
+    weights = np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)  # Weight of value j in row i
+    carry = (1 - alpha) ** (steps + 1)  # Weight of the last result before the block
+    carry = carry.reshape((EWM_BLOCK,) + (1,) * (values.ndim - 1))
+
+    result[0] = values[0]
+    for start in range(1, len(values), EWM_BLOCK):
+        block = values[start:start + EWM_BLOCK]
+        size = len(block)
+        result[start:start + size] = weights[:size, :size] @ block + carry[:size] * result[start - 1]
+    result[:min_periods - 1] = np.nan
+    return result
+
+
+def compute_indicators(close, high, low, volume):
+    """
+    Function to compute all the indicators of indicators.py over contiguous arrays.
+    The rolling windows of each input are built once and shared, and every window
+    statistic is one vectorized reduction, instead of one ta object and its temporary Series per indicator.
+    Time runs along axis 0, so 2-D inputs of shape (days, symbols) compute every symbol at once (see panel.py).
+    Matches ta 0.11 (see check_kernels.py) for inputs without missing values.
+    :param close: close prices
+    :param high: Max prices
+    :param low: Min prices
+    :param volume: volumes
+    :return: dict column -> float64 array of the input shape
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    volume = np.ascontiguousarray(volume, dtype=np.float64)
+    size = len(close)
+    shape = close.shape
+    columns = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # RSI: Wilder smoothing of the gains and losses
+        diff = np.full(shape, np.nan)
+        diff[1:] = close[1:] - close[:-1]
+        gains = np.where(diff > 0, diff, 0.0)
+        losses = np.where(diff < 0, -diff, 0.0)
+        average_gain = _ewm(gains, 1 / RSI_WINDOW, RSI_WINDOW)
+        average_loss = _ewm(losses, 1 / RSI_WINDOW, RSI_WINDOW)
+        columns['RSI'] = np.where(average_loss == 0, 100, 100 - 100 / (1 + average_gain / average_loss))
+
+        # Stochastic %K/%D and Williams %R share the highest high and lowest low
+        highest_high = np.full(shape, np.nan)
+        lowest_low = np.full(shape, np.nan)
+        if size >= STOCH_WINDOW:
+            highest_high[STOCH_WINDOW - 1:] = sliding_window_view(high, STOCH_WINDOW, axis=0).max(axis=-1)
+            lowest_low[STOCH_WINDOW - 1:] = sliding_window_view(low, STOCH_WINDOW, axis=0).min(axis=-1)
+        columns['Stoch_K'] = 100 * (close - lowest_low) / (highest_high - lowest_low)
+        columns['Stoch_D'] = np.full(shape, np.nan)
+        if size >= STOCH_SMOOTH_WINDOW:
+            columns['Stoch_D'][STOCH_SMOOTH_WINDOW - 1:] = sliding_window_view(
+                columns['Stoch_K'], STOCH_SMOOTH_WINDOW, axis=0).mean(axis=-1)
+        if WILLIAMS_R_WINDOW != STOCH_WINDOW:
+            highest_high = np.full(shape, np.nan)
+            lowest_low = np.full(shape, np.nan)
+            if size >= WILLIAMS_R_WINDOW:
+                highest_high[WILLIAMS_R_WINDOW - 1:] = sliding_window_view(high, WILLIAMS_R_WINDOW, axis=0).max(axis=-1)
+                lowest_low[WILLIAMS_R_WINDOW - 1:] = sliding_window_view(low, WILLIAMS_R_WINDOW, axis=0).min(axis=-1)
+        columns['WilliamsR'] = -100 * (highest_high - close) / (highest_high - lowest_low)
+
+        # CCI and MFI share the typical price
+        typical_price = (high + low + close) / 3.0
+        columns['CCI'] = np.full(shape, np.nan)
+        if size >= CCI_WINDOW:
+            windows = sliding_window_view(typical_price, CCI_WINDOW, axis=0)
+            mean = windows.mean(axis=-1)
+            mean_deviation = np.abs(windows - mean[..., None]).mean(axis=-1)
+            columns['CCI'][CCI_WINDOW - 1:] = (typical_price[CCI_WINDOW - 1:] - mean) / (CCI_CONSTANT * mean_deviation)
+
+        direction = np.zeros(shape)
+        direction[1:] = np.sign(typical_price[1:] - typical_price[:-1])
+        money_flow = typical_price * volume * direction
+        columns['MFI'] = np.full(shape, np.nan)
+        if size >= MFI_WINDOW:
+            positive = sliding_window_view(np.where(money_flow >= 0, money_flow, 0.0), MFI_WINDOW, axis=0).sum(axis=-1)
+            negative = -sliding_window_view(np.where(money_flow < 0, money_flow, 0.0), MFI_WINDOW, axis=0).sum(axis=-1)
+            columns['MFI'][MFI_WINDOW - 1:] = 100 - 100 / (1 + positive / negative)
+
+        # Moving averages share the close windows
+        columns['SMA'] = np.full(shape, np.nan)
+        columns['WMA'] = np.full(shape, np.nan)
+        if size >= MA_WINDOW:
+            windows = sliding_window_view(close, MA_WINDOW, axis=0)
+            weights = np.arange(1, MA_WINDOW + 1) * 2 / (MA_WINDOW * (MA_WINDOW + 1))
+            columns['SMA'][MA_WINDOW - 1:] = windows.mean(axis=-1)
+            columns['WMA'][MA_WINDOW - 1:] = (windows * weights).sum(axis=-1)
+        columns['EMA'] = _ewm(close, 2 / (MA_WINDOW + 1), MA_WINDOW)
+
+    return columns
+
+
+def compute_signal_codes(close, columns):
+    """
+    Function to compute the signals of indicators.py from the indicator arrays as codes: +1 BUY, -1 SELL, 0 HOLD
+    :param close: close prices
+    :param columns: output of compute_indicators
+    :return: dict signal column -> int8 array
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signals = {}
+    for signal, (column, buy_below, sell_above) in SIGNAL_THRESHOLDS.items():
+        values = columns[column]
+        signals[signal] = (values < buy_below).astype(np.int8) - (values > sell_above)
+    for signal, column in MA_SIGNALS.items():
+        values = columns[column]
+        signals[signal] = (close > values).astype(np.int8) - (close < values)
+    return signals
+
+
+def decode_signals(codes):
+    """
+    Function to turn signal codes into the BUY/SELL/HOLD labels of the indicator files
+    :param codes: int8 array of +1, -1 and 0
+    :return: object array
+    """
+    return SIGNAL_LABELS[codes]
+
+
+def compute_signals(close, columns):
+    """
+    Function to compute the BUY/SELL/HOLD signals of indicators.py from the indicator arrays
+    :param close: close prices
+    :param columns: output of compute_indicators
+    :return: dict signal column -> object array of BUY, SELL and HOLD
+    """
+    return {signal: decode_signals(codes) for signal, codes in compute_signal_codes(close, columns).items()}
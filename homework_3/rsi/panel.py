@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from kernels import compute_indicators, compute_signal_codes, decode_signals
+
+# ---------------------------
+# Configuration
+# ---------------------------
+PRICE_COLUMNS = ['Close', 'Max', 'Min', 'Volume']  # Inputs of the indicators
+
+
+def build_panel(frames):
+    """
+    Function to align the price columns of all symbols on the union of their dates
+    :param frames: dict symbol -> DataFrame indexed by date (daily rows or bars), a repeated date keeps its last row
+    :return: (dates, symbols, dict column -> float64 array of shape (dates, symbols),
+              bool mask of shape (dates, symbols), True where the symbol has a row)
+    """
+    frames = {symbol: df[~df.index.duplicated(keep='last')] for symbol, df in frames.items() if not df.empty}
+    symbols = list(frames)
+    dates = np.unique(np.concatenate([df.index.values for df in frames.values()]))
+
+    mask = np.zeros((len(dates), len(symbols)), dtype=bool)
+    arrays = {column: np.full((len(dates), len(symbols)), np.nan) for column in PRICE_COLUMNS}
+    for index, (symbol, df) in enumerate(frames.items()):
+        rows = np.searchsorted(dates, df.index.values)
+        mask[rows, index] = True
+        for column in PRICE_COLUMNS:
+            arrays[column][rows, index] = df[column].to_numpy(dtype=np.float64)
+    return pd.DatetimeIndex(dates, name='Date'), symbols, arrays, mask
+
+
+def compute_panel(arrays, mask):
+    """
+    Function to compute every indicator and signal of every symbol at once.
+    Each symbol's rows are first packed to the top of its column, in date order, so the rolling windows
+    run over the symbol's own trading days exactly as in the per-symbol path, then the results are put back
+    in place of the dates. Dates without a row are NaN (indicators) or 0 (signals).
+    Symbols are computed in groups of similar row counts, so a symbol listed for a few months
+    is not padded to the length of the whole history.
+    :param arrays: dict column -> float64 array of shape (dates, symbols) (see build_panel)
+    :param mask: bool array of shape (dates, symbols)
+    :return: dict column -> array of shape (dates, symbols), signals as int8 codes (+1 BUY, -1 SELL, 0 HOLD)
+    """
+    order = np.argsort(~mask, axis=0, kind='stable')  # Rows with data first, each group in date order
+    counts = mask.sum(axis=0)
+    by_count = np.argsort(-counts, kind='stable')
+
+    result = {}
+    start = 0
+    while start < len(by_count) and counts[by_count[start]] > 0:
+        # The group ends at the first symbol with less than half the rows of the longest one
+        length = counts[by_count[start]]
+        end = start + 1
+        while end < len(by_count) and counts[by_count[end]] * 2 >= length:
+            end += 1
+        group = by_count[start:end]
+        cells = (order[:length, group] * mask.shape[1] + group).ravel()  # Flat positions of the packed rows
+        packed = {column: arrays[column].ravel()[cells].reshape(length, len(group)) for column in PRICE_COLUMNS}
+        padding = np.arange(length)[:, None] >= counts[group]  # Rows after the end of a shorter symbol
+        for values in packed.values():
+            values[padding] = 0.0  # Any finite value, the results of these rows are dropped
+
+        columns = compute_indicators(packed['Close'], packed['Max'], packed['Min'], packed['Volume'])
+        columns.update(compute_signal_codes(packed['Close'], columns))
+        for column, values in columns.items():
+            if column not in result:
+                result[column] = np.zeros(mask.shape, dtype=values.dtype)
+            result[column].ravel()[cells] = values.ravel()
+        start = end
+
+    for values in result.values():
+        values[~mask] = 0 if values.dtype == np.int8 else np.nan
+    return result
+
+
+def get_symbol_columns(columns, mask, index):
+    """
+    Function to take the rows of one symbol out of the panel results
+    :param columns: output of compute_panel
+    :param mask: bool array of shape (dates, symbols)
+    :param index: position of the symbol
+    :return: dict column -> 1-D array over the symbol's dates, signals as BUY/SELL/HOLD
+    """
+    rows = mask[:, index]
+    return {column: decode_signals(values[rows, index]) if values.dtype == np.int8 else values[rows, index]
+            for column, values in columns.items()}
+
+
+def save_columnar(file_path, dates, symbols, arrays, columns, mask):
+    """
+    Function to save the whole panel as one file of (dates, symbols) arrays, one per column.
+    Signals are stored as int8 codes (+1 BUY, -1 SELL, 0 HOLD), load it with np.load(file_path).
+    :param file_path: path of the .npz file
+    :param dates: DatetimeIndex
+    :param symbols: list of symbols
+    :param arrays: price arrays (see build_panel)
+    :param columns: output of compute_panel
+    :param mask: bool array of shape (dates, symbols)
+    """
+    data = {'Date': dates.values.astype('datetime64[D]'), 'Symbol': np.array(symbols), 'Mask': mask}
+    data.update(arrays)
+    data.update(columns)
+    np.savez(file_path, **data)
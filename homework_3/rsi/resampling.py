@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+# ---------------------------
+# Configuration
+# ---------------------------
+BARS_PATH = os.getenv("BARS_PATH", "../shared/storage/bars")  # Cached higher-timeframe bars, one CSV per symbol and timeframe
+
+# How each daily column is combined into a bar. Columns missing from the data are skipped.
+AGGREGATIONS = {
+    'Close': 'last',
+    'Last trade price': 'last',
+    'Max': 'max',
+    'Min': 'min',
+    'Avg.': 'last',  # Replaced by the volume-weighted average below when the bar has volume
+    'Volume': 'sum',
+    'Turnover in BEST in denars': 'sum',
+    'Total turnover in denars': 'sum',
+}
+REQUIRED_COLUMNS = ['Close', 'Max', 'Min', 'Volume']  # Bars missing one of these are dropped
+
+# Calendar timeframes and the pandas period of each
+CALENDAR_PERIODS = {'W': 'W-SUN', 'M': 'M', 'Q': 'Q'}
+
+# Legacy numeric timeframes of indicators.py: N-day bars
+TIMEFRAME_PATTERN = re.compile(r"^(\d+)D?$")
+
+
+def parse_timeframe(timeframe):
+    """
+    Function to check a timeframe: 'W', 'M', 'Q' for calendar bars, N or 'ND' for N-day bars
+    :param timeframe: the timeframe
+    :return: the calendar period ('W', 'M', 'Q') or the number of days
+    """
+    timeframe = str(timeframe).upper()
+    if timeframe in CALENDAR_PERIODS:
+        return timeframe
+    match = TIMEFRAME_PATTERN.match(timeframe)
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f"Invalid timeframe '{timeframe}', expected W, M, Q or a number of days.")
+    return int(match.group(1))
+
+
+def get_bar_starts(dates, timeframe, origin=None):
+    """
+    Function to get the start date of the bar each day belongs to.
+    Calendar bars start on Monday, on the first day of the month or of the quarter.
+    N-day bars start every N days from the origin, the first date of the history.
+    :param dates: DatetimeIndex of the daily rows
+    :param timeframe: parsed timeframe (see parse_timeframe)
+    :param origin: any bar start of the same history, defaults to the first date
+    :return: DatetimeIndex of bar starts
+    """
+    if isinstance(timeframe, str):
+        return dates.to_period(CALENDAR_PERIODS[timeframe]).start_time
+
+    days = dates.normalize()
+    origin = days[0] if origin is None else pd.Timestamp(origin)
+    offsets = (days - origin).days // timeframe * timeframe
+    return origin + pd.to_timedelta(offsets, unit='D')
+
+
+def aggregate(daily, timeframe, origin=None):
+    """
+    Function to combine daily rows into bars labelled by their start date
+    :param daily: daily DataFrame indexed by date, sorted
+    :param timeframe: parsed timeframe (see parse_timeframe)
+    :param origin: any bar start of the same history (N-day bars only)
+    :return: DataFrame of bars
+    """
+    aggregations = {column: how for column, how in AGGREGATIONS.items() if column in daily.columns}
+    starts = get_bar_starts(daily.index, timeframe, origin)
+    bars = daily.groupby(starts).agg(aggregations)
+    bars.index.name = daily.index.name
+
+    # Average price of the bar weighted by volume, from the daily turnover
+    if 'Avg.' in bars.columns and 'Total turnover in denars' in bars.columns:
+        traded = bars['Volume'] > 0
+        bars.loc[traded, 'Avg.'] = bars.loc[traded, 'Total turnover in denars'] / bars.loc[traded, 'Volume']
+
+    return bars.dropna(subset=[column for column in REQUIRED_COLUMNS if column in bars.columns])
+
+
+def add_price_change(bars):
+    """
+    Function to set the price change of each bar from the previous bar's close, in percent
+    :param bars: DataFrame of bars
+    :return: the same DataFrame
+    """
+    bars['Price %chg.'] = bars['Close'].pct_change() * 100
+    return bars
+
+
+def resample(daily, timeframe):
+    """
+    Function to resample daily rows into bars
+    :param daily: daily DataFrame indexed by date (DatetimeIndex)
+    :param timeframe: 'W', 'M', 'Q', N or 'ND'
+    :return: DataFrame of bars
+    """
+    if not isinstance(daily.index, pd.DatetimeIndex):
+        raise ValueError("DataFrame index must be a DatetimeIndex before resampling.")
+
+    timeframe = parse_timeframe(timeframe)
+    if timeframe == 1:
+        return daily  # Daily bars are the data itself
+    return add_price_change(aggregate(daily.sort_index(), timeframe))
+
+
+def get_daily_fingerprint(daily, end):
+    """
+    Function to fingerprint the daily rows before a date, the rows that closed bars were built from
+    :param daily: daily DataFrame indexed by date
+    :param end: first date left out (start of the last, possibly open, bar)
+    :return: dict with the first date, the number of rows and a hash of the rows
+    """
+    daily = daily.sort_index()
+    covered = daily[daily.index < pd.Timestamp(end)]
+    covered = covered[[column for column in AGGREGATIONS if column in covered.columns]]
+    digest = hashlib.sha256(pd.util.hash_pandas_object(covered, index=True).to_numpy().tobytes()).hexdigest()
+    return {"first_date": str(covered.index[0].date()) if len(covered) else None,
+            "rows": len(covered), "sha256": digest}
+
+
+def update_bars(bars, daily, timeframe):
+    """
+    Function to bring bars up to date with new daily rows. The last cached bar may still have been open,
+    so it is rebuilt from its daily rows together with any newer bars; earlier bars are kept as they are.
+    The caller checks that the daily rows of the earlier bars did not change (see get_bars).
+    :param bars: cached bars (output of resample)
+    :param daily: daily DataFrame indexed by date, at least from the start of the last cached bar
+    :param timeframe: 'W', 'M', 'Q', N or 'ND'
+    :return: DataFrame of bars
+    """
+    timeframe = parse_timeframe(timeframe)
+    if timeframe == 1 or bars.empty:
+        return resample(daily, timeframe)
+
+    last_start = bars.index[-1]
+    recent = daily.sort_index().loc[last_start:]
+    if recent.empty:
+        return bars
+
+    recent_bars = aggregate(recent, timeframe, origin=last_start)
+    bars = pd.concat([bars[bars.index < last_start], recent_bars[bars.columns.intersection(recent_bars.columns)]])
+    return add_price_change(bars)
+
+
+def load_cached_bars(cache_file, daily):
+    """
+    Function to read cached bars if the daily rows they were built from are unchanged.
+    A replay or a backfill can rewrite old rows, and a change of the resampling changes every bar,
+    so the fingerprint saved with the bars must match the same rows of the current data.
+    :param cache_file: CSV file of the bars, its fingerprint is in the .json file next to it
+    :param daily: daily DataFrame indexed by date
+    :return: DataFrame of bars, None when there is no valid cache
+    """
+    fingerprint_file = os.path.splitext(cache_file)[0] + ".json"
+    if not os.path.exists(cache_file) or not os.path.exists(fingerprint_file):
+        return None
+    with open(fingerprint_file) as f:
+        saved = json.load(f)
+    bars = pd.read_csv(cache_file, index_col='Date', parse_dates=['Date'])
+    if bars.empty or saved.get("last_start") != str(bars.index[-1].date()):
+        return None
+    if saved.get("daily") != get_daily_fingerprint(daily, bars.index[-1]):
+        return None
+    return bars
+
+
+def save_cached_bars(cache_file, bars, daily):
+    """
+    Function to save bars with the fingerprint of the daily rows before their last bar, both written
+    next to their destination and renamed over it
+    :param cache_file: CSV file of the bars
+    :param bars: DataFrame of bars
+    :param daily: daily DataFrame the bars were built from
+    """
+    fingerprint_file = os.path.splitext(cache_file)[0] + ".json"
+    last_start = bars.index[-1] if len(bars) else daily.index.max()
+    fingerprint = {"last_start": str(pd.Timestamp(last_start).date()),
+                   "daily": get_daily_fingerprint(daily, last_start)}
+
+    temporary_path = f"{cache_file}.{os.getpid()}.tmp"
+    bars.reset_index().to_csv(temporary_path, index=False)
+    os.replace(temporary_path, cache_file)
+    temporary_path = f"{fingerprint_file}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(fingerprint, f)
+    os.replace(temporary_path, fingerprint_file)
+
+
+def get_bars(symbol, daily, timeframe, bars_path=BARS_PATH):
+    """
+    Function to get a symbol's bars, updating and saving the cached bars instead of resampling the full history.
+    The bars are resampled fully when the cache has no fingerprint or the daily rows it covers changed.
+    :param symbol: company key
+    :param daily: daily DataFrame indexed by date
+    :param timeframe: 'W', 'M', 'Q', N or 'ND'
+    :param bars_path: folder of the cached bars
+    :return: DataFrame of bars
+    """
+    if parse_timeframe(timeframe) == 1:
+        return daily
+
+    cache_file = os.path.join(bars_path, f"{symbol}_{str(timeframe).upper()}.csv")
+    cached = load_cached_bars(cache_file, daily)
+    if cached is not None:
+        bars = update_bars(cached, daily, timeframe)
+    else:
+        bars = resample(daily, timeframe)
+
+    os.makedirs(bars_path, exist_ok=True)
+    save_cached_bars(cache_file, bars, daily)
+    return bars
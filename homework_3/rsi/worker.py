@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+
+# The job queue module of the scrape workers, appended so the modules of this folder are found first
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             "homework_1"))
+import job_queue
+from indicators import compute_symbol, get_symbols
+
+# Indicators worker pulling per-symbol jobs from the shared job queue (see homework_1/job_queue.py), on as many hosts
+# as needed. The jobs are enqueued by the scrape workers (homework_1/worker.py) once a symbol is updated,
+# or here for every symbol:
+#   python worker.py enqueue
+#   python worker.py work
+timeframes = os.getenv("TIMEFRAMES", "1,7,30").split(",")  # Same timeframes as indicators.py
+
+
+def indicators(symbol, payload):
+    """
+    Function to run an indicators job
+    :param symbol: symbol
+    :param payload: job arguments, optionally {"timeframes": [...]}
+    """
+    compute_symbol(symbol, payload.get("timeframes", timeframes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indicators worker of the job queue")
+    parser.add_argument("command", choices=["enqueue", "work", "status", "retry-dead"])
+    parser.add_argument("--once", action="store_true", help="work: stop when the queue is empty")
+    args = parser.parse_args()
+
+    engine = job_queue.get_engine()
+    if args.command == "enqueue":
+        added = [symbol for symbol in get_symbols() if job_queue.enqueue(engine, "indicators", symbol) is not None]
+        print(f"Enqueued {len(added)} indicators jobs")
+    elif args.command == "work":
+        count = job_queue.run_worker(engine, {"indicators": indicators}, stop_when_empty=args.once)
+        print(f"Ran {count} jobs")
+    elif args.command == "retry-dead":
+        print(f"Put back {job_queue.retry_dead(engine, 'indicators')} dead indicators jobs")
+    print(job_queue.get_counts(engine))
@@ -0,0 +1,81 @@
+import functools
+import hashlib
+import json
+import os
+
+from flask import Response, make_response, request
+
+# Conditional GET for the read endpoints, shared by the indicators, prediction and news services.
+# A response's strong ETag is a hash of the URL and of the versions of the data it is built from (manifest version,
+# file mtime, database row...), so a client sending the ETag back in If-None-Match gets a 304 without a body.
+# Cache-Control lets the browser and a proxy in front of the service reuse a response for CACHE_MAX_AGE seconds.
+
+# ---------------------------
+# Configuration
+# ---------------------------
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", 60))  # Seconds a response can be reused without asking again
+
+
+def get_etag(*versions):
+    """
+    Function to build the ETag of the current request's response
+    :param versions: versions of everything the response is built from, JSON-serializable
+    :return: etag (without quotes)
+    """
+    key = [request.path, sorted(request.args.items(multi=True)), versions]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def is_fresh(etag):
+    """
+    Function to check if the client already has this response
+    :param etag: etag of the response
+    :return: bool
+    """
+    return request.if_none_match.contains(etag)
+
+
+def add_cache_headers(response, etag, max_age=CACHE_MAX_AGE):
+    """
+    Function to add the ETag and Cache-Control headers to a successful response
+    :param response: Flask response, or a (body, status) tuple
+    :param etag: etag of the response
+    :param max_age: seconds the response can be reused
+    :return: response
+    """
+    response = make_response(response)
+    if response.status_code in (200, 304):  # Errors are not cached
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
+
+
+def not_modified(etag):
+    """
+    Function to answer a request for a response the client already has
+    :param etag: etag of the response
+    :return: 304 response
+    """
+    return add_cache_headers(Response(status=304), etag)
+
+
+def conditional(get_versions):
+    """
+    Function to make a GET route conditional: the versions are looked up before the route runs,
+    and a client that has the response gets a 304 without the route reading or computing anything
+    :param get_versions: function of the route's arguments returning the versions of its data, or None
+                         when they are unknown (the response is then sent without caching headers)
+    :return: decorator
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(*args, **kwargs)
+            if versions is None:
+                return view(*args, **kwargs)
+            etag = get_etag(versions)
+            if is_fresh(etag):
+                return not_modified(etag)
+            return add_cache_headers(view(*args, **kwargs), etag)
+        return wrapper
+    return decorator
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+
+# Change feed of the published data, shared by the indicators and prediction services.
+# The pipeline (pipeline/run.py) writes manifest.json next to the service's indicators/ and models/ folders:
+#   {"version": 12, "updated_at": "...", "symbols": {"KMB": {"data": "<hash>", "model": "<hash>", "indicators": [...]}}}
+# A watcher thread checks the manifest's mtime and calls the listeners with the symbols whose versions changed,
+# so a service drops exactly the cache entries of those symbols instead of checking or rescanning files.
+
+# ---------------------------
+# Configuration
+# ---------------------------
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "manifest.json")
+WATCH_INTERVAL = float(os.getenv("MANIFEST_WATCH_INTERVAL", 0.5))  # Seconds between two checks of the manifest
+
+lock = threading.Lock()
+manifest = {"version": None, "symbols": {}}  # Last manifest read
+manifest_stat = None  # (mtime_ns, size) of the manifest read
+listeners = []  # Functions (symbol, old entry or None, new entry or None)
+watcher = None
+
+
+def is_active():
+    """
+    Function to check if the services can rely on the manifest (it has been read)
+    :return: bool
+    """
+    return manifest["version"] is not None
+
+
+def get_version(symbol, kind="data"):
+    """
+    Function to get the published version of a symbol's data or model
+    :param symbol: company key
+    :param kind: data or model
+    :return: version string, or None if the manifest does not know it
+    """
+    return manifest["symbols"].get(symbol, {}).get(kind)
+
+
+def get_indicator_files(symbol):
+    """
+    Function to get the published indicator files of a symbol, relative to the service folder
+    :param symbol: company key
+    :return: list of paths, or None if the manifest does not know the symbol
+    """
+    return manifest["symbols"].get(symbol, {}).get("indicators")
+
+
+def add_listener(listener):
+    """
+    Function to be told about changed symbols
+    :param listener: function (symbol, old entry or None, new entry or None)
+    """
+    listeners.append(listener)
+
+
+def check():
+    """
+    Function to read the manifest again if it changed and call the listeners with every changed symbol
+    :return: list of changed symbols
+    """
+    global manifest, manifest_stat
+    with lock:
+        try:
+            stat = os.stat(MANIFEST_PATH)
+        except FileNotFoundError:
+            return []
+        if (stat.st_mtime_ns, stat.st_size) == manifest_stat:
+            return []
+        try:
+            with open(MANIFEST_PATH) as f:
+                new_manifest = json.load(f)
+        except ValueError as e:
+            print(f"Could not read {MANIFEST_PATH}: {e}")  # Read again at the next check
+            return []
+
+        old_symbols, new_symbols = manifest["symbols"], new_manifest.get("symbols", {})
+        changed = [symbol for symbol in set(old_symbols) | set(new_symbols)
+                   if old_symbols.get(symbol) != new_symbols.get(symbol)]
+        manifest = {"version": new_manifest.get("version"), "symbols": new_symbols}
+        manifest_stat = (stat.st_mtime_ns, stat.st_size)
+
+    for symbol in changed:
+        for listener in listeners:
+            listener(symbol, old_symbols.get(symbol), new_symbols.get(symbol))
+    if changed:
+        print(f"Manifest version {manifest['version']}: {len(changed)} symbols changed")
+    return changed
+
+
+def watch():
+    while True:
+        try:
+            check()
+        except Exception as e:
+            print(f"Error checking {MANIFEST_PATH}: {e}")
+        time.sleep(WATCH_INTERVAL)
+
+
+def start_watcher():
+    """
+    Function to read the manifest and start the watcher thread (once per process)
+    """
+    global watcher
+    check()
+    if watcher is None or not watcher.is_alive():
+        watcher = threading.Thread(target=watch, name="manifest-watcher", daemon=True)
+        watcher.start()
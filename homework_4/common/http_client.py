@@ -0,0 +1,200 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# HTTP client of the mse.mk scrapers (homework_1) and of the news scraper, which import it from this folder
+# (copied to /common in the news scraper image).
+
+# ---------------------------
+# Configuration
+# ---------------------------
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))  # Keep-alive connections kept per host
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))  # Seconds to wait for a response
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))  # Retries after the first attempt
+BACKOFF_BASE = 0.5  # Seconds, doubled on every retry
+BACKOFF_CAP = 10.0  # Longest single backoff in seconds
+FAILURE_THRESHOLD = int(os.getenv("HTTP_FAILURE_THRESHOLD", 5))  # Consecutive failures that open a host's circuit
+RESET_TIMEOUT = float(os.getenv("HTTP_RESET_TIMEOUT", 30))  # Seconds an open circuit waits before a trial request
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-process state: requests' connection pools must not be shared with forked processes
+session = None
+lock = threading.Lock()
+circuits = {}  # host -> {"failures", "opened_at"}
+metrics = {}  # host -> {"requests", "failures", "retries", "rejected", "seconds", "max_seconds"}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without contacting the host while its circuit is open
+    """
+
+
+def reset_after_fork():
+    """
+    Function to give a forked process (e.g. a ProcessPoolExecutor worker) its own session, lock and state
+    """
+    global session, lock
+    session = None
+    lock = threading.Lock()
+    circuits.clear()
+    metrics.clear()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def get_session():
+    """
+    Function to get the session of this process, with keep-alive connection pools per host
+    :return: requests.Session
+    """
+    global session
+    with lock:
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+
+def get_backoff(attempt, response=None):
+    """
+    Function to get the time to wait before a retry: full-jitter exponential backoff, at least Retry-After
+    :param attempt: number of the retry (0 for the first one)
+    :param response: the failed response, if any
+    :return: seconds
+    """
+    backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        backoff = max(backoff, min(float(retry_after), BACKOFF_CAP))
+    return backoff
+
+
+def allow_request(host):
+    """
+    Function to check a host's circuit. After RESET_TIMEOUT an open circuit lets one trial request through.
+    :param host: the host
+    :return: True if the request may be sent
+    """
+    with lock:
+        circuit = circuits.setdefault(host, {"failures": 0, "opened_at": None})
+        if circuit["opened_at"] is None:
+            return True
+        if time.monotonic() - circuit["opened_at"] >= RESET_TIMEOUT:
+            circuit["opened_at"] = time.monotonic()  # Half-open: further requests wait for the trial's outcome
+            return True
+        return False
+
+
+def get_host_metrics(host):
+    """
+    Function to get the metrics of a host, must be called with the lock held
+    :param host: the host
+    :return: dict
+    """
+    return metrics.setdefault(host, {"requests": 0, "failures": 0, "retries": 0, "rejected": 0,
+                                     "seconds": 0.0, "max_seconds": 0.0})
+
+
+def record_result(host, success, seconds, retry=False):
+    """
+    Function to update a host's circuit and metrics after an attempt
+    :param host: the host
+    :param success: whether the attempt succeeded
+    :param seconds: duration of the attempt
+    :param retry: whether the attempt was a retry
+    """
+    with lock:
+        circuit = circuits.setdefault(host, {"failures": 0, "opened_at": None})
+        if success:
+            circuit["failures"] = 0
+            circuit["opened_at"] = None
+        else:
+            circuit["failures"] += 1
+            if circuit["failures"] >= FAILURE_THRESHOLD:
+                if circuit["opened_at"] is None:
+                    print(f"Circuit opened for {host} after {circuit['failures']} consecutive failures")
+                circuit["opened_at"] = time.monotonic()
+
+        host_metrics = get_host_metrics(host)
+        host_metrics["requests"] += 1
+        host_metrics["failures"] += 0 if success else 1
+        host_metrics["retries"] += 1 if retry else 0
+        host_metrics["seconds"] += seconds
+        host_metrics["max_seconds"] = max(host_metrics["max_seconds"], seconds)
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """
+    Function to send a request through the shared session, retrying connection errors, timeouts
+    and 429/5xx responses with backoff. The last response is returned even if its status is an error.
+    :param method: GET, POST...
+    :param url: the url
+    :param timeout: seconds to wait for a response, or (connect, read) seconds
+    :param retries: retries after the first attempt
+    :param kwargs: passed to requests (json, data, stream...)
+    :return: requests.Response
+    """
+    host = urlsplit(url).netloc
+    http = get_session()
+    for attempt in range(retries + 1):
+        if not allow_request(host):
+            with lock:
+                get_host_metrics(host)["rejected"] += 1
+            raise CircuitOpenError(f"Circuit open for {host}, not sending {method} {url}")
+
+        start_time = time.monotonic()
+        try:
+            response = http.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            record_result(host, False, time.monotonic() - start_time, attempt > 0)
+            if attempt == retries:
+                raise
+            time.sleep(get_backoff(attempt))
+            continue
+
+        failed = response.status_code in RETRY_STATUSES
+        record_result(host, not failed, time.monotonic() - start_time, attempt > 0)
+        if not failed or attempt == retries:
+            return response
+        response.close()
+        time.sleep(get_backoff(attempt, response))
+
+
+def get(url, **kwargs):
+    """
+    Function to send a GET request (see request)
+    """
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    Function to send a POST request (see request)
+    """
+    return request("POST", url, **kwargs)
+
+
+def get_metrics():
+    """
+    Function to get the request timing metrics of this process
+    :return: dict host -> metrics, with the average duration and circuit state
+    """
+    with lock:
+        result = {}
+        for host, host_metrics in metrics.items():
+            circuit = circuits.get(host, {})
+            result[host] = dict(host_metrics,
+                                average_seconds=host_metrics["seconds"] / host_metrics["requests"]
+                                if host_metrics["requests"] else 0.0,
+                                circuit="open" if circuit.get("opened_at") is not None else "closed")
+        return result
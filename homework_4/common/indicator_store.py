@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_versions
+
+# Consolidated indicator store, shared by the indicators and prediction services.
+# The {symbol}_oscillators_ma_{timeframe}.csv files of one timeframe are packed into indicators/store_{timeframe}.bin:
+#   magic (8 bytes) | header length (uint64) | JSON header | columns, each aligned to 64 bytes
+# The header has the offset table, symbol -> [first row, row count, data version], and the offset of every column:
+# dates as int32 days since 1970-01-01, numeric columns as float64 (the values of the CSV files, read back exactly),
+# signals as int8 codes (-1 when missing).
+# The services memory-map the file read-only, so every worker process shares the same pages of the OS page cache,
+# and a symbol's rows are views into the mapping found with one dictionary lookup.
+#   python indicator_store.py build         # Pack indicators/*.csv, run in the service folder
+MAGIC = b"MSEIND01"
+ALIGNMENT = 64
+CHECK_INTERVAL = 1.0  # Seconds between two checks of a store file for a new version
+FILE_PATTERN = "_oscillators_ma_"
+
+stores = {}  # path -> (file identity, time of the last check, store) of the stores opened by this process
+stores_lock = threading.Lock()
+
+
+def get_store_path(folder, timeframe):
+    return os.path.join(folder, f"store_{timeframe}.bin")
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+
+def build(folder, timeframe, versions=None, path=None):
+    """
+    Function to pack the indicator files of one timeframe into a store. It is written next to its destination
+    and renamed over it, so a reader sees the old or the new store, never a partial one.
+    :param folder: folder with the CSV files
+    :param timeframe: timeframe in days (1, 7, 30)
+    :param versions: dict symbol -> data version recorded in the offset table (e.g. from the manifest)
+    :param path: store path (default: store_{timeframe}.bin in the folder)
+    :return: number of symbols packed
+    """
+    versions = versions or {}
+    suffix = f"{FILE_PATTERN}{timeframe}.csv"
+    frames = {}
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith(suffix):
+            frames[filename[:-len(suffix)]] = pd.read_csv(os.path.join(folder, filename))
+
+    # A column is stored when it is numeric (or empty) in every file that has it, other text columns are left out
+    signal_columns, float_columns = [], []
+    for df in frames.values():
+        for column in df.columns:
+            if column == "Date" or column in signal_columns or column in float_columns:
+                continue
+            (signal_columns if column.endswith("_Signal") else float_columns).append(column)
+    float_columns = [column for column in float_columns
+                     if all(pd.api.types.is_numeric_dtype(df[column]) or df[column].isna().all()
+                            for df in frames.values() if column in df)]
+    signal_codes = sorted({value for df in frames.values() for column in signal_columns if column in df
+                           for value in df[column].dropna().unique()})
+
+    symbols, start = {}, 0
+    for symbol, df in frames.items():
+        symbols[symbol] = [start, len(df), versions.get(symbol)]
+        start += len(df)
+    rows = start
+
+    columns = {"Date": ("int32", np.concatenate(
+        [pd.to_datetime(df["Date"]).values.astype("datetime64[D]").astype(np.int32) for df in frames.values()]
+        or [np.empty(0, np.int32)]))}
+    for column in float_columns:
+        columns[column] = ("float64", np.concatenate(
+            [pd.to_numeric(df[column]).to_numpy(np.float64) if column in df else np.full(len(df), np.nan)
+             for df in frames.values()]))
+    code_of = {value: code for code, value in enumerate(signal_codes)}
+    for column in signal_columns:
+        columns[column] = ("int8", np.concatenate(
+            [df[column].map(code_of).fillna(-1).to_numpy(np.int8) if column in df else np.full(len(df), -1, np.int8)
+             for df in frames.values()]))
+
+    # Column offsets are relative to the end of the header, whose length depends on them
+    layout, offset = {}, 0
+    for column, (dtype, values) in columns.items():
+        layout[column] = {"dtype": dtype, "offset": offset}
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"timeframe": str(timeframe), "rows": rows, "columns": layout, "signal_codes": signal_codes,
+                         "symbols": symbols}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+    path = path or get_store_path(folder, timeframe)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for column, (dtype, values) in columns.items():
+            data = values.tobytes()
+            f.write(data + b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(temporary_path, path)
+    return len(symbols)
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+def load(path):
+    """
+    Function to memory-map a store
+    :param path: store path
+    :return: dict with the header, the mapping, and the columns as arrays viewing the mapping
+    """
+    mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mapping[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not an indicator store")
+    header_length = struct.unpack("<Q", bytes(mapping[len(MAGIC):len(MAGIC) + 8]))[0]
+    data_offset = len(MAGIC) + 8 + header_length
+    header = json.loads(bytes(mapping[len(MAGIC) + 8:data_offset]))
+    columns = {column: np.frombuffer(mapping, dtype=layout["dtype"], count=header["rows"],
+                                     offset=data_offset + layout["offset"])
+               for column, layout in header["columns"].items()}
+    return {"header": header, "mapping": mapping, "columns": columns,
+            "signal_codes": np.array(header["signal_codes"] + [None], dtype=object)}  # Code -1 is the last item
+
+
+def open_store(path):
+    """
+    Function to get the mapped store of a path, mapping it again when a new store replaced the file
+    :param path: store path
+    :return: store, or None if there is no store
+    """
+    now = time.monotonic()
+    opened = stores.get(path)
+    if opened is not None and now - opened[1] < CHECK_INTERVAL:
+        return opened[2]
+    with stores_lock:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stores.pop(path, None)
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        opened = stores.get(path)
+        if opened is not None and opened[0] == identity:
+            store = opened[2]
+        else:
+            store = load(path)
+            store["identity"] = list(identity)
+        stores[path] = (identity, now, store)  # Arrays of a replaced store stay valid while requests use them
+        return store
+
+
+def get_entry(store, symbol, version=None):
+    """
+    Function to find a symbol in the offset table
+    :param store: mapped store
+    :param symbol: company key
+    :param version: data version the rows must have, None for a store built without versions
+    :return: (first row, row count), or None if the store does not have this version of the symbol
+    """
+    entry = store["header"]["symbols"].get(symbol)
+    if entry is None or entry[2] != version:
+        return None
+    return entry[0], entry[1]
+
+
+def read_rows(store, symbol, columns, start=0, stop=None, version=None):
+    """
+    Function to read rows of a symbol, in file order, as a DataFrame like the one read from the CSV file
+    :param store: mapped store
+    :param symbol: company key
+    :param columns: columns to read, Date included
+    :param start: first row of the symbol's rows
+    :param stop: row after the last one (default: the symbol's last row)
+    :param version: data version the rows must have
+    :return: DataFrame, or None if the store does not have this version of the symbol or one of the columns
+    """
+    entry = get_entry(store, symbol, version)
+    if entry is None or any(column not in store["columns"] for column in columns):
+        return None
+    first, count = entry
+    stop = count if stop is None else min(stop, count)
+    rows = slice(first + start, first + max(start, stop))
+    data = {}
+    for column in columns:
+        values = store["columns"][column][rows]
+        if column == "Date":
+            data[column] = values.astype("datetime64[D]").astype(str)
+        elif values.dtype == np.int8:
+            data[column] = store["signal_codes"][values]
+        else:
+            data[column] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the indicator CSV files into memory-mapped stores")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--folder", default="indicators", help="folder with the CSV files")
+    parser.add_argument("--timeframes", default="1,7,30")
+    args = parser.parse_args()
+
+    # Record the published versions, so the services use the store for the symbols of the manifest too
+    versions = {}
+    if os.path.exists(data_versions.MANIFEST_PATH):
+        with open(data_versions.MANIFEST_PATH) as f:
+            versions = {symbol: entry.get("data") for symbol, entry in json.load(f).get("symbols", {}).items()}
+    for timeframe in args.timeframes.split(","):
+        start_time = time.time()
+        count = build(args.folder, timeframe, versions)
+        print(f"Packed {count} symbols into {get_store_path(args.folder, timeframe)} "
+              f"in {time.time() - start_time:.1f} seconds")
@@ -0,0 +1,275 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Response, g, jsonify, request
+
+# Shared by the services of homework_4, which import it from this folder (copied to /common in every image).
+#   instrument(app, "prediction")  # Per-route latency histograms, in-flight gauge and GET /metrics
+#   with timer("file_read"): ...   # Time an internal stage, also usable as @timer("inference")
+# Metrics are kept per process: with several gunicorn workers each worker reports its own requests.
+
+# ---------------------------
+# Configuration
+# ---------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Histogram bounds in seconds
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"  # Adds the /debug/profile routes
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.01))  # Seconds between two samples
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 60))  # A profile stops by itself after this long
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Time to answer a request"),
+    "http_requests_in_flight": ("gauge", "Requests being answered"),
+    "stage_duration_seconds": ("histogram", "Time spent in an internal stage"),
+    "stage_errors_total": ("counter", "Internal stages that raised an exception"),
+    "process_start_time_seconds": ("gauge", "Start time of the process since the epoch"),
+}
+
+# Per-process state
+lock = threading.Lock()
+service_name = "unknown"
+histograms = {}  # (name, labels) -> {"buckets": counts per bound, "sum", "count"}
+values = {}  # (name, labels) -> value of a gauge or counter
+collectors = []  # Functions returning extra (name, type, help, [(labels, value)]) families
+profiler = {"thread": None, "stop": None, "samples": Counter(), "started_at": None, "interval": PROFILER_INTERVAL}
+start_time = time.time()
+
+
+def reset_after_fork():
+    """
+    Function to give a forked worker its own lock, the profiler thread does not survive the fork
+    """
+    global lock
+    lock = threading.Lock()
+    profiler.update(thread=None, stop=None)
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def get_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """
+    Function to add an observation to a histogram
+    :param name: metric name
+    :param seconds: observed value
+    :param labels: label values
+    """
+    with lock:
+        histogram = histograms.setdefault(get_key(name, labels),
+                                          {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][index] += 1
+                break
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def add(name, value=1, **labels):
+    """
+    Function to add to a counter or gauge (a negative value lowers a gauge)
+    :param name: metric name
+    :param value: amount to add
+    :param labels: label values
+    """
+    with lock:
+        key = get_key(name, labels)
+        values[key] = values.get(key, 0) + value
+
+
+@contextmanager
+def timer(stage):
+    """
+    Function to time an internal stage of the service, as a with block or a decorator
+    :param stage: stage name, e.g. file_read, model_load, scaler_fit, inference, serialization
+    """
+    stage_start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        add("stage_errors_total", service=service_name, stage=stage)
+        raise
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - stage_start, service=service_name, stage=stage)
+
+
+def register_collector(collector):
+    """
+    Function to add metrics computed when /metrics is read, e.g. the http_client host metrics
+    :param collector: function returning a list of (name, type, help, [(labels dict, value)])
+    """
+    collectors.append(collector)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def render_metrics():
+    """
+    Function to render every metric of this process in the Prometheus text format
+    :return: str
+    """
+    with lock:
+        histogram_items = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in histograms.items())
+        value_items = sorted(values.items())
+    value_items.append((("process_start_time_seconds", (("service", service_name),)), start_time))
+
+    lines = []
+    described = set()
+
+    def describe(name, kind, text):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), histogram in histogram_items:
+        describe(name, *HELP.get(name, ("histogram", name)))
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+    for (name, labels), value in value_items:
+        describe(name, *HELP.get(name, ("gauge", name)))
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for collector in collectors:
+        for name, kind, text, samples in collector():
+            describe(name, kind, text)
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Sampling profiler
+# ---------------------------
+
+def sample_stacks(stop, interval, thread_id):
+    """
+    Function run by the profiler thread: records the stack of every other thread at each interval
+    """
+    deadline = time.monotonic() + PROFILER_MAX_SECONDS
+    while not stop.wait(interval) and time.monotonic() < deadline:
+        stacks = []
+        for frame_thread_id, frame in sys._current_frames().items():
+            if frame_thread_id == thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stacks.append(";".join(reversed(stack)))
+        with lock:
+            profiler["samples"].update(stacks)
+
+
+def start_profiler(interval=PROFILER_INTERVAL):
+    """
+    Function to start sampling the stacks of the process, previous samples are dropped
+    :param interval: seconds between two samples
+    :return: False if the profiler is already running
+    """
+    with lock:
+        if profiler["thread"] is not None and profiler["thread"].is_alive():
+            return False
+        stop = threading.Event()
+        thread = threading.Thread(target=lambda: sample_stacks(stop, interval, threading.get_ident()),
+                                  name="profiler", daemon=True)
+        profiler.update(thread=thread, stop=stop, samples=Counter(), started_at=time.time(), interval=interval)
+    thread.start()
+    return True
+
+
+def stop_profiler():
+    """
+    Function to stop the profiler, its samples are kept until the next start
+    """
+    with lock:
+        thread, stop = profiler["thread"], profiler["stop"]
+    if thread is not None:
+        stop.set()
+        thread.join()
+
+
+def render_profile():
+    """
+    Function to render the samples as collapsed stacks ("frame;frame;frame count"),
+    the input format of flamegraph.pl and speedscope
+    :return: str
+    """
+    with lock:
+        samples = profiler["samples"].most_common()
+    return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+
+# ---------------------------
+# Flask integration
+# ---------------------------
+
+def instrument(app, service):
+    """
+    Function to time every request of a Flask app and add the /metrics route
+    (and the /debug/profile routes when PROFILER_ENABLED=1)
+    :param app: Flask app
+    :param service: service name used as the service label
+    """
+    global service_name
+    service_name = service
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        add("http_requests_in_flight", service=service_name)
+
+    @app.after_request
+    def record_request(response):
+        if "request_start" in g:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            observe("http_request_duration_seconds", time.perf_counter() - g.request_start,
+                    service=service_name, route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request(exception=None):
+        if g.pop("request_start", None) is not None:
+            add("http_requests_in_flight", -1, service=service_name)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    if not PROFILER_ENABLED:
+        return
+
+    @app.route("/debug/profile/start", methods=["POST"])
+    def profile_start():
+        interval = request.args.get("interval", default=PROFILER_INTERVAL, type=float)
+        if interval <= 0:
+            return jsonify({"error": "Interval must be positive."}), 400
+        if not start_profiler(interval):
+            return jsonify({"error": "The profiler is already running."}), 409
+        return jsonify({"status": "started", "interval": interval, "max_seconds": PROFILER_MAX_SECONDS})
+
+    @app.route("/debug/profile/stop", methods=["POST"])
+    def profile_stop():
+        stop_profiler()
+        return jsonify({"status": "stopped", "samples": sum(profiler["samples"].values())})
+
+    @app.route("/debug/profile", methods=["GET"])
+    def profile():
+        return Response(render_profile(), mimetype="text/plain")
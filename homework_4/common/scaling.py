@@ -0,0 +1,17 @@
+import numpy as np
+
+# Inverse scaling of the LSTM training (homework_3/lstm) and of the prediction service, which import it from this folder
+# (copied to /common in the prediction image).
+
+
+def inverse_transform_column(scaler, values, column):
+    """
+    Function to undo a fitted MinMaxScaler for a single column, on a whole array at once.
+    Same result as putting the values in that column of a dummy array and calling scaler.inverse_transform
+    (for the default (0, 1) range: data_min_ + values * data_range_).
+    :param scaler: fitted MinMaxScaler
+    :param values: scaled values of the column, any shape
+    :param column: index of the column in the scaled data
+    :return: array of unscaled values with the same shape as values
+    """
+    return (np.asarray(values, dtype=np.float64) - scaler.min_[column]) / scaler.scale_[column]
@@ -1,9 +1,20 @@
 import os
+import sys
+import threading
+import numpy as np
 import pandas as pd
 from flask import Flask, jsonify, request
 
+# Modules shared by the services of homework_4: homework_4/common here, /common in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import data_versions
+import indicator_store
+from conditional import conditional
+from instrumentation import instrument, timer
+
 # Initialize Flask application
 app = Flask(__name__)
+instrument(app, "indicators")  # Request latencies, stage timers and /metrics
 
 # Define column mappings for each indicator
 INDICATOR_COLUMNS = {
@@ -17,6 +28,198 @@ INDICATOR_COLUMNS = {
     "wma": ["Date", "Close", "Max", "Min", "Volume", "WMA", "WMA_Signal"],
 }
 
+# Indicator files read, kept until the manifest publishes a new version of the issuer's data (see data_versions.py)
+frame_cache = {}  # file path -> (data version or file mtime, DataFrame)
+cache_lock = threading.Lock()
+
+
+def invalidate(issuer, old_entry, new_entry):
+    """
+    Function to drop the cached files of an issuer whose published data changed
+    :param issuer: company key
+    :param old_entry: previous manifest entry or None
+    :param new_entry: new manifest entry or None
+    """
+    if (old_entry or {}).get("data") == (new_entry or {}).get("data"):
+        return
+    with cache_lock:
+        for file_path in [path for path in frame_cache if os.path.basename(path).startswith(issuer + "_")]:
+            del frame_cache[file_path]
+
+
+data_versions.add_listener(invalidate)
+data_versions.start_watcher()
+
+
+def get_issuer_files(folder_path, issuer):
+    """
+    Function to get the names of an issuer's files, from the manifest without listing the folder when it knows them
+    :param folder_path: folder with the data files
+    :param issuer: company key
+    :return: list of file names
+    """
+    files = data_versions.get_indicator_files(issuer)
+    if files is not None:
+        return [os.path.basename(path) for path in files]
+    return [filename for filename in os.listdir(folder_path) if filename.startswith(issuer + "_")]
+
+
+def read_indicator_file(issuer, file_path):
+    """
+    Function to read an indicator file once and reuse it until its data changes
+    :param issuer: company key
+    :param file_path: path to the CSV file
+    :return: DataFrame (shared by the requests, not to be modified)
+    """
+    version = data_versions.get_version(issuer, "data")
+    if version is None:
+        version = os.path.getmtime(file_path)  # Files copied by hand are not in the manifest
+    cached = frame_cache.get(file_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with timer("file_read"):
+        df = pd.read_csv(file_path)
+    with cache_lock:
+        frame_cache[file_path] = (version, df)
+    return df
+
+
+def read_newest_rows(issuer, file_path, frequency, columns, skip=0, count=None):
+    """
+    Function to read an issuer's rows of one frequency, newest first. They come from the memory-mapped store
+    (indicator_store.py) when it has the published version of the issuer's data, only the requested rows
+    are read then; from the CSV file otherwise.
+    :param issuer: company key
+    :param file_path: path to the CSV file
+    :param frequency: frequency of the file
+    :param columns: columns needed
+    :param skip: newest rows to skip
+    :param count: rows to return, None for all
+    :return: (DataFrame of the rows, number of rows in the file)
+    """
+    store = indicator_store.open_store(indicator_store.get_store_path(os.path.dirname(file_path), frequency))
+    version = data_versions.get_version(issuer, "data")
+    entry = indicator_store.get_entry(store, issuer, version) if store is not None else None
+    if entry is not None:
+        total = entry[1]
+        stop = max(0, total - skip)
+        start = 0 if count is None else max(0, stop - count)
+        with timer("store_read"):
+            df = indicator_store.read_rows(store, issuer, columns, start, stop, version)
+        if df is not None:
+            return df[::-1], total  # Numeric columns are stored as float64, the values parsed from the CSV file
+
+    df = read_indicator_file(issuer, file_path)[::-1]
+    return df.iloc[skip:None if count is None else skip + count], len(df)
+
+
+def get_data_versions(issuer, indicator):
+    """
+    Function to get the versions of an issuer's data for conditional requests, without reading the files:
+    per file, the manifest's version or the file's mtime, and whether the store serves it
+    :param issuer: company key
+    :param indicator: indicator type (unused, part of the URL)
+    :return: list of versions, or None if the issuer has no files
+    """
+    folder_path = os.path.join(os.getcwd(), "indicators")
+    version = data_versions.get_version(issuer, "data")
+    versions = []
+    for filename in sorted(get_issuer_files(folder_path, issuer)):
+        if "_oscillators_ma_" not in filename or not filename.endswith(".csv"):
+            continue
+        file_path = os.path.join(folder_path, filename)
+        store = indicator_store.open_store(
+            indicator_store.get_store_path(folder_path, filename.split("_")[-1].replace(".csv", "")))
+        in_store = store is not None and indicator_store.get_entry(store, issuer, version) is not None
+        if version is not None:
+            versions.append([filename, version, in_store])
+        elif in_store:
+            versions.append([filename, store["identity"]])  # Store built by hand
+        elif os.path.exists(file_path):
+            versions.append([filename, os.path.getmtime(file_path)])
+    return versions or None
+
+
+# ---------------------------
+# Similar stocks
+# ---------------------------
+
+# Indexes of the most correlated symbols, similar_{window}.npz built by homework_3/rsi/correlations.py
+# and published next to the indicator files: for the last windows of daily returns, every symbol's correlations
+# and the other symbols sorted by decreasing correlation
+SIMILAR_WINDOW = 252  # Default window (one year of market days)
+MAX_SIMILAR = 50  # Largest k of a request
+similarity_indexes = {}  # path -> (file identity, index)
+
+
+def open_similarity_index(window):
+    """
+    Function to load the similar stocks index of a window, loading it again when a new index replaced the file
+    :param window: market days of the window
+    :return: dict of arrays with "positions" (symbol -> row) and "identity" (of the file), or None if there is no index
+    """
+    path = os.path.join(os.getcwd(), "indicators", f"similar_{window}.npz")
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+    opened = similarity_indexes.get(path)
+    if opened is not None and opened[0] == identity:
+        return opened[1]
+    with timer("file_read"):
+        with np.load(path) as data:
+            index = {key: data[key] for key in data.files}
+    index["positions"] = {symbol: position for position, symbol in enumerate(index["Symbol"].tolist())}
+    index["identity"] = identity
+    with cache_lock:
+        similarity_indexes[path] = (identity, index)
+    return index
+
+
+def get_similar_versions(issuer):
+    """
+    Function to get the version of the similar stocks index for conditional requests
+    :param issuer: company key (unused, part of the URL)
+    :return: list with the index file's identity, or None if there is no index
+    """
+    index = open_similarity_index(request.args.get("window", default=SIMILAR_WINDOW, type=int))
+    return None if index is None else [index["identity"]]
+
+
+def get_similar(issuer, window=SIMILAR_WINDOW, k=10, as_of=None):
+    """
+    Function to get the symbols whose daily returns are the most correlated with an issuer's
+    :param issuer: company key
+    :param window: market days of the window
+    :param k: number of symbols
+    :param as_of: date (YYYY-MM-DD) the window ends on or before (default: the last window)
+    :return: dict with the window's last date and the symbols, by decreasing correlation
+    """
+    index = open_similarity_index(window)
+    if index is None:
+        raise FileNotFoundError(f"No similar stocks index for a {window}-day window")
+    position = index["positions"].get(issuer)
+    if position is None:
+        raise FileNotFoundError(f"Issuer '{issuer}' is not in the similar stocks index")
+
+    snapshot = len(index["Date"]) - 1
+    if as_of:
+        snapshot = int(np.searchsorted(index["Date"], np.datetime64(as_of, "D"), side="right")) - 1
+        if snapshot < 0:
+            raise FileNotFoundError(f"No {window}-day window ends on or before {as_of}")
+
+    correlations = index["Correlation"][snapshot, position]
+    overlap = index["Overlap"][snapshot, position]
+    similar = []
+    for neighbor in index["Neighbors"][snapshot, position][:k]:
+        if np.isnan(correlations[neighbor]):
+            break  # Pairs without enough common days are sorted last
+        similar.append({"symbol": str(index["Symbol"][neighbor]),
+                        "correlation": round(float(correlations[neighbor]), 4), "overlap": int(overlap[neighbor])})
+    return {"issuer": issuer, "window": window, "as_of": str(index["Date"][snapshot]), "similar": similar}
+
+
 # Helper function to read and filter data for a specific issuer, indicator, and frequency
 def get_filtered_data(issuer, indicator, frequency=None, limit=None, offset=None):
     """
@@ -35,8 +238,14 @@ def get_filtered_data(issuer, indicator, frequency=None, limit=None, offset=None
     if not indicator_columns:
         raise ValueError(f"Invalid indicator '{indicator}'")
 
+    # Pages are read file by file, so only their rows are read from the store
+    paginate = limit is not None and offset is not None and limit >= 0 and offset >= 0
+    skip, remaining = (offset, limit) if paginate else (0, None)
+
     result = []
-    for filename in os.listdir(folder_path):  # Loop through files in the folder
+    for filename in get_issuer_files(folder_path, issuer):  # Loop through the issuer's files
+        if remaining == 0:
+            break
         # Only read files with "_oscillators_ma_" in the name
         if "_oscillators_ma_" not in filename:
             continue
@@ -49,10 +258,11 @@ def get_filtered_data(issuer, indicator, frequency=None, limit=None, offset=None
 
             file_path = os.path.join(folder_path, filename)  # Get the full path of the file
             try:
-                df = pd.read_csv(file_path)  # Read the CSV file into a DataFrame
-
-                #reverse the df
-                df = df[::-1]
+                # Read the rows, newest first
+                df, total = read_newest_rows(issuer, file_path, file_frequency, indicator_columns, skip, remaining)
+                skip = max(0, skip - total)
+                if remaining is not None:
+                    remaining -= len(df)
 
                 # Ensure required columns are present in the file
                 missing_columns = [col for col in indicator_columns if col not in df.columns]
@@ -88,13 +298,14 @@ def get_filtered_data(issuer, indicator, frequency=None, limit=None, offset=None
 
 
                 # Add rows to the result list
-                result.extend(df.to_dict(orient="records"))
+                with timer("to_records"):
+                    result.extend(df.to_dict(orient="records"))
             except Exception as e:
                 # Handle any errors encountered while reading the file
                 raise ValueError(f"Error reading file '{filename}': {e}")
 
     # Apply pagination (limit and offset) to the result set
-    if limit is not None:
+    if limit is not None and not paginate:
         result = result[offset:offset + limit]
 
     return result
@@ -102,6 +313,7 @@ def get_filtered_data(issuer, indicator, frequency=None, limit=None, offset=None
 
 # Define the endpoint with dynamic route parameters to retrieve indicator values
 @app.route("/<string:issuer>/indicators/<string:indicator>", methods=["GET"])
+@conditional(get_data_versions)
 def get_indicator_values(issuer, indicator):
     """
     Route for getting data by indicator and frequency
@@ -126,7 +338,8 @@ def get_indicator_values(issuer, indicator):
         data = get_filtered_data(issuer, indicator, frequency, limit, offset)
         if not data:
             return jsonify({"error": f"No data found for indicator '{indicator}' for issuer '{issuer}' with frequency '{frequency}'"}), 404
-        return jsonify(data)  # Return the filtered data as JSON response
+        with timer("serialization"):
+            return jsonify(data)  # Return the filtered data as JSON response
     except ValueError as e:
         # Handle validation errors
         return jsonify({"error": str(e)}), 400
@@ -135,6 +348,33 @@ def get_indicator_values(issuer, indicator):
         return jsonify({"error": str(e)}), 500
 
 
+# Define the endpoint returning the most correlated symbols of an issuer
+@app.route("/<string:issuer>/similar", methods=["GET"])
+@conditional(get_similar_versions)
+def get_similar_stocks(issuer):
+    """
+    Route for getting the symbols whose daily returns are the most correlated with an issuer's
+    :param issuer: company key
+    :return: json
+    """
+    try:
+        k = request.args.get("k", default=10, type=int)
+        if not 1 <= k <= MAX_SIMILAR:
+            return jsonify({"error": f"k must be between 1 and {MAX_SIMILAR}"}), 400
+        window = request.args.get("window", default=SIMILAR_WINDOW, type=int)
+        with timer("similar"):
+            data = get_similar(issuer, window, k, request.args.get("as_of"))
+        return jsonify(data)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        # Handle validation errors (e.g. an invalid as_of date)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        # Handle general errors
+        return jsonify({"error": str(e)}), 500
+
+
 # Start the Flask application
 if __name__ == "__main__":
     port = os.getenv("PORT", 5000)  # Get port from environment variable or default to 5000
@@ -0,0 +1,89 @@
+import glob
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from main import PAGE_CHUNK_SIZE, extract_date, extract_news_id, parse_news_links
+from stubs import render_issuer_page
+
+# Saved issuer pages can be passed as arguments (e.g. saved from https://www.mse.mk/en/symbol/KMB),
+# otherwise stub pages padded with the kind of markup that follows the news block on mse.mk are used
+repeat = 50  # Number of times every page is parsed
+
+
+def parse_with_beautifulsoup(page):
+    """
+    The previous implementation: parse the whole page and run the selectors twice per link
+    :param page: the page html
+    :return: list of {"news_id", "date"}
+    """
+    soup = BeautifulSoup(page, "html.parser")
+    news_links = soup.select('#seiNetIssuerLatestNews a')
+    return [
+        {
+            "news_id": extract_news_id(link["href"]),
+            "date": extract_date(
+                link.select_one("ul li:nth-child(2) h4").text
+            ) if link.select_one("ul li:nth-child(2) h4") else None,
+        }
+        for link in news_links if "href" in link.attrs
+    ]
+
+
+def parse_streaming(page):
+    """
+    The targeted extractor, fed in the same chunk size used when reading the response
+    :param page: the page html
+    :return: list of {"news_id", "date"}
+    """
+    return parse_news_links(page[i:i + PAGE_CHUNK_SIZE] for i in range(0, len(page), PAGE_CHUNK_SIZE))
+
+
+def load_pages(paths):
+    """
+    Function to load saved issuer pages, or build stub pages when none are given
+    :param paths: list of file paths or glob patterns
+    :return: list of pages
+    """
+    pages = []
+    for pattern in paths:
+        for path in glob.glob(pattern):
+            with open(path, encoding="utf-8") as f:
+                pages.append(f.read())
+    if pages:
+        return pages
+
+    filler = "".join(f"<div class=\"row\"><table><tr><td>{i}</td><td>{i * 1.5:.2f}</td></tr></table></div>"
+                     for i in range(3000))
+    for issuer in ["KMB", "ALK", "ADIN", "TEL", "GRNT"]:
+        page = render_issuer_page(issuer)
+        pages.append(page.replace("</body>", filler + "</body>"))
+    return pages
+
+
+def benchmark(function, pages):
+    """
+    Function to time a parser over all pages
+    :param function: the parser
+    :param pages: list of pages
+    :return: milliseconds per page
+    """
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            function(page)
+    return (time.perf_counter() - start_time) * 1000 / (repeat * len(pages))
+
+
+if __name__ == "__main__":
+    pages = load_pages(sys.argv[1:])
+    for page in pages:
+        if parse_streaming(page) != parse_with_beautifulsoup(page):
+            raise ValueError("The streaming extractor and BeautifulSoup returned different links")
+
+    beautifulsoup_ms = benchmark(parse_with_beautifulsoup, pages)
+    streaming_ms = benchmark(parse_streaming, pages)
+    print(f"Pages: {len(pages)}, average size: {sum(len(page) for page in pages) // len(pages)} characters")
+    print(f"BeautifulSoup: {beautifulsoup_ms:.3f} ms per page")
+    print(f"Streaming extractor: {streaming_ms:.3f} ms per page ({beautifulsoup_ms / streaming_ms:.1f}x faster)")
@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Modules shared by the services of homework_4: homework_4/common here, /common in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import http_client
+import news_store
+from main import MAX_CONCURRENT_REQUESTS, SENTIMENT_MODE, analyze, fetch_news_content, fetch_news_links
+
+# ---------------------------
+# Configuration
+# ---------------------------
+DATABASE_URL = os.getenv("DATABASE_URL")  # When set, issuers are read from the company table
+CODES_PATH = os.getenv("CODES_PATH", "../../shared/storage/codes.txt")  # Otherwise they are read from this file
+SWEEP_INTERVAL = int(os.getenv("SWEEP_INTERVAL", 4 * 60 * 60))  # Seconds between two sweeps
+
+
+def get_issuers():
+    """
+    Function to get the issuers to sweep, from the company table or from codes.txt
+    :return: list of issuer codes
+    """
+    if DATABASE_URL:
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine(DATABASE_URL)
+        with engine.connect() as connection:
+            return [row[0] for row in connection.execute(text("SELECT company_key FROM company"))]
+
+    with open(CODES_PATH, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def ingest_issuer(issuer, mode=SENTIMENT_MODE):
+    """
+    Function to fetch the new documents of an issuer, score them and refresh its aggregate
+    :param issuer: the issuer code
+    :param mode: truncate or chunk
+    :return: number of new documents
+    """
+    news_links = fetch_news_links(issuer)
+    if isinstance(news_links, dict) and "error" in news_links:
+        raise RuntimeError(news_links["error"])
+
+    connection = news_store.connect()
+    try:
+        known_ids = news_store.get_known_news_ids(connection, issuer)
+        new_news = [news for news in news_links if news["news_id"] not in known_ids]
+
+        fetched = []
+        for news in new_news:
+            content = fetch_news_content(news["news_id"])
+            if isinstance(content, dict) and "error" in content:
+                print(f"Error fetching news {news['news_id']} for {issuer}: {content['error']}")
+                continue  # Retried on the next sweep
+            # Documents without content are stored too, so they are not fetched again on every sweep
+            news["content"] = content
+            fetched.append(news)
+
+        scored = [news for news in fetched if news["content"]]
+        if scored:
+            sentiment_results = analyze([news["content"] for news in scored], mode)
+            if "results" not in sentiment_results:
+                raise RuntimeError(f"Sentiment analysis failed: {sentiment_results}")
+            for news, result in zip(scored, sentiment_results["results"]):
+                news["sentiment"] = result["sentiment"]
+                news["score"] = result["score"]
+
+        news_store.save_news(connection, issuer, fetched)
+        news_store.refresh_issuer_sentiment(connection, issuer, {news["news_id"] for news in news_links})
+        return len(fetched)
+    finally:
+        connection.close()
+
+
+def sweep(issuers, max_workers=MAX_CONCURRENT_REQUESTS):
+    """
+    Function to ingest all issuers with bounded concurrency
+    :param issuers: list of issuer codes
+    :param max_workers: maximum number of issuers processed at the same time
+    :return: total number of new documents
+    """
+    start_time = datetime.now()
+    total = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(ingest_issuer, issuer): issuer for issuer in issuers}
+        for future in as_completed(futures):
+            issuer = futures[future]
+            try:
+                count = future.result()
+                total += count
+                print(f"Ingested {count} new documents for {issuer}")
+            except Exception as e:
+                print(f"Error ingesting news for {issuer}: {e}")
+
+    print(f"Sweep of {len(issuers)} issuers completed in {(datetime.now() - start_time).total_seconds()} seconds")
+    print(f"HTTP metrics: {http_client.get_metrics()}")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background news ingestion worker")
+    parser.add_argument("--once", action="store_true", help="run a single sweep and exit")
+    parser.add_argument("issuers", nargs="*", help="issuers to sweep (defaults to all)")
+    args = parser.parse_args()
+
+    news_store.connect().close()  # Create the tables before the first sweep
+    while True:
+        sweep(args.issuers or get_issuers())
+        if args.once:
+            break
+        time.sleep(SWEEP_INTERVAL)
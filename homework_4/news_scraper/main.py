@@ -1,19 +1,131 @@
 import os
+import sys
 
 from flask import Flask, jsonify
 import re
-import requests
 from datetime import datetime
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 import statistics
 
+# Modules shared by the services of homework_4: homework_4/common here, /common in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import http_client
+import news_store
+from conditional import add_cache_headers, get_etag, is_fresh, not_modified
+from instrumentation import instrument, register_collector, timer
+
 # Initialize Flask application
 app = Flask(__name__)
+instrument(app, "news_scraper")  # Request latencies, stage timers and /metrics
 
 # Base URL for fetching news links and content URL for fetching detailed news content
-BASE_URL = "https://www.mse.mk/en/symbol/{issuer}"
-TEXT_URL = "https://api.seinet.com.mk/public/documents/single/{news_id}"
+BASE_URL = os.getenv("MSE_SYMBOL_URL", "https://www.mse.mk/en/symbol/{issuer}")
+TEXT_URL = os.getenv("SEINET_DOCUMENT_URL", "https://api.seinet.com.mk/public/documents/single/{news_id}")
+NLP_URL = os.getenv("NLP_URL", "http://nlp:5000/sentiment")
+# Inference of a batch can take minutes on a CPU: the read timeout is above the NLP workers' 120 s timeout
+# (see nlp/gunicorn.conf.py), so a stuck worker is reported by the service and not by a timeout here
+NLP_TIMEOUT = (float(os.getenv("NLP_CONNECT_TIMEOUT", 5)), float(os.getenv("NLP_READ_TIMEOUT", 150)))
 MAX_CONCURRENT_REQUESTS = 10
+# "truncate" scores the first 512 tokens of every document, "chunk" scores all of it (see the NLP service)
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "truncate")
+
+NEWS_BLOCK_ID = "seiNetIssuerLatestNews"
+PAGE_CHUNK_SIZE = 16 * 1024  # Bytes read from the issuer page before the parser is fed again
+DATE_PATTERN = re.compile(r"\d{1,2}/\d{1,2}/\d{4}")
+TAG_PATTERN = re.compile(r"<[^>]*>")
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+                 "track", "wbr"}
+
+
+class NewsLinksParser(HTMLParser):
+    """
+    Streaming parser that only looks at the #seiNetIssuerLatestNews block of an issuer page
+    and marks itself done as soon as the block is closed, so the rest of the page is never parsed.
+    For every link it keeps the href and the text of the first "ul li:nth-child(2) h4".
+    Open elements are tracked by name as BeautifulSoup does: an end tag closes the nearest open element
+    of the same name and the ones left open inside it, an end tag without an open element is ignored.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.done = False
+        self.open_tags = []  # Names of the open elements of the news block, the block first, empty while outside
+        self.link = None  # The link being parsed: {"href", "date_text"}
+        self.li_counts = []  # Number of li children seen in every open ul of the current link
+        self.li_index = 0  # Position of the li the parser is currently in
+        self.date_parts = None  # Text of the h4 being captured
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self.open_tags:
+            if dict(attrs).get("id") == NEWS_BLOCK_ID:
+                self.open_tags.append(tag)
+            return
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append(tag)
+
+        if tag == "a":
+            self.link = {"href": dict(attrs).get("href"), "date_text": None}
+            self.li_counts = []
+        elif self.link is None:
+            return
+        elif tag == "ul":
+            self.li_counts.append(0)
+        elif tag == "li" and self.li_counts:
+            self.li_counts[-1] += 1
+            self.li_index = self.li_counts[-1]
+        elif tag == "h4" and self.li_index == 2 and self.link["date_text"] is None:
+            self.date_parts = []
+
+    def handle_endtag(self, tag):
+        if self.done or tag not in self.open_tags:
+            return
+        while True:
+            closed = self.open_tags.pop()
+            self.close_element(closed)
+            if closed == tag:
+                break
+        if not self.open_tags:
+            self.done = True
+
+    def close_element(self, tag):
+        if tag == "h4" and self.date_parts is not None:
+            self.link["date_text"] = "".join(self.date_parts)
+            self.date_parts = None
+        elif tag == "li":
+            self.li_index = 0
+        elif tag == "ul" and self.li_counts:
+            self.li_counts.pop()
+        elif tag == "a" and self.link is not None:
+            if self.link["href"] is not None:
+                self.links.append(self.link)
+            self.link = None
+
+    def handle_data(self, data):
+        if self.date_parts is not None:
+            self.date_parts.append(data)
+
+
+def parse_news_links(chunks):
+    """
+    Method to extract the news links from an issuer page, reading it chunk by chunk until the news block ends.
+    :param chunks: iterable of page chunks (str)
+    :return: list of {"news_id", "date"}
+    """
+    parser = NewsLinksParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    return [
+        {
+            "news_id": extract_news_id(link["href"]),
+            "date": extract_date(link["date_text"]) if link["date_text"] is not None else None,
+        }
+        for link in parser.links
+    ]
 
 def fetch_news_links(issuer):
     """
@@ -23,20 +135,11 @@ def fetch_news_links(issuer):
     """
     url = BASE_URL.format(issuer=issuer)
     try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        page_content = response.text
-        soup = BeautifulSoup(page_content, "html.parser")
-        news_links = soup.select('#seiNetIssuerLatestNews a')
-        return [
-            {
-                "news_id": extract_news_id(link["href"]),
-                "date": extract_date(
-                    link.select_one("ul li:nth-child(2) h4").text
-                ) if link.select_one("ul li:nth-child(2) h4") else None,
-            }
-            for link in news_links if "href" in link.attrs
-        ]
+        with timer("page_fetch"), http_client.get(url, timeout=15, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+            # Stop downloading once the news block has been parsed
+            return parse_news_links(response.iter_content(chunk_size=PAGE_CHUNK_SIZE, decode_unicode=True))
     except Exception as e:
         return {"error": str(e)}
 
@@ -57,7 +160,7 @@ def extract_date(date_str):
     :return: the date extracted from the date string | None
     """
     try:
-        match = re.search(r"\d{1,2}/\d{1,2}/\d{4}", date_str)
+        match = DATE_PATTERN.search(date_str)
         if match:
             return datetime.strptime(match.group(), "%m/%d/%Y").date().isoformat()
     except Exception:
@@ -72,22 +175,27 @@ def fetch_news_content(news_id):
     """
     url = TEXT_URL.format(news_id=news_id)
     try:
-        response = requests.get(url, timeout=15)
+        with timer("document_fetch"):
+            response = http_client.get(url, timeout=15)
         if response.status_code == 200:
             data = response.json()
             content = data.get("data", {}).get("content")
-            return re.sub(r"<[^>]*>", "", content) if content else None
+            return TAG_PATTERN.sub("", content) if content else None
     except Exception as e:
         return {"error": str(e)}
 
-def analyze(news_contents):
+def analyze(news_contents, mode=SENTIMENT_MODE):
     """
     Analyze the content of a news article by using the NLP service
     :param news_contents: list of news
+    :param mode: truncate or chunk
     :return: json response
     """
-    # Send the request with the list of news contents
-    response = requests.post("http://nlp:5000/sentiment", json={"text": news_contents})
+    # Send the request with the list of news contents, truncation to the model length is done by the NLP service.
+    # Not retried: a request that timed out may still be running, a retry would queue the same inference again.
+    with timer("sentiment_call"):
+        response = http_client.post(NLP_URL, json={"text": news_contents, "mode": mode}, timeout=NLP_TIMEOUT,
+                                    retries=0)
 
     # If the request was successful, return the response in JSON format (the sentiment analysis results)
     if response.status_code == 200:
@@ -99,13 +207,14 @@ def analyze(news_contents):
     else:
         return {"error": "Failed to analyze sentiment", "status_code": response.status_code}
 
-def analyze_sentiment(news_contents):
+def analyze_sentiment(news_contents, mode=SENTIMENT_MODE):
     """
     Analyze the content of a news article by using the NLP service
     :param news_contents: list of news
+    :param mode: truncate or chunk
     :return: { sentiment: sentiment, score: score}
     """
-    sentiment_results = analyze(news_contents)
+    sentiment_results = analyze(news_contents, mode)
     if 'results' in sentiment_results:
         results = sentiment_results['results']
 
@@ -119,6 +228,31 @@ def analyze_sentiment(news_contents):
         }
     return {"error": "Unable to perform sentiment analysis."}
 
+def http_client_metrics():
+    """
+    Function to export the outgoing request metrics of http_client on /metrics
+    :return: list of (name, type, help, [(labels, value)])
+    """
+    hosts = http_client.get_metrics()
+    return [
+        ("http_client_requests_total", "counter", "Outgoing request attempts",
+         [({"host": host}, item["requests"]) for host, item in hosts.items()]),
+        ("http_client_failures_total", "counter", "Outgoing request attempts that failed",
+         [({"host": host}, item["failures"]) for host, item in hosts.items()]),
+        ("http_client_retries_total", "counter", "Outgoing requests retried",
+         [({"host": host}, item["retries"]) for host, item in hosts.items()]),
+        ("http_client_rejected_total", "counter", "Outgoing requests rejected by an open circuit",
+         [({"host": host}, item["rejected"]) for host, item in hosts.items()]),
+        ("http_client_request_seconds_total", "counter", "Time spent in outgoing requests",
+         [({"host": host}, item["seconds"]) for host, item in hosts.items()]),
+        ("http_client_circuit_open", "gauge", "1 while the circuit of a host is open",
+         [({"host": host}, int(item["circuit"] == "open")) for host, item in hosts.items()]),
+    ]
+
+
+register_collector(http_client_metrics)
+
+
 @app.route("/news/<string:issuer>", methods=["GET"])
 def get_news_links(issuer):
     news_links = fetch_news_links(issuer)
@@ -136,34 +270,32 @@ def get_news_content(news_id):
 @app.route("/news/<string:issuer>/sentiment", methods=["GET"])
 def get_news_sentiment(issuer):
     """
-    Endpoint to analyze the sentiment of a news article by using the NLP service
+    Endpoint to read the sentiment of an issuer's news, precomputed by the ingestion worker (ingestion.py)
     :param issuer: the company key (e.g. KMB, ADIN...)
     :return: json
     """
-    # Fetch news links for the issuer
-    news_links = fetch_news_links(issuer)
-    if isinstance(news_links, dict) and "error" in news_links:
-        return jsonify({"error": news_links["error"]}), 500
-
-    # Fetch content for each news item
-    news_contents = []
-    for news in news_links:
-        content = fetch_news_content(news["news_id"])
-        if content:
-            news_contents.append(content)
+    with timer("db_read"):
+        sentiment_data = news_store.get_issuer_sentiment(news_store.connect_reader(), issuer)
 
-    # Perform sentiment analysis on the news contents
-    news_contents = [item[:513] for item in news_contents]
-    sentiment_data = analyze_sentiment(news_contents)
+    if sentiment_data is None:
+        return jsonify({"error": f"No sentiment available yet for issuer '{issuer}'"}), 404
 
-    if "error" in sentiment_data:
-        return jsonify({"error": sentiment_data["error"]}), 500
+    # The materialized row is the version: a client that has it gets a 304 without a body
+    etag = get_etag(sentiment_data)
+    if is_fresh(etag):
+        return not_modified(etag)
 
-    return jsonify({
+    return add_cache_headers(jsonify({
         "key": issuer,
         "score": sentiment_data["score"],
-        "sentiment": sentiment_data["sentiment"]
-    })
+        "sentiment": sentiment_data["sentiment"],
+        "decayed_score": sentiment_data["decayed_score"],
+        "news_count": sentiment_data["news_count"],
+        "updated_at": sentiment_data["updated_at"]
+    }), etag)
+
+# Create the tables once, the requests only read (see news_store.connect_reader)
+news_store.connect().close()
 
 # Start the Flask application
 if __name__ == "__main__":
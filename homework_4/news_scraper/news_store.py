@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import statistics
+import threading
+from datetime import date, datetime
+
+# Path to the SQLite database shared by the ingestion worker and the Flask service
+NEWS_DB_PATH = os.getenv("NEWS_DB_PATH", "news.db")
+HALF_LIFE_DAYS = float(os.getenv("SENTIMENT_HALF_LIFE_DAYS", 30))  # Age at which a document counts half as much
+
+# Sign of each sentiment label, used for the time-decayed score
+SENTIMENT_SIGN = {"positive": 1, "neutral": 0, "negative": -1}
+
+readers = threading.local()  # Read connections of each thread of the service, see connect_reader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    news_id TEXT PRIMARY KEY,
+    issuer TEXT NOT NULL,
+    date TEXT,
+    content TEXT,
+    sentiment TEXT,
+    score REAL,
+    fetched_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS news_issuer ON news (issuer);
+CREATE TABLE IF NOT EXISTS issuer_sentiment (
+    issuer TEXT PRIMARY KEY,
+    sentiment TEXT,
+    score REAL,
+    decayed_score REAL,
+    news_count INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+def connect(path=NEWS_DB_PATH):
+    """
+    Function to open the news database, creating the tables if needed
+    :param path: path to the SQLite file
+    :return: connection
+    """
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers in the service are not blocked by the worker's writes
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def connect_reader(path=NEWS_DB_PATH):
+    """
+    Function to get the read connection of the current thread, opened on its first use and kept open.
+    It neither sets the journal mode nor creates the tables: connect does it once, in the ingestion worker
+    and when the service starts.
+    :param path: path to the SQLite file
+    :return: connection
+    """
+    connections = readers.__dict__.setdefault("connections", {})
+    if path not in connections:
+        connection = sqlite3.connect(path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA query_only = ON")  # The ingestion worker is the only writer
+        connections[path] = connection
+    return connections[path]
+
+
+def get_known_news_ids(connection, issuer):
+    """
+    Function to get the ids of the news already stored for an issuer
+    :param connection: database connection
+    :param issuer: the issuer code
+    :return: set of news ids
+    """
+    rows = connection.execute("SELECT news_id FROM news WHERE issuer = ?", (issuer,))
+    return {row["news_id"] for row in rows}
+
+
+def save_news(connection, issuer, news):
+    """
+    Function to store fetched news with their sentiment
+    :param connection: database connection
+    :param issuer: the issuer code
+    :param news: list of dicts with news_id, date, content, sentiment and score
+    """
+    fetched_at = datetime.now().isoformat(timespec="seconds")
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO news (news_id, issuer, date, content, sentiment, score, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(item["news_id"], issuer, item.get("date"), item.get("content"), item.get("sentiment"),
+              item.get("score"), fetched_at) for item in news]
+        )
+
+
+def refresh_issuer_sentiment(connection, issuer, latest_news_ids, today=None):
+    """
+    Function to recompute the materialized sentiment of an issuer.
+    The mode label and mean score cover the news currently listed for the issuer,
+    the decayed score covers all stored news, each weighted by 0.5 ** (age / HALF_LIFE_DAYS).
+    :param connection: database connection
+    :param issuer: the issuer code
+    :param latest_news_ids: ids of the news currently listed on the issuer page
+    :param today: reference date for the decay (defaults to today)
+    :return: the aggregate or None if there are no scored news
+    """
+    today = today or date.today()
+    rows = connection.execute(
+        "SELECT news_id, date, fetched_at, sentiment, score FROM news WHERE issuer = ? AND sentiment IS NOT NULL",
+        (issuer,)
+    ).fetchall()
+    if not rows:
+        return None
+
+    latest = [row for row in rows if row["news_id"] in latest_news_ids] or rows
+
+    weighted_sum = 0.0
+    weight_total = 0.0
+    for row in rows:
+        news_date = date.fromisoformat(row["date"] or row["fetched_at"][:10])
+        weight = 0.5 ** (max((today - news_date).days, 0) / HALF_LIFE_DAYS)
+        weighted_sum += weight * SENTIMENT_SIGN.get(row["sentiment"], 0) * row["score"]
+        weight_total += weight
+
+    aggregate = {
+        "issuer": issuer,
+        "sentiment": statistics.mode([row["sentiment"] for row in latest]),
+        "score": sum(row["score"] for row in latest) / len(latest),
+        "decayed_score": weighted_sum / weight_total if weight_total > 0 else 0.0,
+        "news_count": len(latest),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO issuer_sentiment (issuer, sentiment, score, decayed_score, news_count, updated_at) "
+            "VALUES (:issuer, :sentiment, :score, :decayed_score, :news_count, :updated_at)",
+            aggregate
+        )
+    return aggregate
+
+
+def get_issuer_sentiment(connection, issuer):
+    """
+    Function to read the materialized sentiment of an issuer
+    :param connection: database connection
+    :param issuer: the issuer code
+    :return: dict or None if the issuer has not been ingested yet
+    """
+    row = connection.execute("SELECT * FROM issuer_sentiment WHERE issuer = ?", (issuer,)).fetchone()
+    return dict(row) if row else None
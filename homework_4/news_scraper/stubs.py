@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+from flask import Flask, jsonify, request
+
+# Local stand-ins for mse.mk, SEI-Net and the NLP service, used to run the ingestion worker end to end offline:
+#   python stubs.py
+#   MSE_SYMBOL_URL=http://127.0.0.1:5099/en/symbol/{issuer} \
+#   SEINET_DOCUMENT_URL=http://127.0.0.1:5099/public/documents/single/{news_id} \
+#   NLP_URL=http://127.0.0.1:5099/sentiment python ingestion.py --once KMB ALK
+app = Flask(__name__)
+
+NEWS_PER_ISSUER = int(os.getenv("STUB_NEWS_PER_ISSUER", 5))
+LABELS = ["positive", "neutral", "negative"]
+
+
+def stable_hash(value):
+    """
+    Function to hash a string the same way in every process
+    :param value: the string
+    :return: int
+    """
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest(), 16)
+
+
+def render_issuer_page(issuer):
+    """
+    Function to render an issuer page with the same news block structure as mse.mk
+    :param issuer: the issuer code
+    :return: html
+    """
+    links = []
+    for i in range(NEWS_PER_ISSUER):
+        news_id = 100000 + stable_hash(issuer) % 100000 * 10 + i
+        links.append(
+            f'<a href="https://seinet.com.mk/document/{news_id}">'
+            f'<ul><li><h4>{issuer} announcement {i}</h4></li><li><h4>{1 + i % 12}/{1 + i}/2025</h4></li></ul></a>'
+        )
+    return (f"<html><head><title>{issuer}</title></head><body><div id=\"symbol-info\"><h1>{issuer}</h1></div>"
+            f"<div id=\"seiNetIssuerLatestNews\">{''.join(links)}</div></body></html>")
+
+
+@app.route("/en/symbol/<string:issuer>", methods=["GET"])
+def issuer_page(issuer):
+    return render_issuer_page(issuer)
+
+
+@app.route("/public/documents/single/<string:news_id>", methods=["GET"])
+def document(news_id):
+    paragraphs = [f"<p>Announcement {news_id}: the company reports results for the period.</p>"] * 3
+    paragraphs.append("<p>This announcement is published in accordance with the Law on Securities.</p>")
+    return jsonify({"data": {"content": "\n\n".join(paragraphs)}})
+
+
+@app.route("/sentiment", methods=["POST"])
+def sentiment():
+    text = request.get_json()["text"]
+    text = text if isinstance(text, list) else [text]
+    return jsonify({"results": [
+        {"news": item, "sentiment": LABELS[stable_hash(item) % 3], "score": 0.5 + stable_hash(item) % 50 / 100}
+        for item in text
+    ]})
+
+
+if __name__ == "__main__":
+    port = os.getenv("STUB_PORT", 5099)
+    app.run(host='127.0.0.1', port=port, threaded=True)
@@ -0,0 +1,39 @@
+import glob
+import os
+
+import pytest
+
+from benchmark_news_links import parse_with_beautifulsoup
+from main import parse_news_links
+
+# Checks the streaming news links parser against BeautifulSoup on the issuer pages saved in fixtures/
+# (save more with e.g. curl -o fixtures/issuer_page_KMB.html https://www.mse.mk/en/symbol/KMB):
+#   python -m pytest test_news_links.py
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PAGES = sorted(glob.glob(os.path.join(FIXTURES_PATH, "issuer_page_*.html")))
+
+
+def read_page(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+@pytest.mark.parametrize("chunk_size", [1, 7, 16 * 1024])
+def test_same_links_as_beautifulsoup(path, chunk_size):
+    page = read_page(path)
+    links = parse_news_links(page[i:i + chunk_size] for i in range(0, len(page), chunk_size))
+    assert links == parse_with_beautifulsoup(page)
+
+
+def test_malformed_page():
+    # Stray end tags inside the news block, unclosed li, void elements, a commented-out block,
+    # markup in a script and a second block of links after the news block
+    page = read_page(os.path.join(FIXTURES_PATH, "issuer_page_malformed.html"))
+    assert parse_news_links([page]) == [
+        {"news_id": "90011", "date": "2025-12-05"},
+        {"news_id": "90012", "date": "2025-11-28"},
+        {"news_id": "90013", "date": "2025-11-03"},
+        {"news_id": "90014", "date": None},
+        {"news_id": "90015", "date": "2025-09-30"},
+    ]
@@ -0,0 +1,33 @@
+import gc
+import os
+import signal
+import threading
+
+# The master binds first, so /health answers at once (the first workers have no model, /ready answers 503).
+# It then loads the model in a thread and reloads the workers (SIGHUP): the new workers are forked from the master
+# with the model loaded, so every worker shares the weights copy-on-write
+os.environ.setdefault("NLP_MODEL_LOADING", "master")
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+timeout = 120
+
+
+def when_ready(server):
+    # Called once the sockets are bound, before the first workers are forked
+    if os.environ["NLP_MODEL_LOADING"] != "master":
+        return
+    import main  # The workers import the app from the master's modules, with the model once it is loaded
+
+    def load():
+        main.load_model()
+        server.log.info(f"Model {'loaded' if main.pipe is not None else 'failed'} in the master, reloading the workers")
+        os.kill(os.getpid(), signal.SIGHUP)  # Also after a failed load, so the workers report the error
+
+    threading.Thread(target=load, name="model-loader", daemon=True).start()
+
+
+def pre_fork(server, worker):
+    # Move the loaded objects out of the GC generations so collections in the workers
+    # do not write to (and un-share) the pages inherited from the master
+    gc.freeze()
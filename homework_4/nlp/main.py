@@ -1,35 +1,173 @@
 import os
+import sys
+import threading
+import time
 
 from flask import Flask, request, jsonify
-from transformers import pipeline
-import torch
+
+# Modules shared by the services of homework_4: homework_4/common here, /common in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from instrumentation import instrument, timer
+from preprocessing import build_windows, drop_duplicate_paragraphs
 
 app = Flask(__name__)
+instrument(app, "nlp")  # Request latencies, stage timers and /metrics
+
+MODEL_NAME = "mrm8488/distilroberta-finetuned-financial-news-sentiment-analysis"
+
+# "background" answers health checks at once and loads the model in a thread,
+# "preload" loads it before returning from import,
+# "master" leaves it to the gunicorn master (gunicorn.conf.py), which loads it once after binding and then
+# replaces the workers with ones forked from it, so they share the weights copy-on-write
+MODEL_LOADING = os.getenv("NLP_MODEL_LOADING", "background")
+BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", 16))  # Number of token windows scored per forward pass
+
+# The sentiment analysis pipeline, set once the model is loaded
+pipe = None
+model_error = None
+model_load_seconds = None
+model_lock = threading.Lock()
+
+
+def load_model():
+    """
+    Function to import torch/transformers and build the sentiment analysis pipeline (once per process)
+    :return: the pipeline or None if loading failed
+    """
+    global pipe, model_error, model_load_seconds
+    with model_lock:
+        if pipe is not None:
+            return pipe
+
+        start_time = time.monotonic()
+        try:
+            # Heavy imports are deferred so the app can accept connections before they finish
+            import torch
+            from transformers import pipeline
+
+            # Print CUDA availability
+            print(torch.__version__)
+            print("CUDA available:", torch.cuda.is_available())
 
-# Print CUDA availability
-print(torch.__version__)
-print("CUDA available:", torch.cuda.is_available())
+            with timer("model_load"):
+                pipe = pipeline("text-classification", model=MODEL_NAME)
+            model_error = None
+            model_load_seconds = time.monotonic() - start_time
+            print(f"Model loaded in {model_load_seconds:.2f} seconds")
+        except Exception as e:
+            model_error = str(e)
+            print(f"Error loading model: {e}")
+        return pipe
 
-# Initialize the sentiment analysis pipeline
-pipe = pipeline("text-classification", model="mrm8488/distilroberta-finetuned-financial-news-sentiment-analysis")
 
-def analyze(news):
+def start_model_loading():
+    """
+    Function to start loading the model according to NLP_MODEL_LOADING
+    """
+    if MODEL_LOADING == "preload":
+        load_model()
+    elif MODEL_LOADING == "background":
+        threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+
+
+def restart_model_loading_in_child():
+    """
+    Threads do not survive fork, so a worker forked before the model finished loading starts its own loader
+    (except in "master" mode, where the master replaces the worker once the model is loaded)
+    """
+    global model_lock
+    model_lock = threading.Lock()  # The parent's lock may have been held by its loader thread
+    if pipe is None:
+        start_model_loading()
+
+
+os.register_at_fork(after_in_child=restart_model_loading_in_child)
+start_model_loading()
+
+
+@timer("inference")
+def score_windows(windows):
+    """
+    Function to score token windows, batching windows of similar length so padding stays short
+    :param windows: list of input ids
+    :return: list of class probabilities per window
+    """
+    import torch
+
+    tokenizer, model = pipe.tokenizer, pipe.model
+    probabilities = [None] * len(windows)
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+    with torch.inference_mode():
+        for start in range(0, len(order), BATCH_SIZE):
+            batch = order[start:start + BATCH_SIZE]
+            encoded = tokenizer.pad({"input_ids": [windows[i] for i in batch]}, return_tensors="pt")
+            logits = model(**encoded.to(model.device)).logits
+            for i, row in zip(batch, torch.softmax(logits, dim=-1).tolist()):
+                probabilities[i] = row
+    return probabilities
+
+
+def analyze(news, mode="truncate"):
     """
     Function to analyze news articles
     :param news: list of news articles
+    :param mode: truncate (score the first 512 tokens) or chunk (score every 512-token window and pool the results)
     :return: result of sentiment analysis
     """
+    if not news:
+        return []
+
+    documents = drop_duplicate_paragraphs(news)
+    with timer("tokenize"):
+        windows, owners = build_windows(pipe.tokenizer, documents, mode)
+    probabilities = score_windows(windows)
+
+    # Pool the windows of every document, weighting each window by its number of tokens
+    pooled = [None] * len(news)
+    weights = [0] * len(news)
+    for owner, window, row in zip(owners, windows, probabilities):
+        weight = len(window)
+        pooled[owner] = [p * weight for p in row] if pooled[owner] is None else \
+            [total + p * weight for total, p in zip(pooled[owner], row)]
+        weights[owner] += weight
+
+    id2label = pipe.model.config.id2label
     result_list = []
-    for new in news:
-        result = pipe(new)
+    for new, totals, weight in zip(news, pooled, weights):
+        scores = [total / weight for total in totals]
+        label = max(range(len(scores)), key=scores.__getitem__)
         result_list.append({
             "news": new,
-            "sentiment": result[0]['label'],
-            "score": result[0]['score']
+            "sentiment": id2label[label],
+            "score": scores[label]
         })
     return result_list
 
 
+# Liveness probe, answered as soon as the process accepts connections
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Route for the liveness check
+    :return: json
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+# Readiness probe, answered with 200 only once the model is loaded
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Route for the readiness check
+    :return: json with the model state
+    """
+    if pipe is not None:
+        return jsonify({"status": "ready", "model": MODEL_NAME, "load_seconds": model_load_seconds}), 200
+    if model_error is not None:
+        return jsonify({"status": "error", "error": model_error}), 500
+    return jsonify({"status": "loading"}), 503
+
+
 # Route to analyze the sentiment of a list of news articles
 @app.route("/sentiment", methods=["POST"])
 def analyze_sentiment():
@@ -37,6 +175,9 @@ def analyze_sentiment():
     The main route for sentiment analysis
     :return: json with sentiment analysis
     """
+    if pipe is None:
+        return jsonify({"error": "Model is not loaded yet", "status": "error" if model_error else "loading"}), 503
+
     try:
         # Extract data from the request
         data = request.get_json()
@@ -49,9 +190,12 @@ def analyze_sentiment():
             text = [text]
 
         # Perform sentiment analysis
-        result = analyze(text)
-        return jsonify({"results": result}), 200
+        result = analyze(text, data.get("mode", "truncate"))
+        with timer("serialization"):
+            return jsonify({"results": result}), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+# ---------------------------
+# Configuration
+# ---------------------------
+workers = int(os.getenv("WEB_CONCURRENCY", 4))  # Number of gunicorn workers to start
+port = int(os.getenv("PORT", 5099))  # Port used for the measurement
+ready_timeout = 600  # Seconds to wait for the service to become ready
+
+
+def get_status(path):
+    """
+    Function to get the HTTP status of a route on the local service
+    :param path: the route (e.g. /health)
+    :return: status code or None if the service does not accept connections yet
+    """
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def get_children(pid):
+    """
+    Function to get the child processes of a process
+    :param pid: the parent process id
+    :return: list of process ids
+    """
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def get_memory(pid):
+    """
+    Function to read RSS and PSS of a process (PSS splits shared pages between the processes sharing them)
+    :param pid: process id
+    :return: dict with rss and pss in kB
+    """
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                memory[key.lower()] = int(value.split()[0])
+    return memory
+
+
+if __name__ == "__main__":
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    if len(sys.argv) > 1:
+        env["NLP_MODEL_LOADING"] = sys.argv[1]  # "master" (default with gunicorn), "preload" or "background"
+
+    start_time = time.monotonic()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    try:
+        time_to_health = None
+        time_to_ready = None
+        ready_status = None
+        while time.monotonic() - start_time < ready_timeout:
+            if time_to_health is None and get_status("/health") == 200:
+                time_to_health = time.monotonic() - start_time
+            ready_status = get_status("/ready")
+            if ready_status in (200, 500):  # Loaded, or the load failed
+                time_to_ready = time.monotonic() - start_time
+                break
+            time.sleep(0.1)
+
+        # The workers started before the load are replaced by workers forked from the master, measure those
+        while len(get_children(server.pid)) > workers and time.monotonic() - start_time < ready_timeout:
+            time.sleep(0.1)
+        time.sleep(1)
+        pids = [server.pid] + get_children(server.pid)
+        memory = [get_memory(pid) for pid in pids]
+        print(json.dumps({
+            "workers": workers,
+            "model_loading": env.get("NLP_MODEL_LOADING", "master"),
+            "time_to_health_seconds": time_to_health,
+            "time_to_ready_seconds": time_to_ready,
+            "ready_status": ready_status,
+            "total_rss_kb": sum(m.get("rss", 0) for m in memory),
+            "total_pss_kb": sum(m.get("pss", 0) for m in memory),
+            "processes": len(pids),
+        }, indent=2))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,140 @@
+import hashlib
+import re
+
+# ---------------------------
+# Configuration
+# ---------------------------
+MAX_LENGTH = 512  # Maximum number of tokens the model accepts (including special tokens)
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Jaccard similarity above which two paragraphs are treated as the same
+SHINGLE_SIZE = 3  # Number of words per shingle used for near-duplicate detection
+CHARS_PER_TOKEN = 8  # In "truncate" mode a document is cut after this many characters per token of the window
+
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n|\r\n\s*\r\n")
+WORD = re.compile(r"[^\W_]+")
+SPACE = re.compile(r"\s")
+
+
+def split_paragraphs(text):
+    """
+    Function to split a document into non-empty paragraphs
+    :param text: the document
+    :return: list of paragraphs
+    """
+    return [paragraph.strip() for paragraph in PARAGRAPH_SPLIT.split(text) if paragraph.strip()]
+
+
+def get_paragraph_hash(paragraph):
+    """
+    Function to hash a paragraph for exact duplicates, ignoring case and whitespace only:
+    paragraphs that differ in a number (a price, a date, an amount) are different news
+    :param paragraph: the paragraph
+    :return: bytes
+    """
+    return hashlib.sha1(" ".join(paragraph.lower().split()).encode("utf-8")).digest()
+
+
+def normalize_paragraph(paragraph):
+    """
+    Function to split a paragraph into lowercase words for near-duplicate detection, ignoring punctuation.
+    Numbers are kept as words, so paragraphs that differ only in them stay near duplicates when they are long
+    (boilerplate with a new date) and not when the numbers are most of what they say.
+    :param paragraph: the paragraph
+    :return: list of lowercase words
+    """
+    return WORD.findall(paragraph.lower())
+
+
+def get_shingles(words):
+    """
+    Function to get the word shingles of a normalized paragraph
+    :param words: list of words
+    :return: set of shingles
+    """
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_duplicate_paragraphs(documents):
+    """
+    Function to drop duplicate and near-duplicate paragraphs across a batch of documents, keeping the first occurrence.
+    A document is never emptied: if all of its paragraphs were already seen, it is kept unchanged.
+    :param documents: list of documents
+    :return: list of documents with the repeated paragraphs removed
+    """
+    seen_hashes = set()
+    seen_shingles = []
+    result = []
+    for document in documents:
+        kept = []
+        for paragraph in split_paragraphs(document):
+            words = normalize_paragraph(paragraph)
+            if not words:
+                continue
+
+            paragraph_hash = get_paragraph_hash(paragraph)
+            if paragraph_hash in seen_hashes:
+                continue
+
+            shingles = get_shingles(words)
+            if any(len(shingles & other) / len(shingles | other) >= NEAR_DUPLICATE_THRESHOLD
+                   for other in seen_shingles):
+                continue
+
+            seen_hashes.add(paragraph_hash)
+            seen_shingles.append(shingles)
+            kept.append(paragraph)
+
+        result.append("\n\n".join(kept) if kept else document)
+    return result
+
+
+def cut_document(document, length):
+    """
+    Function to cut a document at the first whitespace after length characters. The tokenizer splits words
+    at whitespace, so the cut text encodes to the same tokens as the start of the whole document.
+    :param document: the document
+    :param length: minimum number of characters kept
+    :return: the cut document, or the whole document if it has no whitespace after length characters
+    """
+    match = SPACE.search(document, length)
+    return document if match is None else document[:match.start()]
+
+
+def build_windows(tokenizer, documents, mode="truncate", max_length=MAX_LENGTH):
+    """
+    Function to turn documents into model inputs of at most max_length tokens.
+    "truncate" keeps the first window of every document, "chunk" keeps all of them.
+    :param tokenizer: the tokenizer of the model
+    :param documents: list of documents
+    :param mode: truncate or chunk
+    :param max_length: maximum number of tokens per window
+    :return: (list of input ids per window, list with the index of the document each window belongs to)
+    """
+    if mode not in ("truncate", "chunk"):
+        raise ValueError(f"Invalid mode '{mode}', expected 'truncate' or 'chunk'")
+
+    window_size = max_length - tokenizer.num_special_tokens_to_add()
+    if mode == "truncate":
+        # Only the first window is used. Truncation only drops the tokens after it, the tokenizer still encodes the
+        # whole text, so long documents are cut by characters first. A cut document that encodes to less than
+        # a window may have lost some of its first window, it is encoded whole.
+        cut = [cut_document(document, window_size * CHARS_PER_TOKEN) for document in documents]
+        encoded = tokenizer(cut, add_special_tokens=False, truncation=True, max_length=window_size)["input_ids"]
+        for index, document in enumerate(documents):
+            if len(encoded[index]) < window_size and len(cut[index]) < len(document):
+                encoded[index] = tokenizer(document, add_special_tokens=False, truncation=True,
+                                           max_length=window_size)["input_ids"]
+    else:
+        encoded = tokenizer(documents, add_special_tokens=False, truncation=False)["input_ids"]
+
+    windows = []
+    owners = []
+    for index, input_ids in enumerate(encoded):
+        starts = range(0, max(len(input_ids), 1), window_size)
+        if mode == "truncate":
+            starts = starts[:1]
+        for start in starts:
+            windows.append(tokenizer.build_inputs_with_special_tokens(input_ids[start:start + window_size]))
+            owners.append(index)
+    return windows, owners
@@ -0,0 +1,90 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+import prediction_store
+from main import forecast, get_global_symbol_ids, get_model_path, get_symbol_versions
+
+# Batch job computing the next-day prediction of every symbol, run after the indicator refresh
+# (pipeline/run.py runs it at the end of a run that changed indicators or models) or nightly from cron.
+# The predictions are stored by (symbol, as-of date) with the versions of the data and model they were made from,
+# and /predict serves them until one of these versions changes.
+#   python batch_predict.py
+#   python batch_predict.py --symbols KMB,ALK
+BATCH_SIZE = 64  # Symbols per forecast call, the symbols of the global model run in one batch per call
+
+
+def get_symbols():
+    """
+    Function to get the symbols that have data and a next-day model (their own or the global one)
+    :return: sorted list of company keys
+    """
+    symbol_ids = get_global_symbol_ids()
+    suffix = "_oscillators_ma_1.csv"
+    symbols = [name[:-len(suffix)] for name in os.listdir("indicators") if name.endswith(suffix)]
+    return sorted(symbol for symbol in symbols if symbol in symbol_ids or os.path.exists(get_model_path(symbol)))
+
+
+def get_as_of(symbol):
+    """
+    Function to get the date of the last data a symbol's prediction is made from
+    :param symbol: company key
+    :return: date string
+    """
+    return str(pd.read_csv(f"indicators/{symbol}_oscillators_ma_1.csv", usecols=["Date"])["Date"].max())
+
+
+def predict_batch(symbols):
+    """
+    Function to forecast a batch of symbols. A failing symbol does not stop the others (see forecast).
+    :param symbols: list of company keys
+    :return: (dict symbol -> price, dict symbol -> error)
+    """
+    errors = {}
+    prices = {symbol: path[0] for symbol, path in forecast(symbols, errors=errors).items()}
+    return prices, {symbol: str(error) for symbol, error in errors.items()}
+
+
+def run(symbols, batch_size=BATCH_SIZE):
+    """
+    Function to compute and store the next-day predictions of the symbols
+    :param symbols: list of company keys
+    :param batch_size: symbols per forecast call
+    :return: (number of predictions stored, dict symbol -> error)
+    """
+    connection = prediction_store.connect()
+    stored = 0
+    errors = {}
+    try:
+        for start in range(0, len(symbols), batch_size):
+            batch = symbols[start:start + batch_size]
+            versions = {symbol: get_symbol_versions(symbol) for symbol in batch}  # Before the files are read
+            try:
+                prices, batch_errors = predict_batch(batch)
+            except Exception as e:
+                prices, batch_errors = {}, {batch[0]: str(e)}
+            errors.update(batch_errors)
+            rows = [{"symbol": symbol, "as_of": get_as_of(symbol), "predicted_price": price,
+                     "data_version": versions[symbol][0], "model_version": versions[symbol][1]}
+                    for symbol, price in prices.items() if versions[symbol] is not None]
+            prediction_store.save_predictions(connection, rows)
+            stored += len(rows)
+    finally:
+        connection.close()
+    return stored, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the next-day prediction of every symbol")
+    parser.add_argument("--symbols", help="comma-separated symbols (default: every symbol with a model)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    symbols = args.symbols.split(",") if args.symbols else get_symbols()
+    stored, errors = run(symbols, args.batch_size)
+    for symbol, error in errors.items():
+        print(f"{symbol} failed: {error}")
+    print(f"Stored {stored} predictions of {len(symbols)} symbols in {time.time() - start_time:.1f} seconds")
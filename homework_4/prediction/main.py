@@ -1,46 +1,173 @@
 from flask import Flask, request, jsonify
+import json
 import os
-import pandas as pd
+import sys
+import threading
 import numpy as np
+import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras.models import load_model
 
+# Modules shared by the services of homework_4: homework_4/common here, /common in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import data_versions
+import indicator_store
+import prediction_store
+from conditional import conditional
+from instrumentation import instrument, timer
+from scaling import inverse_transform_column
+
 # ---------------------------
 # Configuration
 # ---------------------------
 sequence_length = 60  # Length of the sequence used for prediction (60 days)
 features = ['Close', 'RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']  # Features used for prediction
 close_index = features.index('Close')  # Index of the 'Close' feature
+max_horizon = 60  # Longest forecast path served in one request
+global_model_path = "models/global.h5"  # One model for all symbols, trained with lstm/main.py --mode global
+global_symbols_path = "models/global_symbols.json"  # Symbol ids of the global model
+# "auto" serves a symbol from the global model when it knows the symbol, "symbol" always uses models/{symbol}.h5
+model_mode = os.getenv("PREDICTION_MODEL", "auto")
+
+# Loaded models and feature windows are kept per process and reused by every request and every rollout step
+model_cache = {}  # model path -> (file identity, model)
+feature_cache = {}  # symbol -> (data version or file mtime, fitted scaler, last sequence)
+global_symbol_ids = None
+global_model_version = None  # mtime of the global model when its symbol ids were read
+global_model_identity = None  # Identity of the global model and symbol files the ids were read from
+cache_lock = threading.Lock()
 
 # Initialize Flask app
 app = Flask(__name__)
+instrument(app, "prediction")  # Request latencies, stage timers and /metrics
 
-# Function to predict the next day's price for a given symbol
-def predict_next_day(symbol):
+
+def get_model_path(symbol, horizon=1):
     """
-    Function to predict the price for the next day based on the last data
+    Function to get the path of a symbol's model: models/{symbol}.h5 for next-day models,
+    models/{symbol}_horizon_{horizon}.h5 for direct multi-horizon models (lstm/main.py --horizon)
+    """
+    return f"models/{symbol}.h5" if horizon == 1 else f"models/{symbol}_horizon_{horizon}.h5"
+
+
+def get_file_identity(*paths):
+    """
+    Function to identify the content of files without reading them, a file replaced by a new one gets a new identity
+    :param paths: file paths
+    :return: list of (mtime, size) per file, None for a missing file
+    """
+    identity = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            identity.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            identity.append(None)
+    return identity
+
+
+def get_model(model_path):
+    """
+    Function to load a model once and keep it for the next requests, until the file is replaced
+    (e.g. the global model retrained, or a model copied by hand that is not in the manifest)
+    :param model_path: path to the .h5 file
+    :return: the model
+    """
+    identity = get_file_identity(model_path)
+    with cache_lock:
+        cached = model_cache.get(model_path)
+        if cached is None or cached[0] != identity:
+            with timer("model_load"):
+                model_cache[model_path] = (identity, load_model(model_path, compile=False))
+        return model_cache[model_path][1]
+
+
+def invalidate(symbol, old_entry, new_entry):
+    """
+    Function to drop the cached data and models of a symbol whose published versions changed (see data_versions.py)
     :param symbol: company key
-    :return: the price
+    :param old_entry: previous manifest entry or None
+    :param new_entry: new manifest entry or None
+    """
+    old_entry, new_entry = old_entry or {}, new_entry or {}
+    with cache_lock:
+        if old_entry.get("data") != new_entry.get("data"):
+            feature_cache.pop(symbol, None)
+        if old_entry.get("model") != new_entry.get("model"):
+            for model_path in [path for path in model_cache
+                               if path == get_model_path(symbol) or path.startswith(f"models/{symbol}_horizon_")]:
+                del model_cache[model_path]
+
+
+data_versions.add_listener(invalidate)
+data_versions.start_watcher()
+
+
+def get_global_symbol_ids():
+    """
+    Function to read the symbol ids of the global model, again when the global model or its ids are replaced
+    (the cached model is dropped then), the model itself is loaded on first use
+    :return: dict symbol -> id, empty if there is no global model
+    """
+    global global_symbol_ids, global_model_version, global_model_identity
+    if model_mode == "symbol":
+        return {}
+    identity = get_file_identity(global_model_path, global_symbols_path)
+    with cache_lock:
+        if global_symbol_ids is None or identity != global_model_identity:
+            model_cache.pop(global_model_path, None)
+            global_symbol_ids, global_model_version = {}, None
+            if None not in identity:
+                with open(global_symbols_path) as f:
+                    global_symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(json.load(f))}
+                global_model_version = os.path.getmtime(global_model_path)
+            global_model_identity = identity
+    return global_symbol_ids
+
+
+def get_global_model():
+    """
+    Function to get the global model and its symbol ids
+    :return: (model, dict symbol -> id) or (None, {}) if there is no global model
+    """
+    symbol_ids = get_global_symbol_ids()
+    if not symbol_ids:
+        return None, {}
+    return get_model(global_model_path), symbol_ids
+
+
+def load_last_sequence(symbol):
+    """
+    Function to load a symbol's data, scale it and take the last sequence. The result is cached
+    until the manifest publishes a new version of the data, or until the file changes if it is not in the manifest.
+    :param symbol: company key
+    :return: (fitted scaler, last sequence of shape (sequence_length, features))
     """
-    model_path = f"models/{symbol}.h5"  # Path to the trained model for the symbol
     data_path = f"indicators/{symbol}_oscillators_ma_1.csv"  # Path to the CSV data for the symbol
 
-    # Check if model file exists
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"No model found for symbol {symbol} at {model_path}.")
+    version = data_versions.get_version(symbol, "data")  # Known without touching the file
+    if version is None and os.path.exists(data_path):
+        version = os.path.getmtime(data_path)  # Files copied by hand are not in the manifest
+    cached = feature_cache.get(symbol)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
 
     # Check if data file exists
     if not os.path.exists(data_path):
         raise FileNotFoundError(f"No data file found for symbol {symbol} at {data_path}.")
 
-    # Load the trained model
-    model = load_model(model_path)
-
-    # Load the data for the symbol
-    df = pd.read_csv(data_path)
-    df['Date'] = pd.to_datetime(df['Date'])  # Convert 'Date' column to datetime
-    df = df.sort_values('Date')  # Sort the data by date
-    df = df.set_index('Date')  # Set 'Date' as the index of the DataFrame
+    # Load the data for the symbol, from the memory-mapped store when it has the published version (indicator_store.py)
+    store = indicator_store.open_store(indicator_store.get_store_path("indicators", 1))
+    with timer("file_read"):
+        df = None
+        if store is not None:
+            df = indicator_store.read_rows(store, symbol, ['Date'] + features,
+                                           version=data_versions.get_version(symbol, "data"))
+        if df is None:
+            df = pd.read_csv(data_path)
+        df['Date'] = pd.to_datetime(df['Date'])  # Convert 'Date' column to datetime
+        df = df.sort_values('Date')  # Sort the data by date
+        df = df.set_index('Date')  # Set 'Date' as the index of the DataFrame
 
     # Check if all required features are present in the data
     for feat in features:
@@ -57,37 +184,267 @@ def predict_next_day(symbol):
     # Extract the values for the features and scale them
     data = df[features].values
     scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(data)
+    with timer("scaler_fit"):
+        scaled_data = scaler.fit_transform(data)
+
+    last_sequence = scaled_data[-sequence_length:].astype(np.float32)
+    feature_cache[symbol] = (version, scaler, last_sequence)
+    return scaler, last_sequence
+
+
+@timer("inference")
+def rollout(model, sequences, horizon, symbol_ids=None):
+    """
+    Function to forecast several days with a next-day model by feeding every prediction back in.
+    The predicted day repeats the other features of the last known day, with Close replaced by the prediction.
+    :param model: next-day model
+    :param sequences: scaled sequences of shape (symbols, sequence_length, features)
+    :param horizon: number of days to forecast
+    :param symbol_ids: ids of the symbols for the global model, None for a per-symbol model
+    :return: scaled close prices of shape (symbols, horizon)
+    """
+    window = sequences.copy()
+    path = np.empty((len(sequences), horizon), dtype=np.float32)
+    for step in range(horizon):
+        inputs = window if symbol_ids is None else [window, symbol_ids]
+        path[:, step] = np.asarray(model(inputs, training=False))[:, 0]
+
+        next_day = window[:, -1:, :].copy()
+        next_day[:, 0, close_index] = path[:, step]
+        window = np.concatenate([window[:, 1:, :], next_day], axis=1)
+    return path
+
+
+def forecast(symbols, horizon=1, errors=None):
+    """
+    Function to forecast the close price of the next horizon days for several symbols.
+    A symbol uses its direct multi-horizon model if one exists, otherwise a recursive rollout of the
+    global model (all its symbols in one batch per step) or of its own next-day model.
+    :param symbols: list of company keys
+    :param horizon: number of days to forecast
+    :param errors: dict filled with symbol -> exception for the symbols that fail (e.g. no data or model),
+                   which are left out so the others are still forecast; None raises the first error instead
+    :return: dict symbol -> list of prices
+    """
+    global_model, symbol_ids = get_global_model()
+    direct_symbols = [symbol for symbol in symbols
+                      if horizon > 1 and os.path.exists(get_model_path(symbol, horizon))]
+    global_symbols = [symbol for symbol in symbols if symbol in symbol_ids and symbol not in direct_symbols]
+
+    predictions = {}
+    loaded = {}  # Scaler and last sequence of the global model's symbols
+    for symbol in dict.fromkeys(symbols):
+        try:
+            if symbol in global_symbols:
+                loaded[symbol] = load_last_sequence(symbol)
+                continue
+
+            model_path = get_model_path(symbol, horizon) if symbol in direct_symbols else get_model_path(symbol)
+
+            # Check if model file exists
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"No model found for symbol {symbol} at {model_path}.")
+
+            scaler, last_sequence = load_last_sequence(symbol)
+            model = get_model(model_path)
 
-    # Prepare the last sequence of data for prediction
-    last_sequence = scaled_data[-sequence_length:].reshape(1, sequence_length, len(features))
+            # Predict the scaled prices using the trained model
+            if symbol in direct_symbols:
+                with timer("inference"):
+                    path = np.asarray(model(last_sequence[None], training=False))[0, :horizon]
+            else:
+                path = rollout(model, last_sequence[None], horizon)[0]
 
-    # Predict the scaled price using the trained model
-    predicted_price_scaled = model.predict(last_sequence)
+            # Reverse the scaling of the Close column to obtain the actual predicted prices
+            predictions[symbol] = inverse_transform_column(scaler, path, close_index).tolist()
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[symbol] = e
 
-    # Reverse the scaling to obtain the actual predicted price
-    dummy_future = np.zeros((1, len(features)))
-    dummy_future[0, close_index] = predicted_price_scaled
-    predicted_price = scaler.inverse_transform(dummy_future)[0, close_index]
+    if loaded:
+        sequences = np.stack([last_sequence for _, last_sequence in loaded.values()])
+        ids = np.array([[symbol_ids[symbol]] for symbol in loaded], dtype=np.int32)
+        paths = rollout(global_model, sequences, horizon, ids)
+        for (symbol, (scaler, _)), path in zip(loaded.items(), paths):
+            predictions[symbol] = inverse_transform_column(scaler, path, close_index).tolist()
+
+    return {symbol: predictions[symbol] for symbol in symbols if symbol in predictions}
+
+
+# Function to predict the next day's price for a given symbol
+def predict_next_day(symbol):
+    """
+    Function to predict the price for the next day based on the last data
+    :param symbol: company key
+    :return: the price
+    """
+    return forecast([symbol])[symbol][0]
+
+
+def predict_next_day_batch(symbols, errors=None):
+    """
+    Function to predict the next day's price of several symbols, the ones known to the global model in one batch
+    :param symbols: list of company keys
+    :param errors: dict filled with the errors of the symbols left out (see forecast)
+    :return: dict symbol -> price
+    """
+    return {symbol: path[0] for symbol, path in forecast(symbols, errors=errors).items()}
+
+
+def format_prediction(symbol, path, horizon):
+    """
+    Function to build the response of one symbol
+    :param symbol: company key
+    :param path: forecast prices
+    :param horizon: number of forecast days
+    :return: dict
+    """
+    result = {"symbol": symbol, "predicted_price": path[0]}
+    if horizon > 1:
+        result["horizon"] = horizon
+        result["predicted_prices"] = path
+    return result
+
+
+def get_file_version(symbol, kind, path):
+    """
+    Function to get the version of a data or model file: the manifest's version, or the file's mtime
+    :return: version, or None if the file does not exist
+    """
+    version = data_versions.get_version(symbol, kind)
+    if version is None and os.path.exists(path):
+        version = os.path.getmtime(path)  # Files copied by hand are not in the manifest
+    return version
+
+
+def get_symbol_versions(symbol, horizon=1):
+    """
+    Function to get the versions of the data and model a symbol's forecast uses, without loading them
+    :param symbol: company key
+    :param horizon: number of forecast days
+    :return: [data version, model version], or None if a file is missing
+    """
+    if horizon > 1 and os.path.exists(get_model_path(symbol, horizon)):
+        model_version = ["direct", os.path.getmtime(get_model_path(symbol, horizon))]
+    elif symbol in get_global_symbol_ids():
+        model_version = ["global", global_model_version]
+    else:
+        model_version = get_file_version(symbol, "model", get_model_path(symbol))
+    data_version = get_file_version(symbol, "data", f"indicators/{symbol}_oscillators_ma_1.csv")
+    if model_version is None or data_version is None:
+        return None
+    return [data_version, model_version]
+
+
+def get_horizon():
+    """
+    Function to read the horizon query parameter
+    :return: the horizon, 1 when the parameter is missing
+    :raise ValueError: when the parameter is not an integer
+    """
+    value = request.args.get('horizon')
+    if value is None:
+        return 1
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Horizon must be an integer, got '{value}'.")
+
+
+def get_prediction_versions():
+    """
+    Function to get the versions of the data and models a /predict request uses, without loading them
+    :return: list of versions, or None when they are unknown (invalid request or missing file, answered by the route)
+    """
+    symbols = request.args.get('symbols')
+    symbols = [item.strip() for item in symbols.split(",") if item.strip()] if symbols \
+        else [request.args.get('symbol')] if request.args.get('symbol') else []
+    try:
+        horizon = get_horizon()
+    except ValueError:
+        return None
+
+    versions = []
+    for symbol in symbols:
+        symbol_versions = get_symbol_versions(symbol, horizon)
+        if symbol_versions is None:
+            return None
+        versions.append([symbol] + symbol_versions)
+    return versions or None
+
+
+def get_precomputed_predictions(symbols):
+    """
+    Function to read the next-day predictions precomputed by batch_predict.py that are still valid,
+    i.e. made from the data and model versions the symbols have now
+    :param symbols: list of company keys
+    :return: dict symbol -> price, without the symbols that have no valid prediction
+    """
+    if not symbols or not os.path.exists(prediction_store.PREDICTIONS_DB_PATH):
+        return {}
+    with timer("db_read"):
+        connection = prediction_store.connect()
+        try:
+            latest = prediction_store.get_latest_predictions(connection, symbols)
+        finally:
+            connection.close()
+    return {symbol: row["predicted_price"] for symbol, row in latest.items()
+            if [row["data_version"], row["model_version"]] == get_symbol_versions(symbol)}
+
+
+def forecast_next_day(symbols, errors=None):
+    """
+    Function to get the next-day prediction of several symbols: precomputed when it is still valid,
+    computed on demand otherwise
+    :param symbols: list of company keys
+    :param errors: dict filled with the errors of the symbols left out (see forecast)
+    :return: dict symbol -> list with the price, like forecast
+    """
+    predictions = {symbol: [price] for symbol, price in get_precomputed_predictions(symbols).items()}
+    missing = [symbol for symbol in symbols if symbol not in predictions]
+    if missing:
+        predictions.update(forecast(missing, errors=errors))
+    return {symbol: predictions[symbol] for symbol in symbols if symbol in predictions}
 
-    # Return the predicted price
-    return predicted_price
 
 # Flask route for predicting the next day's price
 @app.route('/predict', methods=['GET'])
+@conditional(get_prediction_versions)
 def predict():
     """
     The endpoint for predicting the price for the next day based on the last data
+    Query parameters: symbol, or symbols (comma-separated) for a batched prediction,
+    and horizon (default 1) for the path of the next N days.
+    A batch answers every symbol: its prediction, or {"symbol", "error"} when it has no data or model.
+    Next-day predictions precomputed by batch_predict.py are served as long as the data and model did not change.
     :return: json
     """
     symbol = request.args.get('symbol')  # Get the symbol parameter from the request
-    if not symbol:
+    symbols = request.args.get('symbols')  # Or a comma-separated list of symbols, predicted in one batch
+    if not symbol and not symbols:
         return jsonify({"error": "Symbol parameter is required."}), 400  # Return error if symbol is not provided
 
     try:
-        # Call the predict_next_day function to get the predicted price
-        prediction = predict_next_day(symbol)
-        return jsonify({"symbol": symbol, "predicted_price": prediction}), 200  # Return the prediction in JSON format
+        horizon = get_horizon()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if horizon < 1 or horizon > max_horizon:
+        return jsonify({"error": f"Horizon must be between 1 and {max_horizon}."}), 400
+
+    try:
+        if symbols:
+            symbols = list(dict.fromkeys(item.strip() for item in symbols.split(",") if item.strip()))
+            errors = {}  # A symbol without data or model is reported, the others are still predicted
+            paths = forecast(symbols, horizon, errors) if horizon > 1 else forecast_next_day(symbols, errors)
+            with timer("serialization"):
+                return jsonify([format_prediction(key, paths[key], horizon) if key in paths
+                                else {"symbol": key, "error": str(errors[key])} for key in symbols]), 200
+
+        # Call the forecast function to get the predicted price(s)
+        path = (forecast([symbol], horizon) if horizon > 1 else forecast_next_day([symbol]))[symbol]
+        with timer("serialization"):
+            return jsonify(format_prediction(symbol, path, horizon)), 200  # Return the prediction in JSON format
     except FileNotFoundError as e:
         return jsonify({"error": str(e)}), 404  # Handle file not found error
     except ValueError as e:
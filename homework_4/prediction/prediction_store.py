@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+# Path to the SQLite database of the next-day predictions precomputed by batch_predict.py and served by main.py
+PREDICTIONS_DB_PATH = os.getenv("PREDICTIONS_DB_PATH", "predictions.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    symbol TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    predicted_price REAL NOT NULL,
+    data_version TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, as_of)
+);
+"""
+
+
+def connect(path=PREDICTIONS_DB_PATH):
+    """
+    Function to open the predictions database, creating the table if needed
+    :param path: path to the SQLite file
+    :return: connection
+    """
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers in the service are not blocked by the batch job
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def save_predictions(connection, predictions):
+    """
+    Function to store predictions, replacing the ones of the same symbol and date
+    :param connection: database connection
+    :param predictions: list of dicts with symbol, as_of, predicted_price, data_version and model_version
+    """
+    created_at = datetime.now().isoformat(timespec="seconds")
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO predictions (symbol, as_of, predicted_price, data_version, model_version, "
+            "created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(item["symbol"], item["as_of"], item["predicted_price"], json.dumps(item["data_version"]),
+              json.dumps(item["model_version"]), created_at) for item in predictions]
+        )
+
+
+def get_latest_predictions(connection, symbols):
+    """
+    Function to read the latest prediction of every symbol
+    :param connection: database connection
+    :param symbols: list of company keys
+    :return: dict symbol -> {"as_of", "predicted_price", "data_version", "model_version"}, without the symbols
+             that have no prediction
+    """
+    rows = connection.execute(
+        f"SELECT symbol, as_of, predicted_price, data_version, model_version FROM predictions "
+        f"WHERE symbol IN ({','.join('?' * len(symbols))}) ORDER BY symbol, as_of",
+        list(symbols)
+    ).fetchall()
+    latest = {}
+    for row in rows:  # Ordered by date, the last row of a symbol is kept
+        latest[row["symbol"]] = {"as_of": row["as_of"], "predicted_price": row["predicted_price"],
+                                 "data_version": json.loads(row["data_version"]),
+                                 "model_version": json.loads(row["model_version"])}
+    return latest
@@ -0,0 +1,434 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+# Incremental runner of the whole pipeline. Every symbol goes through the same chain of stages:
+#   scrape      homework_1: update shared/storage/{symbol}.csv from mse.mk
+#   indicators  homework_3/rsi: indicators and signals of every timeframe, published as {symbol}_oscillators_ma_{tf}.csv
+#               to homework_3/indicators (read by the LSTM training) and to the indicators and prediction services
+#   features    the LSTM inputs of the 1-day file, so models are not retrained when only other columns changed
+#   model       homework_3/lstm: train the symbol's model, published to the prediction service
+# A stage only runs when the fingerprint of its inputs (content hashes of the data and of the stage's code) differs
+# from the last run, recorded in shared/storage/pipeline_state.json. Symbols run in parallel, one process each.
+# After every symbol, the versions of the published files are written to manifest.json in each service folder
+# (MANIFEST_TARGETS), which the services watch to drop the cached data of exactly the symbols that changed.
+# At the end, the indicator files are packed into one memory-mapped store per timeframe for the services,
+# the index of the most correlated symbols is rebuilt from the stored prices (homework_3/rsi/correlations.py),
+# and the next-day predictions of every symbol are precomputed (homework_4/prediction/batch_predict.py).
+#   python run.py                          # Every symbol, every stage
+#   python run.py --stages indicators,features --symbols KMB,ALK
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_ROOT = os.path.abspath(os.getenv("PIPELINE_DATA_ROOT", ROOT))  # Where the data folders are, for a trial run
+STAGES = ["scrape", "indicators", "features", "model"]
+TIMEFRAMES = os.getenv("TIMEFRAMES", "1,7,30").split(",")
+FEATURES = ['Close', 'RSI', 'Stoch_K', 'Stoch_D', 'WilliamsR', 'CCI', 'MFI', 'SMA', 'EMA', 'WMA']  # As lstm/main.py
+
+# Code of each stage, part of its fingerprint so a change of the code re-runs the stage
+STAGE_CODE = {
+    "indicators": ["homework_3/rsi/indicators.py", "homework_3/rsi/kernels.py", "homework_3/rsi/resampling.py"],
+    "model": ["homework_3/lstm/main.py", "homework_3/lstm/windows.py", "homework_4/common/scaling.py"],
+}
+# Folders the published files are copied to
+INDICATOR_TARGETS = ["homework_3/indicators", "homework_4/indicators/indicators", "homework_4/prediction/indicators"]
+MODEL_TARGETS = ["homework_4/prediction/models"]
+MANIFEST_TARGETS = ["homework_4/indicators", "homework_4/prediction"]  # Services reading the published files
+STORE_TARGETS = ["homework_4/indicators/indicators", "homework_4/prediction/indicators"]
+CORRELATION_TARGETS = ["homework_4/indicators/indicators"]  # Served by GET /<issuer>/similar
+CORRELATION_INDEX = "similar_252.npz"  # One-year window, as correlations.py
+
+loaded_modules = {}  # Per worker process: (folder, module) -> module
+
+
+def get_storage_path(*parts):
+    return os.path.join(DATA_ROOT, "shared", "storage", *parts)
+
+
+def get_state_path():
+    return get_storage_path("pipeline_state.json")
+
+
+def hash_file(path, digest=None):
+    """
+    Function to hash the content of a file
+    :param path: file path
+    :param digest: hashlib object to update instead of a new one
+    :return: hex digest, or None if the file does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(*values):
+    """
+    Function to combine hashes and settings into one fingerprint
+    :return: hex digest
+    """
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_code_fingerprint(stage):
+    return fingerprint([hash_file(os.path.join(ROOT, path)) for path in STAGE_CODE.get(stage, [])])
+
+
+def load_component(folder, name):
+    """
+    Function to import a module of a component by path. Every component has a main.py, so they are
+    registered under unique names; their own imports (archive, kernels, windows...) come from their folder.
+    :param folder: component folder relative to the repository
+    :param name: module name
+    :return: module
+    """
+    key = (folder, name)
+    if key not in loaded_modules:
+        path = os.path.join(ROOT, folder)
+        sys.path.insert(0, path)
+        try:
+            spec = importlib.util.spec_from_file_location(f"{folder.replace('/', '_')}_{name}",
+                                                          os.path.join(path, f"{name}.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        finally:
+            sys.path.remove(path)
+        loaded_modules[key] = module
+    return loaded_modules[key]
+
+
+def enter(folder):
+    """
+    Function to run a component from its folder: the components use paths relative to it (../shared/storage)
+    :param folder: component folder relative to the repository
+    """
+    path = os.path.join(DATA_ROOT, folder)
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+
+
+def publish(source_path, targets, name=None):
+    """
+    Function to copy a file into the folders read by the services. Each copy is written next to its
+    destination and renamed over it, so a reader sees the old or the new file, never a partial one.
+    :param source_path: file to publish
+    :param targets: folders relative to the data root
+    :param name: file name in the targets (default: the source's name)
+    """
+    name = name or os.path.basename(source_path)
+    for target in targets:
+        folder = os.path.join(DATA_ROOT, target)
+        os.makedirs(folder, exist_ok=True)
+        temporary_path = os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+        shutil.copyfile(source_path, temporary_path)
+        os.replace(temporary_path, os.path.join(folder, name))
+
+
+def is_published(targets, names):
+    return all(os.path.exists(os.path.join(DATA_ROOT, target, name)) for target in targets for name in names)
+
+
+# ---------------------------
+# Stages
+# Each stage gets the symbol, the state of its last run, the symbol's state (with the stages that already ran
+# in this run) and the force flag, and returns (input fingerprint, output fingerprint, ran).
+# A stage with nothing to do for its inputs raises StageSkipped, the skip is recorded like a run.
+# ---------------------------
+
+class StageSkipped(Exception):
+    def __init__(self, input_fingerprint, reason):
+        super().__init__(reason)
+        self.input_fingerprint = input_fingerprint
+
+
+def run_scrape(symbol, previous, state, force):
+    # The input is the exchange website, so the stage always runs: its output hash decides what runs next
+    main = load_component("homework_1", "main")
+    backfill = load_component("homework_1", "backfill")
+    enter("homework_1")
+    first_trading_date = backfill.load_listings().get(symbol)
+    main.retrieve_data_for_code(symbol, first_trading_date)
+    return None, hash_file(get_storage_path(f"{symbol}.csv")), True
+
+
+def run_indicators(symbol, previous, state, force):
+    data_hash = hash_file(get_storage_path(f"{symbol}.csv"))
+    if data_hash is None:
+        raise FileNotFoundError(f"No data for {symbol}, run the scrape stage first")
+    input_fingerprint = fingerprint(data_hash, get_code_fingerprint("indicators"), TIMEFRAMES)
+    names = [f"{symbol}_oscillators_ma_{timeframe}.csv" for timeframe in TIMEFRAMES]
+    if not force and previous.get("input") == input_fingerprint and is_published(INDICATOR_TARGETS, names):
+        return input_fingerprint, previous["output"], False
+
+    indicators = load_component("homework_3/rsi", "indicators")
+    enter("homework_3/rsi")
+    staging = get_storage_path("pipeline", symbol)
+    os.makedirs(staging, exist_ok=True)
+    daily = indicators.infer_close_price(indicators.read_csv(get_storage_path(f"{symbol}.csv")))
+    output_hashes = []
+    for timeframe, name in zip(TIMEFRAMES, names):
+        bars = indicators.get_bars(symbol, daily, timeframe, get_storage_path("bars"))
+        indicators.save(indicators.all_indicators(bars), os.path.join(staging, name))
+        output_hashes.append(hash_file(os.path.join(staging, name)))
+    for name in names:
+        publish(os.path.join(staging, name), INDICATOR_TARGETS)
+    return input_fingerprint, fingerprint(output_hashes), True
+
+
+def run_features(symbol, previous, state, force):
+    # Fingerprint of the values the LSTM is trained on, the columns of the 7 and 30-day files do not matter
+    import pandas as pd
+
+    path = os.path.join(DATA_ROOT, INDICATOR_TARGETS[0], f"{symbol}_oscillators_ma_1.csv")
+    input_fingerprint = hash_file(path)
+    if input_fingerprint is None:
+        raise FileNotFoundError(f"No indicators for {symbol}, run the indicators stage first")
+    if not force and previous.get("input") == input_fingerprint:
+        return input_fingerprint, previous["output"], False
+    df = pd.read_csv(path, usecols=['Date'] + FEATURES)
+    output = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+    return input_fingerprint, output, True
+
+
+def run_model(symbol, previous, state, force):
+    features = state.get("features", {}).get("output")
+    if features is None:
+        raise ValueError(f"No features for {symbol}, run the features stage first")
+    input_fingerprint = fingerprint(features, get_code_fingerprint("model"))
+    name = f"{symbol}.h5"
+    if not force and previous.get("input") == input_fingerprint and (
+            previous.get("skipped") or is_published(MODEL_TARGETS, [name])):
+        return input_fingerprint, previous["output"], False
+
+    lstm = load_component("homework_3/lstm", "main")
+    enter("homework_3/lstm")
+    os.makedirs("models", exist_ok=True)
+    if lstm.train_symbol(symbol, incremental=True) is None:  # Fine-tuned, retrained from scratch when it degrades
+        raise StageSkipped(input_fingerprint, "not enough data to train a model")  # Tried again when the data grows
+    model_path = os.path.abspath(lstm.get_model_path(symbol))
+    publish(model_path, MODEL_TARGETS, name)
+    return input_fingerprint, hash_file(model_path), True
+
+
+STAGE_FUNCTIONS = {"scrape": run_scrape, "indicators": run_indicators, "features": run_features, "model": run_model}
+
+
+def run_symbol(symbol, stages, state, force):
+    """
+    Function to run the stages of one symbol in order (in a worker process)
+    :param symbol: company key
+    :param stages: stages to run
+    :param state: the symbol's state of the last run, dict stage -> {"input", "output", ...}
+    :param force: run the stages even if their inputs did not change
+    :return: (new state of the symbol, list of stages that ran, error or None). After an error, the state has
+             the stages that finished before it (their files are published) and the later stages are not run.
+    """
+    state = dict(state)
+    ran = []
+    for stage in stages:
+        previous = state.get(stage, {})
+        start_time = time.perf_counter()
+        try:
+            input_fingerprint, output_fingerprint, did_run = STAGE_FUNCTIONS[stage](symbol, previous, state, force)
+        except StageSkipped as e:
+            print(f"{symbol}: {stage} skipped, {e}")
+            state[stage] = {"input": e.input_fingerprint, "output": None, "skipped": str(e),
+                            "finished_at": datetime.now().isoformat(timespec="seconds")}
+            continue
+        except Exception as e:
+            return state, ran, f"{stage}: {e}"
+        if did_run:
+            ran.append(stage)
+            state[stage] = {"input": input_fingerprint, "output": output_fingerprint,
+                            "seconds": round(time.perf_counter() - start_time, 3),
+                            "finished_at": datetime.now().isoformat(timespec="seconds")}
+    return state, ran, None
+
+
+def load_state():
+    if not os.path.exists(get_state_path()):
+        return {}
+    with open(get_state_path()) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    """
+    Function to save the pipeline state, replacing the file at once
+    """
+    os.makedirs(os.path.dirname(get_state_path()), exist_ok=True)
+    temporary_path = get_state_path() + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(temporary_path, get_state_path())
+
+
+def build_manifest_symbols(state):
+    """
+    Function to get the published versions of every symbol: the output fingerprints of its indicators and model
+    :param state: pipeline state
+    :return: dict symbol -> {"data", "model", "indicators"}
+    """
+    symbols = {}
+    for symbol, symbol_state in state.items():
+        if "indicators" not in symbol_state:
+            continue  # Nothing published by the pipeline yet
+        entry = {"data": symbol_state["indicators"]["output"],
+                 "indicators": [f"indicators/{symbol}_oscillators_ma_{timeframe}.csv" for timeframe in TIMEFRAMES]}
+        if symbol_state.get("model", {}).get("output"):
+            entry["model"] = symbol_state["model"]["output"]
+        symbols[symbol] = entry
+    return symbols
+
+
+def load_manifest():
+    path = os.path.join(DATA_ROOT, MANIFEST_TARGETS[0], "manifest.json")
+    if not os.path.exists(path):
+        return {"version": 0, "symbols": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_manifest(manifest, state):
+    """
+    Function to write a new version of the manifest to the service folders if a published version changed.
+    It is written after the files it lists, so a service never sees a version before its file.
+    :param manifest: last written manifest, updated in place
+    :param state: pipeline state
+    :return: True if a new version was written
+    """
+    symbols = build_manifest_symbols(state)
+    if symbols == manifest["symbols"]:
+        return False
+    manifest.update(version=manifest["version"] + 1, updated_at=datetime.now().isoformat(timespec="seconds"),
+                    symbols=symbols)
+    for target in MANIFEST_TARGETS:
+        folder = os.path.join(DATA_ROOT, target)
+        os.makedirs(folder, exist_ok=True)
+        temporary_path = os.path.join(folder, ".manifest.json.tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, os.path.join(folder, "manifest.json"))
+    return True
+
+
+def build_stores(manifest):
+    """
+    Function to pack the published indicator files into one store per timeframe (homework_4/common/indicator_store.py)
+    and publish them. The offset table records the manifest's data versions, so a service reads a symbol from
+    the store only when the store has its published version.
+    :param manifest: last written manifest
+    """
+    indicator_store = load_component("homework_4/common", "indicator_store")
+    staging = get_storage_path("pipeline")
+    os.makedirs(staging, exist_ok=True)
+    versions = {symbol: entry["data"] for symbol, entry in manifest["symbols"].items()}
+    for timeframe in TIMEFRAMES:
+        path = indicator_store.get_store_path(staging, timeframe)
+        count = indicator_store.build(os.path.join(DATA_ROOT, INDICATOR_TARGETS[0]), timeframe, versions, path)
+        publish(path, STORE_TARGETS)
+        print(f"Packed {count} symbols into {os.path.basename(path)}")
+
+
+def build_correlations():
+    """
+    Function to build the similar stocks index of every stored symbol (homework_3/rsi/correlations.py)
+    and publish it to the indicators service
+    """
+    correlations = load_component("homework_3/rsi", "correlations")
+    staging = get_storage_path("pipeline")
+    os.makedirs(staging, exist_ok=True)
+    start_time = time.perf_counter()
+    path, count = correlations.build(get_storage_path(), staging)
+    publish(path, CORRELATION_TARGETS)
+    print(f"Correlated {count} symbols into {os.path.basename(path)} in {time.perf_counter() - start_time:.1f} seconds")
+
+
+def run_batch_predictions():
+    """
+    Function to precompute the next-day predictions in the prediction service's folder, in a separate process
+    so the runner does not load TensorFlow
+    :return: True if the job succeeded
+    """
+    folder = os.path.join(DATA_ROOT, "homework_4/prediction")
+    process = subprocess.run([sys.executable, os.path.join(ROOT, "homework_4/prediction/batch_predict.py")],
+                             cwd=folder)
+    if process.returncode != 0:
+        print(f"Batch predictions failed with exit code {process.returncode}")
+    return process.returncode == 0
+
+
+def get_symbols(stages):
+    """
+    Function to get the symbols to run: the symbols listed on mse.mk when scraping, the stored ones otherwise
+    """
+    if "scrape" in stages:
+        return load_component("homework_1", "main").get_symbols()
+    return sorted(name[:-4] for name in os.listdir(get_storage_path())
+                  if name.endswith(".csv") and "_" not in name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline, only where the inputs changed")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated stages, from {STAGES}")
+    parser.add_argument("--symbols", help="comma-separated symbols (default: every symbol)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="symbols run in parallel")
+    parser.add_argument("--force", action="store_true", help="run every stage even if its inputs did not change")
+    args = parser.parse_args()
+
+    stages = [stage for stage in STAGES if stage in args.stages.split(",")]
+    if not stages:
+        parser.error(f"no known stage in {args.stages}")
+    start_time = time.time()
+    os.makedirs(get_storage_path(), exist_ok=True)
+    symbols = args.symbols.split(",") if args.symbols else get_symbols(stages)
+    state = load_state()
+    manifest = load_manifest()
+
+    ran_count = {stage: 0 for stage in stages}
+    failed = {}
+    # spawn: TensorFlow and the HTTP session pools must not be inherited from a forked parent
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(run_symbol, symbol, stages, state.get(symbol, {}), args.force): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                state[symbol], ran, error = future.result()
+            except Exception as e:  # The worker process died
+                failed[symbol] = str(e)
+                print(f"{symbol} failed: {e}")
+                continue
+            for stage in ran:
+                ran_count[stage] += 1
+            if error is not None:
+                failed[symbol] = error
+                print(f"{symbol} failed after {', '.join(ran) if ran else 'no stage'}: {error}")
+            else:
+                print(f"{symbol}: {', '.join(ran) if ran else 'up to date'}")
+            # The stages that finished are kept even if a later one failed, their files are already published
+            save_state(state)  # Saved after every symbol, so an interrupted run does not redo the finished ones
+            update_manifest(manifest, state)  # The services pick up the symbol's new files now
+
+    if "indicators" in stages and (ran_count["indicators"] or not is_published(
+            STORE_TARGETS, [f"store_{timeframe}.bin" for timeframe in TIMEFRAMES])):
+        build_stores(manifest)
+    if "indicators" in stages and (ran_count["indicators"] or not is_published(
+            CORRELATION_TARGETS, [CORRELATION_INDEX])):
+        build_correlations()
+    if ran_count.get("indicators") or ran_count.get("model"):
+        run_batch_predictions()
+
+    print(f"Stages run: {ran_count}, symbols: {len(symbols)}, failed: {len(failed)}, "
+          f"manifest version: {manifest['version']}")
+    print(f"Pipeline completed in {time.time() - start_time:.1f} seconds")